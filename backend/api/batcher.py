@@ -0,0 +1,97 @@
+import asyncio
+import time
+from collections import deque
+import numpy as np
+
+class MicroBatcher:
+    # Coalesces concurrent single-patient analyses. The first row of a
+    # batch opens a window of max_wait_ms; the batch is flushed when the
+    # window closes or max_batch rows are waiting, analyzed with one
+    # executor call, and each caller gets its own report back.
+
+    def __init__(self, run, max_wait_ms=2.0, max_batch=64, window=1024):
+        # run(values, analyzer) -> awaitable list of reports
+        self.run = run
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch = max_batch
+        self.rows = []
+        self.waiters = []
+        self.enqueued_at = []
+        self.analyzer = None
+        self.timer = None
+        # Flushes in flight; the loop only keeps weak references to tasks
+        self.tasks = set()
+        self.batches = 0
+        self.batched_rows = 0
+        self.queue_samples = deque(maxlen=window)
+        self.compute_samples = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+
+    async def submit(self, row, analyzer):
+        # A model swap closes the open batch so rows never mix models
+        if self.rows and analyzer is not self.analyzer:
+            self._flush()
+        future = asyncio.get_running_loop().create_future()
+        self.rows.append(row)
+        self.waiters.append(future)
+        self.enqueued_at.append(time.perf_counter())
+        self.analyzer = analyzer
+        if len(self.rows) >= self.max_batch:
+            self._flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.rows:
+            return
+        rows, waiters, enqueued_at = self.rows, self.waiters, self.enqueued_at
+        analyzer = self.analyzer
+        self.rows, self.waiters, self.enqueued_at = [], [], []
+        task = asyncio.get_running_loop().create_task(self._analyze(np.vstack(rows), analyzer, waiters, enqueued_at))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _analyze(self, values, analyzer, waiters, enqueued_at):
+        start = time.perf_counter()
+        self.queue_samples.extend(start - t for t in enqueued_at)
+        try:
+            reports = await self.run(values, analyzer)
+        except Exception as e:
+            for future in waiters:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.compute_samples.append(time.perf_counter() - start)
+            self.batches += 1
+            self.batched_rows += len(waiters)
+            self.batch_sizes.append(len(waiters))
+        for future, report in zip(waiters, reports):
+            if not future.done():
+                future.set_result(report)
+
+    def stats(self):
+        def percentiles(samples):
+            if not samples:
+                return {"p50_ms": None, "p95_ms": None, "mean_ms": None}
+            ms = np.array(samples) * 1000
+            return {
+                "p50_ms": round(float(np.percentile(ms, 50)), 4),
+                "p95_ms": round(float(np.percentile(ms, 95)), 4),
+                "mean_ms": round(float(ms.mean()), 4),
+            }
+
+        return {
+            "max_wait_ms": self.max_wait * 1000,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "rows": self.batched_rows,
+            "mean_batch_size": round(float(np.mean(self.batch_sizes)), 2) if self.batch_sizes else None,
+            # Time rows waited for their batch to close vs. time the batch took to analyze
+            "queue": percentiles(self.queue_samples),
+            "compute": percentiles(self.compute_samples),
+        }
@@ -0,0 +1,333 @@
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import orjson
+from models.artifact import DEFAULT_ARTIFACT_DIR, list_artifacts, load_artifact
+from models.health_analyzer import HealthAnalyzer
+from models.layout import FEATURE_COLUMNS, FIELD_NAMES, RANGE_MIN, RANGE_MAX
+from api.reports import get_disease_risk_level
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional: only needed for Parquet input or output
+    pyarrow = None
+
+# Offline scoring of whole cohorts. Reads a CSV in the blood_test_data.csv
+# column layout (or Parquet) in chunks, scores the chunks in a process pool
+# where every worker holds the loaded model, and streams prediction,
+# probabilities, health score, risk level and abnormal metrics to CSV,
+# NDJSON or Parquet in input order. Progress is checkpointed after every
+# chunk, so an interrupted run picks up where it stopped.
+#
+#   python -m api.bulk_score cohort.csv --output scores.ndjson --workers 4
+
+FORMATS = ["csv", "ndjson", "parquet"]
+DEFAULT_CHUNKSIZE = 50_000
+INVALID_ROW = "missing or non-numeric lab values"
+
+# Per-process state of a pool worker
+_scorer = {"analyzer": None, "output_format": None, "output": None, "normalized": False}
+
+def output_format(path, requested=None):
+    if requested:
+        return requested
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".ndjson", ".jsonl"):
+        return "ndjson"
+    if extension == ".parquet":
+        return "parquet"
+    return "csv"
+
+def read_chunks(path, chunksize, id_column=None, skip_rows=0):
+    # Yields (ids, float64 values in FEATURE_COLUMNS order) per chunk
+    columns = FEATURE_COLUMNS + ([id_column] if id_column else [])
+    row = skip_rows
+    if path.endswith(".parquet"):
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        skipped = 0
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            if skipped + batch.num_rows <= skip_rows:
+                skipped += batch.num_rows
+                continue
+            frame = batch.to_pandas().iloc[max(0, skip_rows - skipped):]
+            skipped = skip_rows
+            ids = frame[id_column].tolist() if id_column else list(range(row, row + len(frame)))
+            row += len(frame)
+            yield ids, frame[FEATURE_COLUMNS].apply(_to_numeric).to_numpy(dtype=float)
+        return
+
+    import pandas as pd
+    reader = pd.read_csv(path, usecols=columns, chunksize=chunksize, skiprows=range(1, skip_rows + 1),
+                         dtype={id_column: str} if id_column else None)
+    for frame in reader:
+        ids = frame[id_column].tolist() if id_column else list(range(row, row + len(frame)))
+        row += len(frame)
+        yield ids, frame[FEATURE_COLUMNS].apply(_to_numeric).to_numpy(dtype=float)
+
+def _to_numeric(column):
+    import pandas as pd
+    return pd.to_numeric(column, errors="coerce")
+
+def _init_worker(artifact_dir, key, engine, fmt, output, normalized):
+    analyzer = HealthAnalyzer(flat_forest=engine == "flat")
+    if load_artifact(analyzer, key, artifact_dir, serving_only=engine == "flat") is None:
+        raise RuntimeError(f"Artifact {key} not found in {artifact_dir}")
+    analyzer.prepare()
+    _scorer.update(analyzer=analyzer, output_format=fmt, output=output, normalized=normalized)
+
+def score(values, analyzer):
+    # Column-oriented results for one chunk; rows with missing values get an error instead
+    valid = np.isfinite(values).all(axis=1)
+    n = len(values)
+    result = {
+        "prediction": [None] * n,
+        "confidence": [None] * n,
+        "probabilities": [None] * n,
+        "health_score": [None] * n,
+        "risk_level": [None] * n,
+        "metrics_at_risk": [None] * n,
+        "abnormal_metrics": [None] * n,
+        "error": [None if ok else INVALID_ROW for ok in valid.tolist()],
+    }
+    rows = np.flatnonzero(valid)
+    if not len(rows):
+        return result, []
+
+    X = values[rows]
+    analysis = analyzer.analyze_batch(X)
+    # Metrics at risk as the analyzer counts them, which also scores the health score;
+    # abnormal metrics by the same range check /analyze reports them with
+    metrics_at_risk = analysis["metrics_at_risk"].tolist()
+    out_of_range = (X < RANGE_MIN) | (X > RANGE_MAX)
+    probabilities = analysis["probabilities"]
+    classes = [str(label) for label in (analyzer.model if analyzer.model is not None
+                                        else analyzer.compiled_forest()).classes_]
+    for i, row in enumerate(rows.tolist()):
+        health_score = analysis["health_scores"][i]
+        result["prediction"][row] = str(analysis["predictions"][i])
+        result["confidence"][row] = float(probabilities[i].max())
+        result["probabilities"][row] = probabilities[i].tolist()
+        result["health_score"][row] = health_score
+        result["risk_level"][row] = get_disease_risk_level(health_score, metrics_at_risk[i], len(FIELD_NAMES))["level"]
+        result["metrics_at_risk"][row] = metrics_at_risk[i]
+        result["abnormal_metrics"][row] = [FIELD_NAMES[j] for j in np.flatnonzero(out_of_range[i])]
+    return result, classes
+
+def render_csv(ids, result, classes, header):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(["id", "prediction", "confidence", *[f"probability_{label}" for label in classes],
+                         "health_score", "risk_level", "metrics_at_risk", "abnormal_metrics", "error"])
+    for i, row_id in enumerate(ids):
+        probabilities = result["probabilities"][i] or [None] * len(classes)
+        abnormal = result["abnormal_metrics"][i]
+        writer.writerow([row_id, result["prediction"][i], result["confidence"][i], *probabilities,
+                         result["health_score"][i], result["risk_level"][i], result["metrics_at_risk"][i],
+                         ";".join(abnormal) if abnormal is not None else None, result["error"][i]])
+    return buffer.getvalue().encode()
+
+def render_ndjson(ids, result, classes):
+    lines = []
+    for i, row_id in enumerate(ids):
+        if result["error"][i]:
+            lines.append(orjson.dumps({"id": row_id, "error": result["error"][i]}))
+            continue
+        lines.append(orjson.dumps({
+            "id": row_id,
+            "prediction": result["prediction"][i],
+            "confidence": result["confidence"][i],
+            "probabilities": dict(zip(classes, result["probabilities"][i])),
+            "health_score": result["health_score"][i],
+            "risk_level": result["risk_level"][i],
+            "metrics_at_risk": result["metrics_at_risk"][i],
+            "abnormal_metrics": result["abnormal_metrics"][i],
+        }))
+    return b"".join(line + b"\n" for line in lines)
+
+def write_parquet(path, ids, result, classes):
+    columns = {"id": ids}
+    for name in ("prediction", "confidence"):
+        columns[name] = result[name]
+    for j, label in enumerate(classes):
+        columns[f"probability_{label}"] = [p[j] if p is not None else None for p in result["probabilities"]]
+    for name in ("health_score", "risk_level", "metrics_at_risk", "abnormal_metrics", "error"):
+        columns[name] = result[name]
+    # health_score mixes the ints 0/100 with floats
+    columns["health_score"] = [float(s) if s is not None else None for s in columns["health_score"]]
+    pyarrow.parquet.write_table(pyarrow.table(columns), path)
+
+def score_chunk(index, ids, values):
+    # Runs in a pool worker; CSV/NDJSON come back as bytes for the parent to
+    # append in order, Parquet chunks are written as part files right here
+    if _scorer["normalized"]:
+        # Training CSV layout: every lab value scaled to 0-1 over its normal range
+        values = RANGE_MIN + values * (RANGE_MAX - RANGE_MIN)
+    result, classes = score(values, _scorer["analyzer"])
+    fmt = _scorer["output_format"]
+    if fmt == "parquet":
+        write_parquet(os.path.join(_scorer["output"], f"part-{index:05d}.parquet"), ids, result, classes)
+        return len(ids), b""
+    if fmt == "ndjson":
+        return len(ids), render_ndjson(ids, result, classes)
+    return len(ids), render_csv(ids, result, classes, header=index == 0)
+
+class Progress:
+    # Checkpoint next to the output: chunks and rows done, and how many
+    # bytes of the output they account for. A run is only resumed with the
+    # same input, model and chunking.
+
+    def __init__(self, path, run):
+        self.path = path
+        self.run = run
+        self.chunks_done = 0
+        self.rows_done = 0
+        self.output_bytes = 0
+        self.complete = False
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            saved = json.load(f)
+        if saved["run"] != self.run:
+            raise SystemExit(f"{self.path} belongs to a different run (input, model or options changed); "
+                             f"pass --restart to start over")
+        self.chunks_done = saved["chunks_done"]
+        self.rows_done = saved["rows_done"]
+        self.output_bytes = saved["output_bytes"]
+        self.complete = saved["complete"]
+        return True
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"run": self.run, "chunks_done": self.chunks_done, "rows_done": self.rows_done,
+                       "output_bytes": self.output_bytes, "complete": self.complete}, f)
+        os.replace(tmp_path, self.path)
+
+def run(input_path, output, artifact_dir=DEFAULT_ARTIFACT_DIR, key=None, engine="flat", fmt=None,
+        workers=None, chunksize=DEFAULT_CHUNKSIZE, id_column=None, normalized=False, restart=False):
+    fmt = output_format(output, fmt)
+    if (fmt == "parquet" or input_path.endswith(".parquet")) and pyarrow is None:
+        raise SystemExit("Parquet input/output needs the optional pyarrow package (pip install pyarrow)")
+    if key is None:
+        artifacts = list_artifacts(artifact_dir)
+        if not artifacts:
+            raise SystemExit(f"No model artifacts in {artifact_dir}; train one with python -m models.train")
+        key = artifacts[0]["key"]
+    workers = workers or os.cpu_count() or 1
+
+    stat = os.stat(input_path)
+    progress = Progress(output + ".progress", {
+        "input": os.path.abspath(input_path), "input_size": stat.st_size, "input_mtime": stat.st_mtime_ns,
+        "model_version": key, "engine": engine, "format": fmt, "chunksize": chunksize, "id_column": id_column,
+        "normalized": normalized,
+    })
+    if restart and os.path.exists(progress.path):
+        os.remove(progress.path)
+    resumed = progress.load()
+    if progress.complete:
+        print(f"{output} is already complete ({progress.rows_done} rows)", file=sys.stderr)
+        return {"rows": progress.rows_done, "resumed": True, "complete": True}
+
+    if fmt == "parquet":
+        os.makedirs(output, exist_ok=True)
+        sink = None
+    else:
+        # Drop whatever a crash left after the last checkpoint
+        sink = open(output, "r+b" if resumed and os.path.exists(output) else "wb")
+        sink.truncate(progress.output_bytes)
+        sink.seek(progress.output_bytes)
+    if resumed:
+        print(f"Resuming after {progress.rows_done} rows ({progress.chunks_done} chunks)", file=sys.stderr)
+
+    start = time.perf_counter()
+    rows_before = progress.rows_done
+    context = multiprocessing.get_context("spawn")
+    # At most this many chunks are parsed but not yet written, which bounds memory
+    max_in_flight = workers * 2
+    try:
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(artifact_dir, key, engine, fmt, output, normalized)) as pool:
+            pending = []
+            chunks = read_chunks(input_path, chunksize, id_column, progress.rows_done)
+            index = progress.chunks_done
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < max_in_flight:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    ids, values = chunk
+                    pending.append(pool.submit(score_chunk, index, ids, values))
+                    index += 1
+                if not pending:
+                    break
+                # Chunks are written strictly in input order
+                rows, data = pending.pop(0).result()
+                if sink is not None:
+                    sink.write(data)
+                    sink.flush()
+                    os.fsync(sink.fileno())
+                    progress.output_bytes += len(data)
+                progress.chunks_done += 1
+                progress.rows_done += rows
+                progress.save()
+                elapsed = time.perf_counter() - start
+                print(f"{progress.rows_done} rows ({(progress.rows_done - rows_before) / elapsed:.0f} rows/s)",
+                      file=sys.stderr)
+        progress.complete = True
+        progress.save()
+    finally:
+        if sink is not None:
+            sink.close()
+
+    elapsed = time.perf_counter() - start
+    rows = progress.rows_done - rows_before
+    cores = min(workers, os.cpu_count() or 1)
+    return {
+        "input": input_path,
+        "output": output,
+        "format": fmt,
+        "model_version": key,
+        "engine": engine,
+        "rows": rows,
+        "total_rows": progress.rows_done,
+        "resumed": resumed,
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(rows / elapsed, 1) if elapsed else None,
+        "workers": workers,
+        "rows_per_s_per_core": round(rows / elapsed / cores, 1) if elapsed else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a cohort CSV/Parquet file offline")
+    parser.add_argument("input", help="CSV (blood_test_data.csv column layout) or .parquet file")
+    parser.add_argument("--output", required=True, help="Output .csv, .ndjson/.jsonl, or .parquet directory")
+    parser.add_argument("--format", choices=FORMATS, help="Output format (default: from the output extension)")
+    parser.add_argument("--artifact-dir", default=DEFAULT_ARTIFACT_DIR)
+    parser.add_argument("--model", help="Artifact key (default: the newest artifact)")
+    parser.add_argument("--engine", choices=["flat", "sklearn"], default="flat")
+    parser.add_argument("--workers", type=int, help="Scoring processes (default: the number of cores)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows per chunk")
+    parser.add_argument("--id-column", help="Input column copied to the output as id (default: row number)")
+    parser.add_argument("--normalized", action="store_true",
+                        help="Input values are 0-1 over the normal range, as in data/blood_test_data.csv")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved progress and start over")
+    args = parser.parse_args()
+    summary = run(args.input, args.output, args.artifact_dir, args.model, args.engine, args.format,
+                  args.workers, args.chunksize, args.id_column, args.normalized, args.restart)
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
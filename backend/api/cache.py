@@ -0,0 +1,202 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from models.layout import PRECISION
+
+PRECISION_SCALE = 10.0 ** PRECISION
+
+def cache_key(values: np.ndarray, model_version: str) -> str:
+    # Values are rounded to lab precision, so re-submitted panels hash alike
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(model_version).encode())
+    digest.update(np.rint(values * PRECISION_SCALE).astype(np.int64).tobytes())
+    return digest.hexdigest()
+
+class LocalCache:
+    # In-process LRU with a per-entry TTL
+
+    def __init__(self, max_size=4096, ttl=600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+class SQLiteCache:
+    # Cache shared by every worker on a node through one SQLite file.
+    # Entries are JSON; the oldest entries are evicted past max_size.
+
+    def __init__(self, path, max_size=100000, ttl=600):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.local = threading.local()
+        self.evictions = 0
+        self.expirations = 0
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_cache ("
+                "key TEXT PRIMARY KEY, model_version TEXT NOT NULL, "
+                "value TEXT NOT NULL, expires_at REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_created ON analysis_cache(created_at)")
+
+    def _connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM analysis_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] < time.time():
+            self._connection().execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+            self.expirations += 1
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value, model_version=""):
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO analysis_cache (key, model_version, value, expires_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, model_version, json.dumps(value), now + self.ttl, now)
+        )
+        overflow = conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0] - self.max_size
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM analysis_cache WHERE key IN "
+                "(SELECT key FROM analysis_cache ORDER BY created_at LIMIT ?)", (overflow,)
+            )
+            self.evictions += overflow
+
+    def clear(self, keep_version=None):
+        if keep_version is None:
+            self._connection().execute("DELETE FROM analysis_cache")
+        else:
+            self._connection().execute("DELETE FROM analysis_cache WHERE model_version != ?", (keep_version,))
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+
+class AnalysisCache:
+    # Local LRU in front of an optional shared backend. Keys include the
+    # model version, and a version change drops every older entry, so a
+    # retrain or reload never serves stale results.
+
+    def __init__(self, max_size=4096, ttl=600, shared=None):
+        self.local = LocalCache(max_size, ttl)
+        self.shared = shared
+        self.model_version = None
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        # Misses on a key whose entry holds a slightly different panel
+        self.near_duplicates = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def set_model_version(self, model_version):
+        with self.lock:
+            if model_version == self.model_version:
+                return
+            self.model_version = model_version
+            self.invalidations += 1
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear(keep_version=str(model_version))
+
+    def key(self, values):
+        return cache_key(values, self.model_version)
+
+    def get(self, key, values):
+        # A key covers every panel that rounds to the same lab-precision
+        # values, but an entry is only served for the exact panel it was
+        # computed from; a near-duplicate is analyzed afresh
+        submitted = values.tolist()
+        entry = self.local.get(key)
+        if entry is not None and entry["values"] == submitted:
+            self.hits += 1
+            return entry["report"]
+        if self.shared is not None:
+            entry = self.shared.get(key)
+            if entry is not None and entry["values"] == submitted:
+                self.shared_hits += 1
+                self.local.set(key, entry)
+                return entry["report"]
+        if entry is not None:
+            self.near_duplicates += 1
+        self.misses += 1
+        return None
+
+    def set(self, key, values, report):
+        entry = {"values": values.tolist(), "report": report}
+        self.local.set(key, entry)
+        if self.shared is not None:
+            self.shared.set(key, entry, str(self.model_version))
+
+    def stats(self):
+        lookups = self.hits + self.shared_hits + self.misses
+        stats = {
+            "model_version": self.model_version,
+            "size": len(self.local),
+            "max_size": self.local.max_size,
+            "ttl_seconds": self.local.ttl,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "near_duplicates": self.near_duplicates,
+            "hit_rate": round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.local.evictions,
+            "expirations": self.local.expirations,
+            "invalidations": self.invalidations,
+        }
+        if self.shared is not None:
+            stats["shared"] = {
+                "path": self.shared.path,
+                "size": len(self.shared),
+                "evictions": self.shared.evictions,
+                "expirations": self.shared.expirations,
+            }
+        return stats
@@ -0,0 +1,85 @@
+import bisect
+import hashlib
+
+# Multi-node serving. Every node trains or loads the same deterministic
+# model (see models.artifact.model_fingerprint) and stamps each response
+# with its node id and model fingerprint, so a client or load balancer can
+# tell which node and which model answered. Patient state (result cache,
+# history, vitals) is per node; HashRing maps a userId to one node so that
+# state stays in one place, and only ~1/n of the users move when a node is
+# added or removed.
+
+DEFAULT_REPLICAS = 128
+
+def _point(text):
+    # Stable across processes and machines, unlike hash()
+    return int.from_bytes(hashlib.sha1(text.encode()).digest()[:8], "big")
+
+class HashRing:
+    def __init__(self, nodes=(), replicas=DEFAULT_REPLICAS):
+        # replicas: virtual points per node; more points even out the share per node
+        self.replicas = replicas
+        self.nodes = []
+        self.points = []
+        self.owners = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for i in range(self.replicas):
+            point = _point(f"{node}#{i}")
+            index = bisect.bisect(self.points, point)
+            self.points.insert(index, point)
+            self.owners.insert(index, node)
+
+    def remove(self, node):
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        keep = [i for i, owner in enumerate(self.owners) if owner != node]
+        self.points = [self.points[i] for i in keep]
+        self.owners = [self.owners[i] for i in keep]
+
+    def node_for(self, key):
+        # First node point clockwise from the key's point
+        if not self.points:
+            return None
+        index = bisect.bisect(self.points, _point(str(key))) % len(self.points)
+        return self.owners[index]
+
+def parse_nodes(spec):
+    # "http://a:8000,http://b:8000" -> ["http://a:8000", "http://b:8000"]
+    return [node.strip() for node in (spec or "").split(",") if node.strip()]
+
+class NodeHeadersMiddleware:
+    # Plain ASGI middleware: adds X-Node-Id and X-Model-Fingerprint to every
+    # HTTP response. The fingerprint is the one a handler stored in
+    # request.state.model_fingerprint for the analyzer that scored the
+    # request, so a reload during the request does not relabel it; other
+    # responses get the model serving when the response starts.
+    def __init__(self, app, node_id, fingerprint):
+        self.app = app
+        self.node_id = node_id.encode()
+        self.fingerprint = fingerprint
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # Created here so the handler's request.state writes into this dict
+        state = scope.setdefault("state", {})
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-node-id", self.node_id))
+                fingerprint = state.get("model_fingerprint") or self.fingerprint()
+                if fingerprint:
+                    headers.append((b"x-model-fingerprint", fingerprint.encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,129 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from models.health_analyzer import HealthAnalyzer
+from models.artifact import load_artifact
+from api.reports import analyze_timed
+from api.metrics import record_analysis
+
+EXECUTOR_MODES = ["inline", "thread", "process"]
+
+class ExecutorBusy(Exception):
+    pass
+
+# Per-process state of a process-pool worker
+_worker = {"analyzer": None, "artifact_dir": None, "flat_forest": False}
+
+def _init_worker(artifact_dir, flat_forest, model_version):
+    _worker["artifact_dir"] = artifact_dir
+    _worker["flat_forest"] = flat_forest
+    if model_version is not None:
+        _load_worker_model(model_version)
+
+def _load_worker_model(model_version):
+    analyzer = HealthAnalyzer(flat_forest=_worker["flat_forest"])
+    if load_artifact(analyzer, model_version, _worker["artifact_dir"], serving_only=analyzer.flat_forest) is None:
+        raise RuntimeError(f"Artifact {model_version} not found in {_worker['artifact_dir']}")
+    analyzer.prepare()
+    _worker["analyzer"] = analyzer
+    return analyzer
+
+def _analyze_in_worker(values, model_version):
+    # Workers keep their model loaded and only reload after a swap
+    analyzer = _worker["analyzer"]
+    if analyzer is None or analyzer.model_version != model_version:
+        analyzer = _load_worker_model(model_version)
+    return analyze_timed(values, analyzer)
+
+class InferenceExecutor:
+    # Runs analyze_matrix off the event loop. "thread" shares the serving
+    # analyzer across a thread pool; "process" gives every worker process
+    # its own copy loaded from the artifact. At most `max_queue` calls may
+    # be queued or running; past that run() raises ExecutorBusy.
+
+    def __init__(self, mode="thread", workers=None, max_queue=256, timeout=30.0,
+                 artifact_dir=None, flat_forest=False):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown executor mode {mode!r}, expected one of {EXECUTOR_MODES}")
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.artifact_dir = artifact_dir
+        self.flat_forest = flat_forest
+        self.pool = None
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def start(self, model_version=None):
+        if self.mode == "thread":
+            self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix="inference")
+        elif self.mode == "process":
+            # spawn: the parent has live threads (reload watcher, event loop)
+            self.pool = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(self.artifact_dir, self.flat_forest, model_version)
+            )
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def _done(self, future):
+        with self.lock:
+            self.pending -= 1
+            self.completed += 1
+
+    async def run(self, values, analyzer):
+        if self.pool is None:
+            reports, timings = analyze_timed(values, analyzer)
+            record_analysis(reports, timings)
+            return reports
+
+        submitted_at = time.perf_counter()
+        with self.lock:
+            if self.pending >= self.max_queue:
+                self.rejected += 1
+                raise ExecutorBusy(f"{self.pending} analyses already queued")
+            self.pending += 1
+        try:
+            if self.mode == "process":
+                future = self.pool.submit(_analyze_in_worker, values, analyzer.model_version)
+            else:
+                future = self.pool.submit(analyze_timed, values, analyzer)
+        except Exception:
+            with self.lock:
+                self.pending -= 1
+            raise
+        future.add_done_callback(self._done)
+
+        try:
+            reports, timings = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            # A call that has not started yet is dropped from the queue
+            self.timeouts += 1
+            future.cancel()
+            raise
+        # Whatever the worker did not spend computing was spent queued (and in transfer)
+        timings["executor_queue"] = max(0.0, time.perf_counter() - submitted_at - sum(timings.values()))
+        record_analysis(reports, timings)
+        return reports
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "workers": self.workers if self.pool is not None else 0,
+            "max_queue": self.max_queue,
+            "timeout_seconds": self.timeout,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
@@ -0,0 +1,145 @@
+import json
+import sqlite3
+import threading
+import time
+import numpy as np
+from models.layout import FIELD_NAMES, NUM_FEATURES
+
+SECONDS_PER_DAY = 86400.0
+
+class HistoryStore:
+    # Per-patient metric history in SQLite. Raw points live in
+    # metric_history, keyed (user_id, metric, timestamp); metric_trends
+    # keeps running aggregates per (user_id, metric) that are updated
+    # incrementally on every new analysis, so trends never rescan history.
+    # The EWMA and last-N window assume points arrive in time order.
+
+    def __init__(self, path, ewma_alpha=0.3, window=10):
+        self.path = path
+        self.ewma_alpha = ewma_alpha
+        self.window = window
+        self.local = threading.local()
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS metric_history ("
+            "user_id TEXT NOT NULL, metric TEXT NOT NULL, timestamp INTEGER NOT NULL, value REAL NOT NULL, "
+            "PRIMARY KEY (user_id, metric, timestamp)) WITHOUT ROWID"
+        )
+        # Sums for an incremental least-squares slope, with t in days since first_ts
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS metric_trends ("
+            "user_id TEXT NOT NULL, metric TEXT NOT NULL, count INTEGER NOT NULL, "
+            "first_ts INTEGER NOT NULL, last_ts INTEGER NOT NULL, last_value REAL NOT NULL, "
+            "ewma REAL NOT NULL, min REAL NOT NULL, max REAL NOT NULL, "
+            "sum_t REAL NOT NULL, sum_v REAL NOT NULL, sum_tt REAL NOT NULL, sum_tv REAL NOT NULL, "
+            "window TEXT NOT NULL, PRIMARY KEY (user_id, metric)) WITHOUT ROWID"
+        )
+
+    def _connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def record(self, user_id, values, timestamp=None):
+        # values: one panel in FIELD_NAMES order. Returns the updated trends.
+        timestamp = int(timestamp if timestamp is not None else time.time())
+        values = np.asarray(values, dtype=float).reshape(NUM_FEATURES)
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-submitting a panel with the same timestamp must not count twice
+            inserted = []
+            for field, value in zip(FIELD_NAMES, values.tolist()):
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO metric_history (user_id, metric, timestamp, value) VALUES (?, ?, ?, ?)",
+                    (user_id, field, timestamp, value)
+                )
+                if cursor.rowcount:
+                    inserted.append((field, value))
+
+            state = self._load(conn, user_id)
+            for field, value in inserted:
+                state[field] = self._update(state.get(field), timestamp, value)
+            conn.executemany(
+                "INSERT OR REPLACE INTO metric_trends (user_id, metric, count, first_ts, last_ts, last_value, "
+                "ewma, min, max, sum_t, sum_v, sum_tt, sum_tv, window) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(user_id, field, *self._row(state[field])) for field, _ in inserted]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return {field: self._summary(state[field]) for field in FIELD_NAMES if field in state}
+
+    def _load(self, conn, user_id):
+        rows = conn.execute(
+            "SELECT metric, count, first_ts, last_ts, last_value, ewma, min, max, "
+            "sum_t, sum_v, sum_tt, sum_tv, window FROM metric_trends WHERE user_id = ?", (user_id,)
+        ).fetchall()
+        keys = ["count", "first_ts", "last_ts", "last_value", "ewma", "min", "max",
+                "sum_t", "sum_v", "sum_tt", "sum_tv", "window"]
+        state = {}
+        for row in rows:
+            entry = dict(zip(keys, row[1:]))
+            entry["window"] = json.loads(entry["window"])
+            state[row[0]] = entry
+        return state
+
+    def _update(self, entry, timestamp, value):
+        if entry is None:
+            return {"count": 1, "first_ts": timestamp, "last_ts": timestamp, "last_value": value,
+                    "ewma": value, "min": value, "max": value,
+                    "sum_t": 0.0, "sum_v": value, "sum_tt": 0.0, "sum_tv": 0.0, "window": [[timestamp, value]]}
+        t = (timestamp - entry["first_ts"]) / SECONDS_PER_DAY
+        entry["count"] += 1
+        entry["last_ts"] = max(entry["last_ts"], timestamp)
+        entry["last_value"] = value
+        entry["ewma"] = self.ewma_alpha * value + (1 - self.ewma_alpha) * entry["ewma"]
+        entry["min"] = min(entry["min"], value)
+        entry["max"] = max(entry["max"], value)
+        entry["sum_t"] += t
+        entry["sum_v"] += value
+        entry["sum_tt"] += t * t
+        entry["sum_tv"] += t * value
+        entry["window"] = (entry["window"] + [[timestamp, value]])[-self.window:]
+        return entry
+
+    def _row(self, entry):
+        return (entry["count"], entry["first_ts"], entry["last_ts"], entry["last_value"], entry["ewma"],
+                entry["min"], entry["max"], entry["sum_t"], entry["sum_v"], entry["sum_tt"], entry["sum_tv"],
+                json.dumps(entry["window"]))
+
+    def _summary(self, entry):
+        n = entry["count"]
+        denominator = n * entry["sum_tt"] - entry["sum_t"] ** 2
+        slope = (n * entry["sum_tv"] - entry["sum_t"] * entry["sum_v"]) / denominator if denominator > 0 else None
+        return {
+            "count": n,
+            "last": entry["last_value"],
+            "ewma": round(entry["ewma"], 4),
+            "slope_per_day": round(slope, 6) if slope is not None else None,
+            "min": entry["min"],
+            "max": entry["max"],
+            "first_timestamp": entry["first_ts"],
+            "last_timestamp": entry["last_ts"],
+            "recent": [value for _, value in entry["window"]],
+        }
+
+    def trends(self, user_id):
+        state = self._load(self._connection(), user_id)
+        return {field: self._summary(state[field]) for field in FIELD_NAMES if field in state}
+
+    def series(self, user_id, metric, since=None, until=None, limit=1000):
+        # Raw points for one metric, newest first, served from the primary key index
+        rows = self._connection().execute(
+            "SELECT timestamp, value FROM metric_history WHERE user_id = ? AND metric = ? "
+            "AND timestamp >= ? AND timestamp <= ? ORDER BY timestamp DESC LIMIT ?",
+            (user_id, metric, since if since is not None else -2 ** 63,
+             until if until is not None else 2 ** 63 - 1, limit)
+        ).fetchall()
+        return [{"timestamp": ts, "value": value} for ts, value in rows]
@@ -0,0 +1,304 @@
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import threading
+import time
+import traceback
+import uuid
+from models.train import TRAINING_STAGES
+
+try:
+    import fcntl
+except ImportError:  # Windows: every claim succeeds
+    fcntl = None
+from api.metrics import TRAINING_JOBS
+
+# Background training jobs. Each job runs in its own process, reniced and
+# optionally pinned to a subset of CPUs, so a retrain does not take cores
+# from the serving workers. The child reports every finished training stage
+# over a queue. Job records (request, progress, evaluation report, artifact
+# key) are JSON files in jobs_dir, so they outlive the server and every
+# worker process of the node reads the same records; the artifact itself is
+# published by save_artifact as usual. Jobs run one at a time per worker.
+
+JOB_STATES = ["queued", "running", "succeeded", "failed"]
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def parse_cpus(spec):
+    # "0-1,3" -> {0, 1, 3}; empty means no affinity limit
+    cpus = set()
+    for part in (spec or "").split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.update(range(int(first), int(last) + 1))
+        elif part.strip():
+            cpus.add(int(part))
+    return cpus
+
+class TrainingClaim:
+    # Non-blocking lock on <artifact_dir>/<key>.train.lock. When the workers
+    # of a node start without an artifact, only the one holding the claim
+    # trains it. A worker that dies takes its claim with it.
+
+    def __init__(self, artifact_dir, key):
+        self.path = os.path.join(artifact_dir, f"{key}.train.lock")
+        self.fd = None
+
+    def acquire(self):
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    def release(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+# Estimator parameters a submitted param_grid may search, with the values
+# allowed for each, and a cap on the candidates it expands to
+PARAM_GRID_BOUNDS = {
+    "n_estimators": (int, 1, 500),
+    "max_depth": (int, 1, 32),
+    "min_samples_split": (int, 2, 1000),
+    "min_samples_leaf": (int, 1, 1000),
+    "max_features": (float, 0.0, 1.0),
+}
+MAX_PARAM_GRID_CANDIDATES = 64
+
+def check_param_grid(grid):
+    # Raises ValueError unless grid is {param: [values]} within PARAM_GRID_BOUNDS
+    if not grid:
+        raise ValueError("param_grid is empty")
+    candidates = 1
+    for name, values in grid.items():
+        if name not in PARAM_GRID_BOUNDS:
+            raise ValueError(f"Unknown parameter {name}; allowed: {', '.join(PARAM_GRID_BOUNDS)}")
+        kind, low, high = PARAM_GRID_BOUNDS[name]
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"{name} needs a non-empty list of values")
+        for value in values:
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or (kind is int and value != int(value)):
+                raise ValueError(f"{name} values must be {kind.__name__}s")
+            if not low <= value <= high or (kind is float and value == low):
+                raise ValueError(f"{name} values must be in ({low}, {high}]" if kind is float
+                                 else f"{name} values must be between {low} and {high}")
+        candidates *= len(values)
+    if candidates > MAX_PARAM_GRID_CANDIDATES:
+        raise ValueError(f"param_grid expands to {candidates} candidates; at most {MAX_PARAM_GRID_CANDIDATES} are allowed")
+    return {name: [PARAM_GRID_BOUNDS[name][0](value) for value in values] for name, values in grid.items()}
+
+def _run_job(request, artifact_dir, nice, cpus, events):
+    # Child process: lower priority first, then import and train
+    try:
+        if nice:
+            os.nice(nice)
+        if cpus and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cpus)
+        from models.artifact import to_builtin
+        from models.train import train_artifact, training_config, warm_start_params
+
+        params = warm_start_params(request["data_path"], artifact_dir) if request["warm_start"] else None
+        config = training_config(request["search"], params, request["max_rows_per_class"])
+        if request["param_grid"] and not params:
+            config["param_grid"] = request["param_grid"]
+        start = time.time()
+        analyzer, evaluation, path = train_artifact(
+            request["data_path"], artifact_dir, config=config, n_jobs=request["n_jobs"],
+            progress=lambda stage, seconds: events.put(("stage", stage, seconds)))
+        events.put(("succeeded", {"model_version": analyzer.model_version, "artifact_path": path,
+                                  "training_seconds": round(time.time() - start, 3),
+                                  "evaluation": to_builtin(evaluation)}))
+    except BaseException:
+        events.put(("failed", traceback.format_exc()))
+
+class TrainingJobs:
+    def __init__(self, jobs_dir, artifact_dir, nice=10, cpus=None, on_success=None):
+        self.jobs_dir = jobs_dir
+        self.artifact_dir = artifact_dir
+        self.nice = nice
+        self.cpus = cpus
+        # Called with the finished job record in the runner thread
+        self.on_success = on_success
+        # Jobs submitted to this process; records of every worker are read from jobs_dir
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.pending = queue.Queue()
+        self.runner = None
+        self.process = None
+        # TrainingClaim per job id, released when the job finishes
+        self.claims = {}
+        self._load()
+
+    def _path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _read(self, job_id):
+        try:
+            with open(self._path(job_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _records(self):
+        if not os.path.isdir(self.jobs_dir):
+            return []
+        records = (self._read(name[:-len(".json")]) for name in os.listdir(self.jobs_dir) if name.endswith(".json"))
+        return [job for job in records if job is not None]
+
+    def _orphaned(self, job):
+        # The process that owned the job is gone (a new process may reuse its pid
+        # after a restart, e.g. pid 1 in a container). Jobs of other hosts sharing
+        # jobs_dir cannot be checked and are left alone.
+        if job.get("owner_host", socket.gethostname()) != socket.gethostname():
+            return False
+        pid = job.get("owner_pid")
+        return pid is None or pid == os.getpid() or not _process_alive(pid)
+
+    def _load(self):
+        # Jobs cut off by a restart cannot resume; they are marked failed. Jobs
+        # still running in another worker are not touched.
+        for job in self._records():
+            if job["status"] in ("queued", "running") and self._orphaned(job):
+                job.update(status="failed", error="Interrupted by a server restart", finished_at=time.time())
+                self._save(job)
+
+    def _save(self, job):
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        tmp_path = self._path(job["id"]) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job, f, indent=2)
+        os.replace(tmp_path, self._path(job["id"]))
+
+    def _update(self, job, **fields):
+        with self.lock:
+            job.update(fields)
+            self._save(job)
+
+    def submit(self, request, claim=None):
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "status": "queued",
+            "request": request,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "stage": None,
+            "stages": {},
+            "progress": 0.0,
+            "model_version": None,
+            "evaluation": None,
+            "error": None,
+            "owner_pid": os.getpid(),
+            "owner_host": socket.gethostname(),
+        }
+        with self.lock:
+            self.jobs[job["id"]] = job
+            self._save(job)
+            if claim is not None:
+                self.claims[job["id"]] = claim
+        self.pending.put(job["id"])
+        self.start()
+        return dict(job)
+
+    def get(self, job_id):
+        # From jobs_dir, so any worker can report a job submitted to another one
+        if not job_id.isalnum():
+            return None
+        return self._read(job_id)
+
+    def list(self, status=None):
+        # Newest first, without the (large) evaluation reports
+        jobs = [job for job in self._records() if status is None or job["status"] == status]
+        jobs.sort(key=lambda job: job["submitted_at"], reverse=True)
+        return [{key: value for key, value in job.items() if key != "evaluation"} for job in jobs]
+
+    def start(self):
+        if self.runner is None:
+            self.runner = threading.Thread(target=self._run, daemon=True)
+            self.runner.start()
+
+    def _run(self):
+        while True:
+            job_id = self.pending.get()
+            if job_id is None:
+                return
+            self._run_one(self.jobs[job_id])
+
+    def _run_one(self, job):
+        context = multiprocessing.get_context("spawn")
+        events = context.Queue()
+        # Not a daemon: the search and bootstrap fits start worker processes of their own
+        process = context.Process(target=_run_job,
+                                  args=(job["request"], self.artifact_dir, self.nice, self.cpus, events))
+        self._update(job, status="running", started_at=time.time(), stage=TRAINING_STAGES[0])
+        process.start()
+        self.process = process
+        result = None
+        while result is None:
+            try:
+                event = events.get(timeout=1)
+            except queue.Empty:
+                if not process.is_alive():
+                    result = ("failed", f"Training process exited with code {process.exitcode}")
+                continue
+            if event[0] == "stage":
+                _, stage, seconds = event
+                stages = dict(job["stages"], **{stage: seconds})
+                done = sum(name in stages for name in TRAINING_STAGES)
+                upcoming = [name for name in TRAINING_STAGES if name not in stages]
+                self._update(job, stages=stages, progress=round(done / len(TRAINING_STAGES), 3),
+                             stage=upcoming[0] if upcoming else None)
+            else:
+                result = event
+        process.join()
+        self.process = None
+        TRAINING_JOBS.inc(status=result[0])
+        # The artifact is published (or the job failed); other workers may load or retrain it
+        claim = self.claims.pop(job["id"], None)
+        if claim is not None:
+            claim.release()
+
+        if result[0] == "succeeded":
+            self._update(job, status="succeeded", finished_at=time.time(), stage=None, progress=1.0, **result[1])
+            print(f"Training job {job['id']} finished: artifact {job['model_version']} "
+                  f"(accuracy: {job['evaluation']['accuracy']})")
+            if self.on_success is not None:
+                try:
+                    self.on_success(self.get(job["id"]))
+                except Exception as e:
+                    self._update(job, error=f"Trained, but not activated: {e}")
+        else:
+            self._update(job, status="failed", finished_at=time.time(), error=result[1])
+            print(f"Training job {job['id']} failed")
+
+    def shutdown(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+        if self.runner is not None:
+            self.pending.put(None)
+            self.runner = None
+
+    def stats(self):
+        counts = {state: 0 for state in JOB_STATES}
+        for job in self._records():
+            counts[job["status"]] += 1
+        return {"counts": counts, "nice": self.nice, "cpus": sorted(self.cpus) if self.cpus else None,
+                "queued": self.pending.qsize()}
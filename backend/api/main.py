@@ -1,13 +1,97 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Header, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, validator
-import pandas as pd
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, Field, ValidationError, validator
+from operator import attrgetter
+import asyncio
+import hmac
+import threading
+import json
+import os
+import socket
+import orjson
+import time
+from typing import Optional
 import numpy as np
-from models.health_analyzer import HealthAnalyzer
-from models.constants import normal_ranges
+from models.health_analyzer import HealthAnalyzer, TRAINING_CONFIG
+from models.layout import FIELD_INDEX, FIELD_NAMES
+from models.train import DEFAULT_DATA_PATH, SEARCH_MODES
+from models.artifact import DEFAULT_ARTIFACT_DIR, load_artifact, startup_key
+from api.cache import AnalysisCache, SQLiteCache, cache_key
+from api.executor import ExecutorBusy, InferenceExecutor
+from api.batcher import MicroBatcher
+from api.serialization import render, select_view
+from api.history import HistoryStore
+from api.vitals import VitalsStore
+from api.metrics import MODEL_LOAD_SECONDS, REJECTED, STAGE_SECONDS, TimingMiddleware, registry
+from api.profiler import SamplingProfiler
+from api.reload import ArtifactNotFound, ModelReloader, ReloadError
+from api.jobs import TrainingClaim, TrainingJobs, check_param_grid, parse_cpus
+from api.cluster import HashRing, NodeHeadersMiddleware, parse_nodes
+
+DATA_PATH = os.environ.get("HEALTH_DATA_PATH", DEFAULT_DATA_PATH)
+# /admin/train only reads training data from this directory
+DATA_DIR = os.environ.get("HEALTH_DATA_DIR") or os.path.dirname(os.path.abspath(DATA_PATH))
+ARTIFACT_DIR = os.environ.get("HEALTH_ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR)
+# Serve this artifact instead of the one matching HEALTH_DATA_PATH and the training config
+MODEL_KEY = os.environ.get("HEALTH_MODEL_KEY")
+# "flat" serves predictions from the compiled FlatForest, "sklearn" from the estimator
+INFERENCE_ENGINE = os.environ.get("HEALTH_INFERENCE_ENGINE", "sklearn")
+# Result cache for /analyze; size 0 disables it. The optional SQLite file is
+# shared by every worker on the node.
+CACHE_SIZE = int(os.environ.get("HEALTH_CACHE_SIZE", "4096"))
+CACHE_TTL = float(os.environ.get("HEALTH_CACHE_TTL", "600"))
+CACHE_SHARED_PATH = os.environ.get("HEALTH_CACHE_SHARED_PATH")
+# Poll ARTIFACT_DIR every N seconds and hot reload newer artifacts; 0 disables
+RELOAD_WATCH_INTERVAL = float(os.environ.get("HEALTH_RELOAD_WATCH_INTERVAL", "0"))
+# Candidate models must reach this accuracy on the test split saved with them
+RELOAD_MIN_ACCURACY = float(os.environ.get("HEALTH_RELOAD_MIN_ACCURACY", "0.9"))
+# CSV (training layout) to validate artifacts that carry no test split
+RELOAD_HOLDOUT_PATH = os.environ.get("HEALTH_RELOAD_HOLDOUT_PATH")
+# /admin/* endpoints require this in X-Admin-Token; unset disables them
+ADMIN_TOKEN = os.environ.get("HEALTH_ADMIN_TOKEN")
+# Where analysis runs: "inline" on the event loop, or a "thread"/"process" pool
+EXECUTOR_MODE = os.environ.get("HEALTH_EXECUTOR", "thread")
+EXECUTOR_WORKERS = int(os.environ.get("HEALTH_EXECUTOR_WORKERS", "0")) or None
+# Queued + running analyses before requests are turned away with 503
+EXECUTOR_MAX_QUEUE = int(os.environ.get("HEALTH_EXECUTOR_MAX_QUEUE", "256"))
+REQUEST_TIMEOUT = float(os.environ.get("HEALTH_REQUEST_TIMEOUT", "30"))
+RETRY_AFTER_SECONDS = os.environ.get("HEALTH_RETRY_AFTER", "1")
+# Coalesce concurrent single-patient requests for up to N ms / M rows; 0 ms disables
+BATCH_MAX_WAIT_MS = float(os.environ.get("HEALTH_BATCH_MAX_WAIT_MS", "0"))
+BATCH_MAX_SIZE = int(os.environ.get("HEALTH_BATCH_MAX_SIZE", "64"))
+# SQLite file for per-patient metric history; unset disables ?userId= tracking
+HISTORY_PATH = os.environ.get("HEALTH_HISTORY_PATH")
+# WearOS vitals kept in memory per user; the optional SQLite file receives batched raw samples
+VITALS_PATH = os.environ.get("HEALTH_VITALS_PATH")
+VITALS_WINDOW_SECONDS = float(os.environ.get("HEALTH_VITALS_WINDOW", "300"))
+VITALS_CAPACITY = int(os.environ.get("HEALTH_VITALS_CAPACITY", "4096"))
+VITALS_MAX_USERS = int(os.environ.get("HEALTH_VITALS_MAX_USERS", "10000"))
+# Heart Rate is only taken from a window whose newest sample is at most this many seconds old
+VITALS_MAX_AGE_SECONDS = float(os.environ.get("HEALTH_VITALS_MAX_AGE", "900"))
+# Where the sampling profiler writes collapsed stacks of slow requests
+PROFILE_DIR = os.environ.get("HEALTH_PROFILE_DIR", "profiles")
+# Background training jobs: records directory, niceness and CPU list (e.g. "2-3") of the training process
+JOBS_DIR = os.environ.get("HEALTH_JOBS_DIR", "jobs")
+# How often a worker waiting for another worker's training checks for the artifact
+ARTIFACT_POLL_SECONDS = float(os.environ.get("HEALTH_ARTIFACT_POLL_SECONDS", "2"))
+TRAINING_NICE = int(os.environ.get("HEALTH_TRAINING_NICE", "10"))
+TRAINING_CPUS = parse_cpus(os.environ.get("HEALTH_TRAINING_CPUS"))
+# This node's id in X-Node-Id, and every node of the cluster for /route
+NODE_ID = os.environ.get("HEALTH_NODE_ID") or socket.gethostname()
+NODES = parse_nodes(os.environ.get("HEALTH_NODES"))
+if NODES and NODE_ID not in NODES:
+    # /route and the X-Node-Id header identify this node by its HEALTH_NODES entry
+    raise RuntimeError(f"HEALTH_NODE_ID={NODE_ID!r} is not one of HEALTH_NODES {NODES}")
 
 app = FastAPI()
 
+profiler = SamplingProfiler(PROFILE_DIR)
+app.add_middleware(TimingMiddleware, profiler=profiler)
+app.add_middleware(NodeHeadersMiddleware, node_id=NODE_ID,
+                   fingerprint=lambda: health_analyzer.model_fingerprint if health_analyzer is not None else None)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -17,7 +101,12 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-health_analyzer = HealthAnalyzer()
+# Replaced wholesale on reload, never mutated. None until a model is loaded.
+health_analyzer = None
+analysis_cache = AnalysisCache(
+    CACHE_SIZE, CACHE_TTL,
+    SQLiteCache(CACHE_SHARED_PATH, ttl=CACHE_TTL) if CACHE_SHARED_PATH else None
+) if CACHE_SIZE > 0 else None
 
 class PatientData(BaseModel):
     glucose: float = Field(alias="Glucose")
@@ -53,308 +142,394 @@ class PatientData(BaseModel):
     class Config:
         allow_population_by_field_name = True
 
+# PatientData must follow the shared feature layout so a patient maps to one vector
+assert list(PatientData.__fields__) == FIELD_NAMES
+read_values = attrgetter(*FIELD_NAMES)
+
+def swap_analyzer(analyzer: HealthAnalyzer):
+    # A single reference assignment: requests that already read the old
+    # analyzer finish on it, new requests pick up this one
+    global health_analyzer
+    health_analyzer = analyzer
+    if analysis_cache is not None:
+        analysis_cache.set_model_version(analyzer.model_version)
+
+executor = InferenceExecutor(EXECUTOR_MODE, EXECUTOR_WORKERS, EXECUTOR_MAX_QUEUE, REQUEST_TIMEOUT,
+                             ARTIFACT_DIR, flat_forest=INFERENCE_ENGINE == "flat")
+
+history_store = HistoryStore(HISTORY_PATH) if HISTORY_PATH else None
+vitals_store = VitalsStore(VITALS_CAPACITY, VITALS_MAX_USERS, VITALS_WINDOW_SECONDS, VITALS_PATH,
+                           max_age_seconds=VITALS_MAX_AGE_SECONDS)
+
+batcher = MicroBatcher(executor.run, BATCH_MAX_WAIT_MS, BATCH_MAX_SIZE) if BATCH_MAX_WAIT_MS > 0 else None
+
+model_reloader = ModelReloader(ARTIFACT_DIR, swap_analyzer, flat_forest=INFERENCE_ENGINE == "flat",
+                               min_accuracy=RELOAD_MIN_ACCURACY, holdout_path=RELOAD_HOLDOUT_PATH)
+
+def activate_trained(job: dict):
+    # Jobs submitted with activate=true go live through the validated reload path
+    if job["request"]["activate"]:
+        model_reloader.load(job["model_version"])
+        print(f"Activated model artifact {job['model_version']}")
+
+hash_ring = HashRing(NODES)
+
+training_jobs = TrainingJobs(JOBS_DIR, ARTIFACT_DIR, TRAINING_NICE, TRAINING_CPUS, on_success=activate_trained)
+
+class TrainingRequest(BaseModel):
+    data_path: Optional[str] = None
+    search: str = Field("grid", regex=f"^({'|'.join(SEARCH_MODES)})$")
+    # RandomForestClassifier parameter -> candidate values; replaces the default grid
+    param_grid: Optional[dict] = None
+    warm_start: bool = False
+    max_rows_per_class: Optional[int] = Field(None, gt=0)
+    n_jobs: int = -1
+    activate: bool = False
+
+    @validator("param_grid")
+    def valid_param_grid(cls, grid):
+        return check_param_grid(grid) if grid is not None else None
+
+def train_missing_artifact(key: str) -> bool:
+    # Queue the training job unless another worker of this node holds the claim on key
+    claim = TrainingClaim(ARTIFACT_DIR, key)
+    if not claim.acquire():
+        return False
+    job = training_jobs.submit(TrainingRequest(data_path=DATA_PATH, activate=True).dict(), claim=claim)
+    print(f"No artifact {key}; training in the background (job {job['id']})")
+    return True
+
+def await_artifact(key: str):
+    # Load the artifact another worker trains once it is published; take the
+    # claim over if that worker finished or died without publishing one
+    while health_analyzer is None:
+        time.sleep(ARTIFACT_POLL_SECONDS)
+        try:
+            model_reloader.load(key)
+            print(f"Loaded model artifact {key} trained by another worker")
+            return
+        except ArtifactNotFound:
+            if train_missing_artifact(key):
+                return
+        except Exception as e:
+            print(f"Error loading model artifact {key}: {str(e)}")
+            return
+
 @app.on_event("startup")
 async def startup_event():
-    # Load and train the model when the application starts
+    # Load the persisted model; train in the background when no matching
+    # artifact exists, reporting not-ready until it is done
     try:
-        data = pd.read_csv("data/blood_test_data.csv")
-        accuracy = health_analyzer.train(data)
-        print(f"Model trained with accuracy: {accuracy}")
+        start = time.perf_counter()
+        analyzer = HealthAnalyzer(flat_forest=INFERENCE_ENGINE == "flat")
+        key = startup_key(DATA_PATH, TRAINING_CONFIG, MODEL_KEY)
+        meta = load_artifact(analyzer, key, ARTIFACT_DIR, serving_only=analyzer.flat_forest)
+        if meta is not None:
+            model_reloader.install(analyzer, meta)
+            MODEL_LOAD_SECONDS.observe(time.perf_counter() - start, source="startup")
+            print(f"Loaded model artifact {key} (accuracy: {meta['evaluation']['accuracy']}, "
+                  f"fingerprint: {analyzer.model_fingerprint})")
+        elif MODEL_KEY:
+            print(f"Artifact {key} not found in {ARTIFACT_DIR}")
+        elif not train_missing_artifact(key):
+            print(f"No artifact {key}; another worker is training it")
+            threading.Thread(target=await_artifact, args=(key,), daemon=True).start()
     except Exception as e:
-        print(f"Error training model: {str(e)}")
-
-def get_disease_risk_level(health_score: float, metrics_at_risk: int, total_metrics: int) -> dict:
-    # Calculate percentage of metrics at risk
-    risk_percentage = (metrics_at_risk / total_metrics) * 100
-    
-    if health_score >= 80 and risk_percentage < 10:
-        return {
-            "level": "Low",
-            "message": "Maintain healthy lifestyle"
-        }
-    elif health_score >= 70 or risk_percentage < 20:
-        return {
-            "level": "Medium",
-            "message": "Regular monitoring advised"
-        }
-    elif health_score >= 60 or risk_percentage < 30:
-        return {
-            "level": "Medium-High",
-            "message": "Schedule medical checkup soon"
-        }
-    elif health_score >= 50:
-        return {
-            "level": "High",
-            "message": "Consultation with healthcare provider recommended"
-        }
+        print(f"Error loading model: {str(e)}")
+    executor.artifact_dir = ARTIFACT_DIR
+    executor.start(health_analyzer.model_version if health_analyzer is not None else None)
+    if RELOAD_WATCH_INTERVAL > 0:
+        model_reloader.start_watching(RELOAD_WATCH_INTERVAL)
+    vitals_store.start_flusher()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    model_reloader.stop_watching()
+    training_jobs.shutdown()
+    executor.shutdown()
+    vitals_store.stop_flusher()
+
+async def run_analysis(values: np.ndarray, analyzer: HealthAnalyzer) -> list:
+    try:
+        if batcher is not None and len(values) == 1:
+            return [await batcher.submit(values[0], analyzer)]
+        return await executor.run(values, analyzer)
+    except ExecutorBusy as e:
+        REJECTED.inc(reason="busy")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": RETRY_AFTER_SECONDS})
+    except asyncio.TimeoutError:
+        REJECTED.inc(reason="timeout")
+        raise HTTPException(status_code=504, detail=f"Analysis took longer than {executor.timeout}s")
+
+def current_analyzer(request: Request) -> HealthAnalyzer:
+    analyzer = health_analyzer
+    if analyzer is None:
+        raise HTTPException(status_code=503, detail="Model not loaded yet", headers={"Retry-After": "5"})
+    # X-Model-Fingerprint names this analyzer, even if a reload lands before the response
+    request.state.model_fingerprint = analyzer.model_fingerprint
+    return analyzer
+
+def check_admin(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (set HEALTH_ADMIN_TOKEN)")
+    if token is None or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def training_data_path(data_path: Optional[str]) -> str:
+    # Relative paths are taken inside DATA_DIR; nothing outside it is read
+    if not data_path:
+        return DATA_PATH
+    path = os.path.realpath(os.path.join(DATA_DIR, data_path))
+    if os.path.commonpath([path, os.path.realpath(DATA_DIR)]) != os.path.realpath(DATA_DIR):
+        raise HTTPException(status_code=400, detail=f"Training data must be inside {DATA_DIR}")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=400, detail=f"Training data {data_path} not found")
+    return path
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+class ProfilerRequest(BaseModel):
+    enabled: bool
+    threshold_ms: float = 500
+    interval_ms: float = 5
+
+@app.post("/admin/profiler")
+async def toggle_profiler(request: ProfilerRequest, x_admin_token: Optional[str] = Header(None)):
+    # Runtime switch; while on, requests slower than threshold_ms dump their stack samples
+    check_admin(x_admin_token)
+    if request.enabled:
+        profiler.enable(request.threshold_ms, request.interval_ms)
     else:
-        return {
-            "level": "Very High",
-            "message": "Immediate medical attention recommended"
-        }
-
-def get_trend_analysis(metrics_data: dict) -> dict:
-    trends = {
-        "high_end_metrics": [],
-        "low_end_metrics": [],
-        "optimal_metrics": [],
-        "concerning_metrics": []
-    }
-    
-    for metric, data in metrics_data.items():
-        if data["interpretation"] == "High end of normal range":
-            trends["high_end_metrics"].append(metric)
-        elif data["interpretation"] == "Low end of normal range":
-            trends["low_end_metrics"].append(metric)
-        elif data["interpretation"] == "Optimal range":
-            trends["optimal_metrics"].append(metric)
-        else:
-            trends["concerning_metrics"].append(metric)
-    
-    return trends
-
-def get_detailed_recommendations(patient_data: PatientData, trends: dict, disease_prediction: str) -> dict:
-    recommendations = {
-        "urgent_actions": [],
-        "monitoring_needed": [],
-        "lifestyle_changes": [],
-        "preventive_measures": []
+        profiler.disable()
+    return profiler.status()
+
+@app.get("/admin/profiler")
+async def profiler_status(x_admin_token: Optional[str] = Header(None)):
+    check_admin(x_admin_token)
+    return profiler.status()
+
+@app.get("/ready")
+async def readiness(request: Request):
+    analyzer = health_analyzer
+    if analyzer is not None:
+        request.state.model_fingerprint = analyzer.model_fingerprint
+    body = {
+        "ready": analyzer is not None,
+        "model_version": analyzer.model_version if analyzer is not None else None,
+        "model_fingerprint": analyzer.model_fingerprint if analyzer is not None else None,
+        "node_id": NODE_ID,
+        "last_reload": model_reloader.last_result,
     }
-    
-    if disease_prediction == "Diabetes":
-        if patient_data.glucose > 95:
-            recommendations["monitoring_needed"].append({
-                "parameter": "Blood Glucose",
-                "current": patient_data.glucose,
-                "action": "Regular glucose monitoring",
-                "target": "Maintain below 95 mg/dL"
-            })
-        if patient_data.hba1c > 5.5:
-            recommendations["urgent_actions"].append({
-                "parameter": "HbA1c",
-                "current": patient_data.hba1c,
-                "action": "Consult endocrinologist",
-                "target": "Maintain below 5.5%"
-            })
-    
-    if len(trends["high_end_metrics"]) > 3:
-        recommendations["preventive_measures"].append({
-            "focus": "Multiple borderline metrics",
-            "action": "Schedule comprehensive health checkup",
-            "metrics": trends["high_end_metrics"]
-        })
-    
-    return recommendations
+    if analyzer is None:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+@app.get("/route/{user_id}")
+async def route(user_id: str):
+    # Node that owns this patient's cache and history entries (consistent hash over HEALTH_NODES)
+    if not NODES:
+        raise HTTPException(status_code=404, detail="No cluster configured (HEALTH_NODES)")
+    node = hash_ring.node_for(user_id)
+    return {"user_id": user_id, "node": node, "local": node == NODE_ID}
+
+class ReloadRequest(BaseModel):
+    key: Optional[str] = None
+
+@app.post("/admin/reload")
+async def reload_model(request: ReloadRequest = None, x_admin_token: Optional[str] = Header(None)):
+    check_admin(x_admin_token)
+    key = request.key if request is not None else None
+    # Loading and validation run in a worker thread; requests keep being
+    # served by the current model until the swap
+    try:
+        return await run_in_threadpool(model_reloader.load, key)
+    except ArtifactNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ReloadError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/admin/train", status_code=202)
+async def submit_training(request: TrainingRequest, x_admin_token: Optional[str] = Header(None)):
+    # Queues a training job; poll /admin/train/jobs/{id} for progress
+    check_admin(x_admin_token)
+    request.data_path = training_data_path(request.data_path)
+    return training_jobs.submit(request.dict())
+
+@app.get("/admin/train/jobs")
+async def list_training_jobs(status: Optional[str] = Query(None), x_admin_token: Optional[str] = Header(None)):
+    check_admin(x_admin_token)
+    return {**training_jobs.stats(), "jobs": training_jobs.list(status)}
+
+@app.get("/admin/train/jobs/{job_id}")
+async def training_job(job_id: str, x_admin_token: Optional[str] = Header(None)):
+    check_admin(x_admin_token)
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown training job {job_id}")
+    return job
 
 @app.post("/analyze")
-async def analyze_health(patient_data: PatientData):
+async def analyze_health(patient_data: PatientData, request: Request,
+                         view: str = Query("full", regex="^(full|summary)$"),
+                         userId: Optional[str] = None, timestamp: Optional[int] = None, vitals: bool = False):
+    # Read the analyzer once so a concurrent reload cannot change it mid-request
+    analyzer = current_analyzer(request)
+    request_start = request.scope.get("state", {}).get("request_start")
+    if request_start is not None:
+        # Body read and pydantic validation happen before the handler runs
+        STAGE_SECONDS.observe(time.perf_counter() - request_start, stage="parse")
     try:
-        # Get data with proper field names
-        data_dict = {}
-        for field_name, field in patient_data.__fields__.items():
-            alias = field.field_info.alias
-            value = getattr(patient_data, field_name)
-            data_dict[alias] = value
-            
-        # Create DataFrame with the correct structure
-        data = pd.DataFrame([data_dict])
-        
-        # Get predictions
-        prediction_result = health_analyzer.predict_disease(data)
-        disease_prediction = prediction_result['prediction']
-        probabilities = prediction_result['probabilities']
-        health_score = health_analyzer.calculate_health_score(data)
-        
-        # Enhanced recommendations logic
-        recommendations = [
-            "Consult healthcare provider" if health_score < 60 else "Regular checkup recommended",
-            *(f"High {field.alias}: {getattr(patient_data, field.name)}" 
-              for field in patient_data.__fields__.values() 
-              if field.name in normal_ranges 
-              and getattr(patient_data, field.name) > normal_ranges[field.name][1]),
-            *(f"Low {field.alias}: {getattr(patient_data, field.name)}" 
-              for field in patient_data.__fields__.values() 
-              if field.name in normal_ranges 
-              and getattr(patient_data, field.name) < normal_ranges[field.name][0])
-        ]
-
-        # Add specific disease risk factors
-        if disease_prediction == "Diabetes":
-            if patient_data.glucose > 100:
-                recommendations.append("Monitor blood glucose levels closely")
-            if patient_data.hba1c > 5.5:
-                recommendations.append("HbA1c levels indicate pre-diabetes risk")
-            if patient_data.bmi > 25:
-                recommendations.append("Weight management recommended")
-
-        # Count metrics at risk (in high end of normal range or abnormal)
-        metrics_at_risk = len([field for field in patient_data.__fields__ 
-                             if field in normal_ranges and
-                             (getattr(patient_data, field) < normal_ranges[field][0] or
-                              getattr(patient_data, field) > normal_ranges[field][1])])
-
-        risk_assessment = get_disease_risk_level(
-            health_score, 
-            metrics_at_risk,
-            len(patient_data.__fields__)
-        )
-        
-        # Enhanced recommendations with context
-        base_recommendations = []
-        if disease_prediction == "Diabetes":
-            if patient_data.glucose > 100:
-                base_recommendations.append({
-                    "concern": "Elevated Glucose",
-                    "message": "Monitor blood glucose levels closely",
-                    "current_value": patient_data.glucose,
-                    "ideal_range": normal_ranges["glucose"]
-                })
-            if patient_data.hba1c > 5.5:
-                base_recommendations.append({
-                    "concern": "Elevated HbA1c",
-                    "message": "HbA1c levels indicate pre-diabetes risk",
-                    "current_value": patient_data.hba1c,
-                    "ideal_range": normal_ranges["hba1c"]
-                })
-        
-        metrics_data = {
-            field: {
-                "value": getattr(patient_data, field),
-                "status": "Normal" if field in normal_ranges 
-                        and normal_ranges[field][0] <= getattr(patient_data, field) <= normal_ranges[field][1] 
-                        else "Abnormal",
-                "normal_range": normal_ranges.get(field, None),
-                "interpretation": get_metric_interpretation(field, getattr(patient_data, field))
-            } for field in patient_data.__fields__
-        }
-        
-        trends = get_trend_analysis(metrics_data)
-        detailed_recommendations = get_detailed_recommendations(patient_data, trends, disease_prediction)
-        
-        # Add value status checks
-        abnormal_metrics = {
-            field: get_value_status(field, getattr(patient_data, field))
-            for field in patient_data.__fields__
-            if field in normal_ranges and get_value_status(field, getattr(patient_data, field))["warning"]
-        }
-        
-        return {
-            "summary": {
-                "health_score": health_score,
-                "risk_level": risk_assessment["level"],
-                "risk_message": risk_assessment["message"],
-                "predicted_condition": disease_prediction,
-                "confidence": float(max(probabilities))
-            },
-            "analysis": {
-                "metrics_overview": {
-                    "total_metrics": len(patient_data.__fields__),
-                    "metrics_at_risk": metrics_at_risk,
-                    "normal_metrics": len(patient_data.__fields__) - metrics_at_risk,
-                    "trends": trends
-                },
-                "detailed_metrics": metrics_data,
-                "risk_factors": get_risk_factors(patient_data, disease_prediction)
-            },
-            "action_plan": {
-                "immediate_actions": detailed_recommendations["urgent_actions"],
-                "monitoring": detailed_recommendations["monitoring_needed"],
-                "lifestyle_changes": [
-                    {
-                        "area": "Diet",
-                        "recommendation": "Review diet with nutritionist" if health_score < 70 else "Maintain balanced diet",
-                        "importance": "High" if health_score < 70 else "Medium"
-                    },
-                    {
-                        "area": "Exercise",
-                        "recommendation": "Begin light exercise routine" if health_score < 70 else "Regular exercise",
-                        "importance": "Medium"
-                    },
-                    {
-                        "area": "Health Monitoring",
-                        "recommendation": "Schedule comprehensive health assessment" if health_score < 80 else "Regular checkups",
-                        "importance": "High" if health_score < 70 else "Medium"
-                    }
-                ],
-                "preventive_measures": detailed_recommendations["preventive_measures"]
-            },
-            "warnings": {
-                "abnormal_metrics": abnormal_metrics,
-                "critical_values": [
-                    field for field, status in abnormal_metrics.items()
-                    if status.get("severity") == "High"
-                ]
-            }
-        }
+        with STAGE_SECONDS.time(stage="matrix"):
+            values = patients_to_matrix([patient_data])
+            window = apply_vitals(values, userId) if vitals else None
+        if analysis_cache is None:
+            report = (await run_analysis(values, analyzer))[0]
+        else:
+            # The submitted values are analyzed as they are; rounding only
+            # goes into the key, and a hit requires the exact same panel
+            with STAGE_SECONDS.time(stage="cache_lookup"):
+                key = cache_key(values[0], analyzer.model_version)
+                report = analysis_cache.get(key, values[0])
+            if report is None:
+                report = (await run_analysis(values, analyzer))[0]
+                analysis_cache.set(key, values[0], report)
+        with STAGE_SECONDS.time(stage="history"):
+            report = await with_history(report, userId, values[0], timestamp, window)
+        with STAGE_SECONDS.time(stage="serialize"):
+            return render(select_view(report, view), request.headers.get("accept", ""))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-def get_value_status(field_name: str, value: float) -> dict:
-    if field_name not in normal_ranges:
-        return {"status": "Unknown", "warning": None}
-    
-    min_val, max_val = normal_ranges[field_name]
-    if value < min_val:
-        return {
-            "status": "Low",
-            "warning": f"Below normal range ({min_val}-{max_val})",
-            "severity": "High" if value < min_val * 0.8 else "Medium"
-        }
-    elif value > max_val:
-        return {
-            "status": "High",
-            "warning": f"Above normal range ({min_val}-{max_val})",
-            "severity": "High" if value > max_val * 1.2 else "Medium"
-        }
-    return {"status": "Normal", "warning": None}
-
-def get_metric_interpretation(field: str, value: float) -> str:
-    if field not in normal_ranges:
-        return "No interpretation available"
-    
-    min_val, max_val = normal_ranges[field]
-    if value < min_val:
-        return "Below normal range"
-    elif value > max_val:
-        return "Above normal range"
+def apply_vitals(values: np.ndarray, user_id: Optional[str]) -> Optional[dict]:
+    # Replace the submitted Heart Rate with the resting rate of the user's
+    # recent WearOS window, when there is one and it is not stale
+    window = vitals_store.current_window(user_id) if user_id else None
+    if window is not None and window.get("resting_heart_rate") is not None:
+        values[:, FIELD_INDEX["heart_rate"]] = window["resting_heart_rate"]
+    return window
+
+async def with_history(report: dict, user_id: Optional[str], values: np.ndarray, timestamp: Optional[int],
+                       window: Optional[dict] = None) -> dict:
+    # Record the panel and attach per-metric trends and the vitals window;
+    # the (possibly cached) report itself is never modified
+    extra = {}
+    if history_store is not None and user_id:
+        extra["history"] = await run_in_threadpool(history_store.record, user_id, values, timestamp)
+    if window is not None:
+        extra["vitals"] = window
+    if not extra:
+        return report
+    return {**report, "analysis": {**report["analysis"], **extra}}
+
+def parse_vitals(body: bytes, content_type: str):
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        records = [orjson.loads(line) for line in body.splitlines() if line.strip()]
     else:
-        if value <= (min_val + (max_val - min_val) * 0.25):
-            return "Low end of normal range"
-        elif value >= (max_val - (max_val - min_val) * 0.25):
-            return "High end of normal range"
-        return "Optimal range"
-
-def get_risk_factors(patient_data: PatientData, prediction: str) -> dict:
-    risk_factors = {
-        "Diabetes": {
-            "primary": ["glucose", "hba1c", "insulin"],
-            "secondary": ["bmi", "triglycerides", "hdl_cholesterol"]
-        }
-        # Add more diseases and their risk factors
-    }
-    
-    if prediction not in risk_factors:
-        return {}
-    
-    return {
-        "primary_factors": [
-            {
-                "metric": field,
-                "value": getattr(patient_data, field),
-                "status": "Normal" if field in normal_ranges 
-                        and normal_ranges[field][0] <= getattr(patient_data, field) <= normal_ranges[field][1] 
-                        else "Abnormal"
-            }
-            for field in risk_factors[prediction]["primary"]
-        ],
-        "secondary_factors": [
-            {
-                "metric": field,
-                "value": getattr(patient_data, field),
-                "status": "Normal" if field in normal_ranges 
-                        and normal_ranges[field][0] <= getattr(patient_data, field) <= normal_ranges[field][1] 
-                        else "Abnormal"
-            }
-            for field in risk_factors[prediction]["secondary"]
-        ]
-    }
+        records = orjson.loads(body)
+    if not isinstance(records, list):
+        raise ValueError("Expected a JSON array or NDJSON of samples")
+    try:
+        user_ids = [str(record["userId"]) for record in records]
+        timestamps = [int(record["timestamp"]) for record in records]
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Every sample needs userId and an integer timestamp")
+    heart_rates = [record.get("heartRate") for record in records]
+    step_counts = [record.get("stepCount") for record in records]
+    nan = float("nan")
+    return (user_ids, timestamps, [nan if v is None else v for v in heart_rates],
+            [nan if v is None else v for v in step_counts])
+
+def ingest_vitals(body: bytes, content_type: str) -> int:
+    return vitals_store.ingest(*parse_vitals(body, content_type))
+
+@app.post("/vitals/stream")
+async def stream_vitals(request: Request):
+    # Bulk WearOS samples; parsing and ingestion run off the event loop
+    body = await request.body()
+    try:
+        accepted = await run_in_threadpool(ingest_vitals, body, request.headers.get("content-type", ""))
+    except (ValueError, orjson.JSONDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"accepted": accepted}
+
+@app.get("/vitals/stats")
+async def vitals_stats():
+    return vitals_store.stats()
+
+@app.get("/vitals/{user_id}")
+async def vitals_window(user_id: str, window: Optional[float] = Query(None, gt=0),
+                        bucket: Optional[float] = Query(None, gt=0)):
+    result = {"window": vitals_store.window(user_id, window)}
+    if result["window"] is None:
+        raise HTTPException(status_code=404, detail=f"No vitals for {user_id}")
+    if bucket:
+        result["buckets"] = vitals_store.tumbling(user_id, bucket)
+    return render(result)
+
+@app.get("/history/{user_id}")
+async def history_trends(user_id: str):
+    if history_store is None:
+        raise HTTPException(status_code=404, detail="History is not enabled")
+    return render(await run_in_threadpool(history_store.trends, user_id))
+
+@app.get("/history/{user_id}/{metric}")
+async def history_series(user_id: str, metric: str, since: Optional[int] = None, until: Optional[int] = None,
+                         limit: int = Query(1000, ge=1, le=100000)):
+    if history_store is None:
+        raise HTTPException(status_code=404, detail="History is not enabled")
+    if metric not in FIELD_NAMES:
+        raise HTTPException(status_code=404, detail=f"Unknown metric {metric}")
+    return render(await run_in_threadpool(history_store.series, user_id, metric, since, until, limit))
+
+@app.get("/cache/stats")
+async def cache_stats():
+    if analysis_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **analysis_cache.stats()}
+
+@app.get("/executor/stats")
+async def executor_stats():
+    return executor.stats()
+
+@app.get("/batcher/stats")
+async def batcher_stats():
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **batcher.stats()}
+
+def patients_to_matrix(patients: list) -> np.ndarray:
+    return np.array([read_values(patient) for patient in patients], dtype=float).reshape(len(patients), len(FIELD_NAMES))
+
+def parse_patient_batch(body: bytes, content_type: str) -> list:
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        records = [json.loads(line) for line in body.splitlines() if line.strip()]
+    else:
+        records = json.loads(body)
+    if not isinstance(records, list):
+        raise ValueError("Expected a JSON array or NDJSON of patients")
+    return [PatientData.parse_obj(record) for record in records]
+
+@app.post("/analyze/batch")
+async def analyze_health_batch(request: Request, view: str = Query("full", regex="^(full|summary)$")):
+    try:
+        patients = parse_patient_batch(await request.body(), request.headers.get("content-type", ""))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not patients:
+        return []
+
+    analyzer = current_analyzer(request)
+    try:
+        reports = await run_analysis(patients_to_matrix(patients), analyzer)
+        return render([select_view(report, view) for report in reports], request.headers.get("accept", ""))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,176 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Minimal Prometheus-style metrics: counters, gauges and histograms with
+# labels, rendered in the text exposition format on /metrics.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DURATION_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        return self.header() + [f"{self.name}{_label_text(self.labels, key)} {value}"
+                                for key, value in sorted(self.values.items())]
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def render(self):
+        return self.header() + [f"{self.name}{_label_text(self.labels, key)} {value}"
+                                for key, value in sorted(self.values.items())]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                # Per-bucket (non-cumulative) counts, sum, count
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = self.header()
+        with self.lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self.values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                label_text = _label_text(self.labels + ("le",), key + (bound,))
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.register(Histogram(
+    "health_request_seconds", "End-to-end request latency", ("path",)))
+STAGE_SECONDS = registry.register(Histogram(
+    "health_analyze_stage_seconds", "Time spent in each /analyze stage", ("stage",)))
+PREDICTIONS = registry.register(Counter(
+    "health_predictions_total", "Analyses by predicted class", ("predicted_class",)))
+RISK_LEVELS = registry.register(Counter(
+    "health_risk_levels_total", "Analyses by risk level", ("risk_level",)))
+REJECTED = registry.register(Counter(
+    "health_rejected_requests_total", "Requests turned away by the executor", ("reason",)))
+MODEL_LOAD_SECONDS = registry.register(Histogram(
+    "health_model_load_seconds", "Time to load (and validate) a model artifact", ("source",), DURATION_BUCKETS))
+TRAINING_SECONDS = registry.register(Gauge(
+    "health_model_training_seconds", "Training time recorded in the serving artifact"))
+TRAINING_STAGE_SECONDS = registry.register(Gauge(
+    "health_model_training_stage_seconds", "Per-stage training time of the serving artifact", ("stage",)))
+TRAINING_JOBS = registry.register(Counter(
+    "health_training_jobs_total", "Finished background training jobs", ("status",)))
+MODEL_INFO = registry.register(Gauge(
+    "health_model_info", "Serving model version and fingerprint", ("model_version", "fingerprint")))
+
+def record_analysis(reports, timings):
+    # Stage timings and per-class / per-risk-level counts of one analysis call
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
+    for report in reports:
+        summary = report["summary"]
+        PREDICTIONS.inc(predicted_class=summary["predicted_condition"])
+        RISK_LEVELS.inc(risk_level=summary["risk_level"])
+
+def record_model(model_version, evaluation=None, training_seconds=None, fingerprint=None):
+    with MODEL_INFO.lock:
+        MODEL_INFO.values.clear()
+    MODEL_INFO.set(1, model_version=model_version, fingerprint=fingerprint or "")
+    if training_seconds is not None:
+        TRAINING_SECONDS.set(training_seconds)
+    for stage, seconds in ((evaluation or {}).get("stage_seconds") or {}).items():
+        TRAINING_STAGE_SECONDS.set(seconds, stage=stage)
+
+class TimingMiddleware:
+    # Plain ASGI middleware (no BaseHTTPMiddleware overhead): stamps the
+    # request start for stage timing, observes end-to-end latency and hands
+    # slow requests to the sampling profiler when it is enabled
+    PATHS = {"/analyze", "/analyze/batch", "/vitals/stream"}
+
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        scope.setdefault("state", {})["request_start"] = start
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            end = time.perf_counter()
+            path = scope["path"] if scope["path"] in self.PATHS else "other"
+            REQUEST_SECONDS.observe(end - start, path=path)
+            if self.profiler is not None and self.profiler.enabled:
+                self.profiler.finish(scope["path"], start, end)
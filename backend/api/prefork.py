@@ -0,0 +1,140 @@
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+# Pre-fork server. The master binds the listening socket, imports the
+# serving modules and maps the model's serving arrays once, then forks the
+# workers. Workers start out sharing all of the master's pages
+# copy-on-write. The mapped model is read-only, so it stays shared for the
+# life of the workers. Unlike `uvicorn --workers`, which spawns fresh
+# interpreters, nothing is imported or loaded twice.
+#
+#   HEALTH_INFERENCE_ENGINE=flat python -m api.prefork --workers 4
+#
+# Reads the same HEALTH_DATA_PATH / HEALTH_ARTIFACT_DIR / HEALTH_MODEL_KEY /
+# HEALTH_INFERENCE_ENGINE as api.main. api.main itself is imported in the workers, after the fork,
+# so no thread or SQLite connection is ever shared between processes.
+
+# A worker that exits within WORKER_MIN_UPTIME seconds of its fork counts as
+# a failed start. Each failed start in a row doubles the delay before the next
+# fork (up to RESTART_BACKOFF_MAX); after MAX_FAILED_STARTS in a row the
+# configuration or artifact is assumed broken and the master exits.
+WORKER_MIN_UPTIME = 5.0
+RESTART_BACKOFF = 0.5
+RESTART_BACKOFF_MAX = 30.0
+MAX_FAILED_STARTS = 5
+
+def preload(data_path, artifact_dir, engine, model_key=None):
+    import fastapi  # noqa: F401
+    import orjson  # noqa: F401
+    import uvicorn  # noqa: F401
+    import api.reports  # noqa: F401
+    from models.artifact import SERVING_INDEX, artifact_path, map_serving_arrays, startup_key
+    from models.health_analyzer import TRAINING_CONFIG
+
+    if engine != "flat":
+        return None
+    # The artifact the workers' api.main will load
+    path = artifact_path(startup_key(data_path, TRAINING_CONFIG, model_key), artifact_dir)
+    if not os.path.exists(os.path.join(path, SERVING_INDEX)):
+        return None
+    _, arrays = map_serving_arrays(path)
+    # Fault the pages in once, before the fork
+    for array in arrays.values():
+        array.sum()
+    return path
+
+def run_worker(sock, log_level):
+    import uvicorn
+    from api.main import app
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=[sock])
+
+def fork_worker(sock, log_level):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        try:
+            run_worker(sock, log_level)
+            os._exit(0)
+        except BaseException:
+            traceback.print_exc()
+            os._exit(1)
+    return pid
+
+def serve(host, port, workers, log_level="info"):
+    from models.artifact import DEFAULT_ARTIFACT_DIR
+    from models.train import DEFAULT_DATA_PATH
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    mapped = preload(os.environ.get("HEALTH_DATA_PATH", DEFAULT_DATA_PATH),
+                     os.environ.get("HEALTH_ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR),
+                     os.environ.get("HEALTH_INFERENCE_ENGINE", "sklearn"),
+                     os.environ.get("HEALTH_MODEL_KEY"))
+    print(f"Pre-fork master {os.getpid()} on {host}:{port}, "
+          f"{f'model mapped from {mapped}' if mapped else 'no model mapped'}")
+
+    # Fork time of every live worker
+    pids = {fork_worker(sock, log_level): time.monotonic() for _ in range(workers)}
+    stopping = False
+    failed_starts = 0
+    exit_code = 0
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    while pids:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = pids.pop(pid, None)
+        if stopping or started is None:
+            continue
+        failed_starts = failed_starts + 1 if time.monotonic() - started < WORKER_MIN_UPTIME else 0
+        if failed_starts >= MAX_FAILED_STARTS:
+            print(f"Worker {pid} exited with status {status}; {failed_starts} workers in a row failed to start, "
+                  f"stopping")
+            stop(None, None)
+            exit_code = 1
+            continue
+        # Replace a crashed worker; it forks from the same preloaded master
+        delay = min(RESTART_BACKOFF * 2 ** (failed_starts - 1), RESTART_BACKOFF_MAX) if failed_starts else 0
+        print(f"Worker {pid} exited with status {status}; starting a new one in {delay:g}s")
+        deadline = time.monotonic() + delay
+        while not stopping and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if not stopping:
+            pids[fork_worker(sock, log_level)] = time.monotonic()
+    sock.close()
+    return exit_code
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve api.main:app from pre-forked workers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    sys.exit(serve(args.host, args.port, args.workers, args.log_level))
+
+if __name__ == "__main__":
+    main()
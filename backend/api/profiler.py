@@ -0,0 +1,85 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+class SamplingProfiler:
+    # Opt-in statistical profiler. While enabled, a background thread
+    # samples the stack of every thread each `interval` seconds into a
+    # bounded ring. A request slower than `threshold` gets the samples taken
+    # during its lifetime written out as collapsed stacks (one
+    # "frame;frame;frame count" line each, the flamegraph.pl input format).
+    # Concurrent requests share samples, so a dump shows everything the
+    # process did while the slow request was running.
+
+    def __init__(self, output_dir="profiles", max_samples=100000, max_dumps=50):
+        self.output_dir = output_dir
+        self.enabled = False
+        self.interval = 0.005
+        self.threshold = 0.5
+        self.samples = deque(maxlen=max_samples)
+        self.dumps = deque(maxlen=max_dumps)
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def enable(self, threshold_ms=500, interval_ms=5):
+        with self.lock:
+            self.threshold = threshold_ms / 1000
+            self.interval = interval_ms / 1000
+            if self.thread is None:
+                # A fresh event per thread so a quick disable/enable never leaves two samplers
+                self.stop_event = threading.Event()
+                self.thread = threading.Thread(target=self._sample_loop, args=(self.stop_event,), daemon=True,
+                                               name="sampling-profiler")
+                self.thread.start()
+            self.enabled = True
+
+    def disable(self):
+        with self.lock:
+            self.enabled = False
+            self.stop_event.set()
+            self.thread = None
+            self.samples.clear()
+
+    def _sample_loop(self, stop_event):
+        own_id = threading.get_ident()
+        while not stop_event.wait(self.interval):
+            now = time.perf_counter()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples.append((now, ";".join(reversed(stack))))
+
+    def finish(self, path, start, end):
+        # Called at the end of every request while enabled
+        if not self.enabled or end - start < self.threshold:
+            return None
+        stacks = Counter(stack for at, stack in list(self.samples) if start <= at <= end)
+        if not stacks:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = f"profile-{int(time.time() * 1000)}-{int((end - start) * 1000)}ms.txt"
+        file_path = os.path.join(self.output_dir, name)
+        with open(file_path, "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.dumps.append({"path": path, "duration_ms": round((end - start) * 1000, 1),
+                           "samples": sum(stacks.values()), "file": file_path})
+        return file_path
+
+    def status(self):
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold * 1000,
+            "interval_ms": self.interval * 1000,
+            "buffered_samples": len(self.samples),
+            "output_dir": self.output_dir,
+            "dumps": list(self.dumps),
+        }
@@ -0,0 +1,124 @@
+import threading
+import time
+from models.health_analyzer import HealthAnalyzer
+from models.layout import FEATURE_COLUMNS
+from models.artifact import load_artifact, load_holdout, list_artifacts
+from models.data_loader import load_training_data
+from api.metrics import MODEL_LOAD_SECONDS, record_model
+
+class ReloadError(Exception):
+    pass
+
+class ArtifactNotFound(ReloadError):
+    pass
+
+class ModelReloader:
+    # Loads artifacts into a fresh HealthAnalyzer off the request path,
+    # validates them and hands the finished analyzer to `swap`. Requests
+    # keep whichever analyzer they picked up, so in-flight work finishes on
+    # the old model and no lock is taken while serving.
+
+    def __init__(self, artifact_dir, swap, flat_forest=False, min_accuracy=0.9, holdout_path=None):
+        # Candidates are scored on the test split saved with their artifact;
+        # holdout_path is a CSV in the training layout for artifacts without one
+        self.holdout_path = holdout_path
+        self.artifact_dir = artifact_dir
+        self.swap = swap
+        self.flat_forest = flat_forest
+        self.min_accuracy = min_accuracy
+        self.current_version = None
+        self.last_result = None
+        self.holdout = None
+        # Serializes reloads with each other, never with requests
+        self.lock = threading.Lock()
+        self.watcher = None
+        self.stop_event = threading.Event()
+
+    def _holdout(self, key):
+        holdout = load_holdout(key, self.artifact_dir)
+        if holdout is not None:
+            return holdout
+        if self.holdout_path is None:
+            raise ReloadError(f"Artifact {key} has no held-out test split and no holdout file is configured")
+        if self.holdout is None:
+            self.holdout = load_training_data(self.holdout_path)
+        return self.holdout
+
+    def validate(self, analyzer, key):
+        if list(analyzer.feature_columns) != FEATURE_COLUMNS:
+            raise ReloadError("Artifact feature columns do not match the serving layout")
+        X, y = self._holdout(key)
+        accuracy = analyzer.holdout_accuracy(X, y)
+        if accuracy < self.min_accuracy:
+            raise ReloadError(f"Holdout accuracy {accuracy:.4f} is below {self.min_accuracy}")
+        return accuracy
+
+    def install(self, analyzer, meta, accuracy=None):
+        # Publish an already loaded analyzer
+        analyzer.prepare()
+        self.swap(analyzer)
+        record_model(analyzer.model_version, meta.get("evaluation") if meta else None,
+                     meta.get("training_seconds") if meta else None, analyzer.model_fingerprint)
+        self.current_version = analyzer.model_version
+        self.last_result = {
+            "status": "loaded",
+            "model_version": analyzer.model_version,
+            "model_fingerprint": analyzer.model_fingerprint,
+            "holdout_accuracy": accuracy,
+            "accuracy": meta["evaluation"]["accuracy"] if meta else None,
+            "loaded_at": int(time.time()),
+        }
+        return self.last_result
+
+    def load(self, key=None):
+        # key None picks the newest artifact in artifact_dir
+        with self.lock:
+            start = time.perf_counter()
+            try:
+                if key is None:
+                    artifacts = list_artifacts(self.artifact_dir)
+                    if not artifacts:
+                        raise ArtifactNotFound(f"No artifacts in {self.artifact_dir}")
+                    key = artifacts[0]["key"]
+                analyzer = HealthAnalyzer(flat_forest=self.flat_forest)
+                meta = load_artifact(analyzer, key, self.artifact_dir, serving_only=self.flat_forest)
+                if meta is None:
+                    raise ArtifactNotFound(f"Artifact {key} not found in {self.artifact_dir}")
+                accuracy = self.validate(analyzer, key)
+                result = self.install(analyzer, meta, accuracy)
+                MODEL_LOAD_SECONDS.observe(time.perf_counter() - start, source="reload")
+                return result
+            except ReloadError as e:
+                self.last_result = {"status": "rejected", "model_version": key, "error": str(e),
+                                    "loaded_at": int(time.time())}
+                raise
+
+    def _newest_key(self):
+        artifacts = list_artifacts(self.artifact_dir)
+        return artifacts[0]["key"] if artifacts else None
+
+    def _watch(self, interval):
+        rejected = None
+        while not self.stop_event.wait(interval):
+            try:
+                key = self._newest_key()
+                if key is None or key == self.current_version or key == rejected:
+                    continue
+                self.load(key)
+                print(f"Hot reloaded model artifact {key}")
+            except ReloadError as e:
+                rejected = key
+                print(f"Rejected model artifact {key}: {e}")
+            except Exception as e:
+                print(f"Error watching artifacts: {str(e)}")
+
+    def start_watching(self, interval):
+        # Poll artifact_dir and load any newer artifact
+        if self.watcher is None:
+            self.stop_event.clear()
+            self.watcher = threading.Thread(target=self._watch, args=(interval,), daemon=True)
+            self.watcher.start()
+
+    def stop_watching(self):
+        self.stop_event.set()
+        self.watcher = None
@@ -0,0 +1,191 @@
+import time
+import numpy as np
+from models.health_analyzer import HealthAnalyzer
+from models.constants import normal_ranges
+from models.rules import RuleSet
+from models.layout import FIELD_NAMES, RANGE_MIN, RANGE_MAX, LOW_END, HIGH_END, SEVERE_LOW, SEVERE_HIGH
+
+# Everything after the model call: turns analyzer output into /analyze
+# responses. Kept free of the FastAPI app so pool workers can import it.
+
+NORMAL_RANGES = [normal_ranges[field] for field in FIELD_NAMES]
+LOW_WARNINGS = [f"Below normal range ({normal_ranges[field][0]}-{normal_ranges[field][1]})" for field in FIELD_NAMES]
+HIGH_WARNINGS = [f"Above normal range ({normal_ranges[field][0]}-{normal_ranges[field][1]})" for field in FIELD_NAMES]
+
+# Interpretation codes
+BELOW, ABOVE, LOW_END_CODE, HIGH_END_CODE, OPTIMAL = range(5)
+INTERPRETATIONS = [
+    "Below normal range",
+    "Above normal range",
+    "Low end of normal range",
+    "High end of normal range",
+    "Optimal range"
+]
+
+# Disease and critical-threshold rules, compiled once
+rule_set = RuleSet()
+
+def get_disease_risk_level(health_score: float, metrics_at_risk: int, total_metrics: int) -> dict:
+    # Calculate percentage of metrics at risk
+    risk_percentage = (metrics_at_risk / total_metrics) * 100
+    
+    if health_score >= 80 and risk_percentage < 10:
+        return {
+            "level": "Low",
+            "message": "Maintain healthy lifestyle"
+        }
+    elif health_score >= 70 or risk_percentage < 20:
+        return {
+            "level": "Medium",
+            "message": "Regular monitoring advised"
+        }
+    elif health_score >= 60 or risk_percentage < 30:
+        return {
+            "level": "Medium-High",
+            "message": "Schedule medical checkup soon"
+        }
+    elif health_score >= 50:
+        return {
+            "level": "High",
+            "message": "Consultation with healthcare provider recommended"
+        }
+    else:
+        return {
+            "level": "Very High",
+            "message": "Immediate medical attention recommended"
+        }
+
+def build_report(health_score: float, risk_assessment: dict, disease_prediction: str, confidence: float,
+                 metrics_at_risk: int, trends: dict, metrics_data: dict, risk_factors: dict,
+                 detailed_recommendations: dict, abnormal_metrics: dict) -> dict:
+    return {
+        "summary": {
+            "health_score": health_score,
+            "risk_level": risk_assessment["level"],
+            "risk_message": risk_assessment["message"],
+            "predicted_condition": disease_prediction,
+            "confidence": confidence
+        },
+        "analysis": {
+            "metrics_overview": {
+                "total_metrics": len(FIELD_NAMES),
+                "metrics_at_risk": metrics_at_risk,
+                "normal_metrics": len(FIELD_NAMES) - metrics_at_risk,
+                "trends": trends
+            },
+            "detailed_metrics": metrics_data,
+            "risk_factors": risk_factors
+        },
+        "action_plan": {
+            "immediate_actions": detailed_recommendations["urgent_actions"],
+            "monitoring": detailed_recommendations["monitoring_needed"],
+            "lifestyle_changes": [
+                {
+                    "area": "Diet",
+                    "recommendation": "Review diet with nutritionist" if health_score < 70 else "Maintain balanced diet",
+                    "importance": "High" if health_score < 70 else "Medium"
+                },
+                {
+                    "area": "Exercise",
+                    "recommendation": "Begin light exercise routine" if health_score < 70 else "Regular exercise",
+                    "importance": "Medium"
+                },
+                {
+                    "area": "Health Monitoring",
+                    "recommendation": "Schedule comprehensive health assessment" if health_score < 80 else "Regular checkups",
+                    "importance": "High" if health_score < 70 else "Medium"
+                }
+            ],
+            "preventive_measures": detailed_recommendations["preventive_measures"]
+        },
+        "warnings": {
+            "abnormal_metrics": abnormal_metrics,
+            "critical_values": [
+                field for field, status in abnormal_metrics.items()
+                if status.get("severity") == "High"
+            ]
+        }
+    }
+
+def analyze_matrix(values: np.ndarray, analyzer: HealthAnalyzer, timings: dict = None) -> list:
+    # One scaling pass and one model call for the whole matrix
+    result = analyzer.analyze_batch(values, timings=timings)
+    start = time.perf_counter()
+    reports = build_reports(values, result['predictions'], result['probabilities'], result['health_scores'])
+    if timings is not None:
+        timings['reports'] = time.perf_counter() - start
+    return reports
+
+def analyze_timed(values: np.ndarray, analyzer: HealthAnalyzer):
+    # (reports, seconds per stage); the timings travel back from pool workers
+    timings = {}
+    reports = analyze_matrix(values, analyzer, timings)
+    return reports, timings
+
+def build_reports(values: np.ndarray, predictions, probabilities, health_scores: list) -> list:
+    # Range checks and interpretation bucketing for every patient at once
+    low = values < RANGE_MIN
+    high = values > RANGE_MAX
+    out_of_range = low | high
+    severe = (values < SEVERE_LOW) | (values > SEVERE_HIGH)
+    interpretation = np.select(
+        [low, high, values <= LOW_END, values >= HIGH_END],
+        [BELOW, ABOVE, LOW_END_CODE, HIGH_END_CODE],
+        default=OPTIMAL
+    )
+    metrics_at_risk = out_of_range.sum(axis=1).tolist()
+    confidences = probabilities.max(axis=1).tolist()
+    total_metrics = len(FIELD_NAMES)
+    rule_results = rule_set.evaluate(values, predictions, out_of_range)
+
+    reports = []
+    for i in range(len(values)):
+        row = values[i].tolist()
+        row_codes = interpretation[i].tolist()
+        row_severe = severe[i].tolist()
+        disease_prediction = str(predictions[i])
+        health_score = health_scores[i]
+
+        # Single pass over the fields builds metrics, trend buckets and warnings
+        concerning = []
+        buckets = {BELOW: concerning, ABOVE: concerning, LOW_END_CODE: [], HIGH_END_CODE: [], OPTIMAL: []}
+        metrics_data = {}
+        abnormal_metrics = {}
+        for j, field in enumerate(FIELD_NAMES):
+            code = row_codes[j]
+            buckets[code].append(field)
+            metrics_data[field] = {
+                "value": row[j],
+                "status": "Abnormal" if code <= ABOVE else "Normal",
+                "normal_range": NORMAL_RANGES[j],
+                "interpretation": INTERPRETATIONS[code]
+            }
+            if code <= ABOVE:
+                abnormal_metrics[field] = {
+                    "status": "Low" if code == BELOW else "High",
+                    "warning": LOW_WARNINGS[j] if code == BELOW else HIGH_WARNINGS[j],
+                    "severity": "High" if row_severe[j] else "Medium"
+                }
+
+        trends = {
+            "high_end_metrics": buckets[HIGH_END_CODE],
+            "low_end_metrics": buckets[LOW_END_CODE],
+            "optimal_metrics": buckets[OPTIMAL],
+            "concerning_metrics": concerning
+        }
+
+        risk_assessment = get_disease_risk_level(health_score, metrics_at_risk[i], total_metrics)
+        detailed_recommendations, risk_factors = rule_results[i]
+        if len(trends["high_end_metrics"]) > 3:
+            detailed_recommendations["preventive_measures"].append({
+                "focus": "Multiple borderline metrics",
+                "action": "Schedule comprehensive health checkup",
+                "metrics": trends["high_end_metrics"]
+            })
+
+        reports.append(build_report(
+            health_score, risk_assessment, disease_prediction,
+            confidences[i], metrics_at_risk[i], trends, metrics_data,
+            risk_factors, detailed_recommendations, abnormal_metrics
+        ))
+    return reports
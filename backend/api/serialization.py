@@ -0,0 +1,42 @@
+import numpy as np
+import orjson
+from fastapi import Response
+
+try:
+    import msgpack
+except ImportError:  # optional: MessagePack responses are only offered when installed
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# Top-level report sections returned by each ?view=
+VIEWS = {
+    "full": None,
+    "summary": ("summary", "warnings"),
+}
+
+def select_view(report: dict, view: str) -> dict:
+    sections = VIEWS[view]
+    if sections is None:
+        return report
+    return {section: report[section] for section in sections}
+
+def _default(value):
+    # NumPy scalars that are not float subclasses (int64, bool_, float32)
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def wants_msgpack(accept: str) -> bool:
+    return msgpack is not None and any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+def render(content, accept: str = "") -> Response:
+    # Returning a ready Response skips FastAPI's jsonable_encoder walk
+    if wants_msgpack(accept):
+        return Response(msgpack.packb(content, default=_default, use_bin_type=True),
+                        media_type=MSGPACK_MEDIA_TYPES[0])
+    return Response(orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY),
+                    media_type=JSON_MEDIA_TYPE)
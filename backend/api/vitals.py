@@ -0,0 +1,262 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+# WearOS samples: {"userId", "heartRate", "stepCount", "timestamp"} with the
+# timestamp in milliseconds, the same shape as the frontend's wearos_data rows.
+# stepCount is the watch's cumulative step counter.
+
+# Samples allocated per user at first; the arrays double from there up to capacity
+INITIAL_SAMPLES = 64
+
+class RingBuffer:
+    # Last `capacity` samples of one user. The arrays grow as samples
+    # arrive, so a user with a few readings does not hold a full buffer.
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps, self.heart_rates, self.steps = self._allocate(min(capacity, INITIAL_SAMPLES))
+        self.head = 0
+        self.count = 0
+
+    @staticmethod
+    def _allocate(size):
+        return (np.zeros(size, dtype=np.int64), np.full(size, np.nan, dtype=np.float32),
+                np.full(size, np.nan, dtype=np.float32))
+
+    def _grow(self, needed):
+        # Copy the samples oldest first into larger arrays; head lands after them
+        size = min(self.capacity, max(2 * len(self.timestamps), needed))
+        arrays = self._allocate(size)
+        for array, samples in zip(arrays, self.ordered()):
+            array[:self.count] = samples
+        self.timestamps, self.heart_rates, self.steps = arrays
+        self.head = self.count % size
+
+    def append(self, timestamps, heart_rates, steps):
+        if len(timestamps) >= self.capacity:
+            timestamps, heart_rates, steps = (a[-self.capacity:] for a in (timestamps, heart_rates, steps))
+        needed = self.count + len(timestamps)
+        if needed > len(self.timestamps) and len(self.timestamps) < self.capacity:
+            self._grow(needed)
+        size = len(self.timestamps)
+        positions = (self.head + np.arange(len(timestamps))) % size
+        self.timestamps[positions] = timestamps
+        self.heart_rates[positions] = heart_rates
+        self.steps[positions] = steps
+        self.head = (self.head + len(timestamps)) % size
+        self.count = min(self.count + len(timestamps), size)
+
+    def ordered(self):
+        # Samples in arrival order, oldest first
+        positions = (self.head - self.count + np.arange(self.count)) % len(self.timestamps)
+        return self.timestamps[positions], self.heart_rates[positions], self.steps[positions]
+
+    @property
+    def nbytes(self):
+        return self.timestamps.nbytes + self.heart_rates.nbytes + self.steps.nbytes
+
+def window_stats(timestamps, heart_rates, steps):
+    valid_hr = heart_rates[~np.isnan(heart_rates)].astype(np.float64)
+    valid_steps = steps[~np.isnan(steps)]
+    # Counter resets (watch reboot) show up as negative steps and are skipped
+    step_deltas = np.diff(valid_steps)
+    stats = {
+        "samples": int(len(timestamps)),
+        "start": int(timestamps[0]) if len(timestamps) else None,
+        "end": int(timestamps[-1]) if len(timestamps) else None,
+        "steps": int(step_deltas[step_deltas > 0].sum()) if len(step_deltas) else 0,
+    }
+    if len(valid_hr):
+        stats.update({
+            "heart_rate_mean": round(float(valid_hr.mean()), 2),
+            "heart_rate_min": round(float(valid_hr.min()), 2),
+            "heart_rate_max": round(float(valid_hr.max()), 2),
+            # 10th percentile as a resting estimate; robust to short activity bursts
+            "resting_heart_rate": round(float(np.percentile(valid_hr, 10)), 2),
+            "heart_rate_std": round(float(valid_hr.std()), 3),
+            "heart_rate_rmssd": round(float(np.sqrt(np.mean(np.diff(valid_hr) ** 2))), 3) if len(valid_hr) > 1 else None,
+        })
+    return stats
+
+class VitalsStore:
+    # Bounded in-memory vitals per user (a ring buffer each, least recently
+    # updated users evicted past max_users), with raw samples queued and
+    # written to SQLite in batches by a background flusher.
+
+    def __init__(self, capacity=4096, max_users=10000, window_seconds=300, path=None,
+                 flush_interval=1.0, flush_rows=5000, max_pending_rows=200000, max_age_seconds=900):
+        self.capacity = capacity
+        self.max_users = max_users
+        self.window_ms = int(window_seconds * 1000)
+        # A window whose newest sample is older than this does not describe the patient now
+        self.max_age_ms = int(max_age_seconds * 1000)
+        self.users = OrderedDict()
+        self.lock = threading.Lock()
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.max_pending_rows = max_pending_rows
+        self.pending = []
+        self.pending_rows = 0
+        self.flush_lock = threading.Lock()
+        self.flusher = None
+        self.stop_event = threading.Event()
+        # Set once flush_rows are pending so the flusher does not wait out its interval
+        self.wake = threading.Event()
+        self.samples = 0
+        self.flushed = 0
+        self.evicted_users = 0
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS wearos_data (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "userId TEXT NOT NULL, heartRate REAL, stepCount INTEGER, timestamp INTEGER NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_wearos_user_time ON wearos_data(userId, timestamp)")
+
+    def ingest(self, user_ids, timestamps, heart_rates, step_counts):
+        # Column arrays of one batch; samples are grouped per user in one sort
+        user_ids = np.asarray(user_ids)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        heart_rates = np.asarray(heart_rates, dtype=np.float32)
+        step_counts = np.asarray(step_counts, dtype=np.float32)
+        if not len(user_ids):
+            return 0
+        users, inverse = np.unique(user_ids, return_inverse=True)
+        # Stable by user, then by time within each user
+        order = np.lexsort((timestamps, inverse))
+        bounds = np.searchsorted(inverse[order], np.arange(len(users) + 1))
+
+        with self.lock:
+            for u, user in enumerate(users.tolist()):
+                rows = order[bounds[u]:bounds[u + 1]]
+                ring = self.users.get(user)
+                if ring is None:
+                    ring = self.users[user] = RingBuffer(self.capacity)
+                    if len(self.users) > self.max_users:
+                        self.users.popitem(last=False)
+                        self.evicted_users += 1
+                else:
+                    self.users.move_to_end(user)
+                ring.append(timestamps[rows], heart_rates[rows], step_counts[rows])
+            self.samples += len(user_ids)
+            if self.conn is not None:
+                self.pending.append((user_ids, timestamps, heart_rates, step_counts))
+                self.pending_rows += len(user_ids)
+                overflowing = self.pending_rows >= self.max_pending_rows
+                if self.pending_rows >= self.flush_rows:
+                    self.wake.set()
+        if self.conn is not None and overflowing:
+            # The flusher is behind; write from the ingesting thread so memory stays bounded
+            self.flush()
+        return len(user_ids)
+
+    def flush(self):
+        with self.lock:
+            batches, self.pending, self.pending_rows = self.pending, [], 0
+        if not batches or self.conn is None:
+            return 0
+        rows = []
+        for user_ids, timestamps, heart_rates, step_counts in batches:
+            # NaN marks a missing reading and is stored as NULL
+            rows.extend(zip(
+                user_ids.tolist(),
+                [None if v != v else v for v in heart_rates.astype(float).tolist()],
+                [None if v != v else int(v) for v in step_counts.astype(float).tolist()],
+                timestamps.tolist()
+            ))
+        with self.flush_lock:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT INTO wearos_data (userId, heartRate, stepCount, timestamp) VALUES (?, ?, ?, ?)", rows
+            )
+            self.conn.execute("COMMIT")
+        self.flushed += len(rows)
+        return len(rows)
+
+    def _flush_loop(self):
+        while not self.stop_event.is_set():
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing vitals: {str(e)}")
+
+    def start_flusher(self):
+        if self.conn is not None and self.flusher is None:
+            self.stop_event.clear()
+            self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self.flusher.start()
+
+    def stop_flusher(self):
+        self.stop_event.set()
+        self.wake.set()
+        self.flusher = None
+        self.flush()
+
+    def _ordered(self, user_id):
+        # The user's samples sorted by timestamp: a batch that arrives late
+        # sits after newer samples in the ring
+        with self.lock:
+            ring = self.users.get(user_id)
+            if ring is None:
+                return None
+            timestamps, heart_rates, steps = ring.ordered()
+        order = np.argsort(timestamps, kind="stable")
+        return timestamps[order], heart_rates[order], steps[order]
+
+    def window(self, user_id, seconds=None):
+        # Sliding window ending at the user's newest sample
+        samples = self._ordered(user_id)
+        if samples is None or not len(samples[0]):
+            return None
+        timestamps, heart_rates, steps = samples
+        window_ms = int(seconds * 1000) if seconds else self.window_ms
+        keep = timestamps >= timestamps[-1] - window_ms
+        return window_stats(timestamps[keep], heart_rates[keep], steps[keep])
+
+    def current_window(self, user_id, now_ms=None):
+        # window(), or None when the user's newest sample is older than max_age
+        window = self.window(user_id)
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        if window is None or window["end"] < now_ms - self.max_age_ms:
+            return None
+        return window
+
+    def tumbling(self, user_id, bucket_seconds=60):
+        # Aligned, non-overlapping buckets over everything in the ring buffer
+        samples = self._ordered(user_id)
+        if samples is None or not len(samples[0]):
+            return []
+        timestamps, heart_rates, steps = samples
+        buckets = timestamps // int(bucket_seconds * 1000)
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(buckets)]
+        return [
+            {"bucket_start": int(buckets[a] * bucket_seconds * 1000),
+             **window_stats(timestamps[a:b], heart_rates[a:b], steps[a:b])}
+            for a, b in zip(starts.tolist(), ends.tolist())
+        ]
+
+    def stats(self):
+        with self.lock:
+            buffer_bytes = sum(ring.nbytes for ring in self.users.values())
+        return {
+            "users": len(self.users),
+            "max_users": self.max_users,
+            "capacity_per_user": self.capacity,
+            "buffer_bytes": buffer_bytes,
+            "max_age_seconds": self.max_age_ms / 1000,
+            "samples": self.samples,
+            "pending_rows": self.pending_rows,
+            "flushed_rows": self.flushed,
+            "evicted_users": self.evicted_users,
+            "path": self.path,
+        }
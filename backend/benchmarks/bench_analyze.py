@@ -0,0 +1,58 @@
+import argparse
+import pandas as pd
+from fastapi.testclient import TestClient
+from api.main import app, patients_to_matrix, PatientData
+from api.reports import analyze_matrix
+from models.artifact import DEFAULT_ARTIFACT_DIR
+from models.layout import FEATURE_COLUMNS
+from .common import mixed_patients, as_payloads, time_calls, emit
+
+# Single-patient latency of /analyze: the matrix hot path on its own, the
+# endpoint end to end, and the one-row DataFrame wrappers for comparison.
+
+def run(iterations=500, artifact_dir=DEFAULT_ARTIFACT_DIR):
+    import api.main as api_main
+    api_main.ARTIFACT_DIR = artifact_dir
+    api_main.model_reloader.artifact_dir = artifact_dir
+
+    payloads = as_payloads(mixed_patients(iterations))
+    patients = [PatientData.parse_obj(payload) for payload in payloads]
+    frames = [pd.DataFrame([payload], columns=FEATURE_COLUMNS) for payload in payloads]
+
+    results = {}
+    with TestClient(app) as client:
+        # Set by the startup event
+        analyzer = api_main.health_analyzer
+        state = {"i": 0}
+
+        def next_index():
+            state["i"] = (state["i"] + 1) % len(payloads)
+            return state["i"]
+
+        results["hot_path"] = time_calls(
+            lambda: analyze_matrix(patients_to_matrix([patients[next_index()]]), analyzer),
+            iterations
+        )
+        results["endpoint"] = time_calls(
+            lambda: client.post("/analyze", json=payloads[next_index()]),
+            iterations
+        )
+
+        def dataframe_wrappers():
+            frame = frames[next_index()]
+            analyzer.predict_disease(frame)
+            analyzer.calculate_health_score(frame)
+
+        results["dataframe_wrappers"] = time_calls(dataframe_wrappers, iterations)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single-patient /analyze latency")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--artifact-dir", default=DEFAULT_ARTIFACT_DIR)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+    emit(run(args.iterations, args.artifact_dir), args.output)
+
+if __name__ == "__main__":
+    main()
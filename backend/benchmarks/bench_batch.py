@@ -0,0 +1,44 @@
+import argparse
+from models.artifact import DEFAULT_ARTIFACT_DIR
+from models.train import DEFAULT_DATA_PATH
+from .common import load_analyzer, mixed_patients, time_calls, emit
+
+# HealthAnalyzer throughput by batch size: predict_disease's batch form
+# (predict_batch), calculate_health_score's (health_scores_batch) and the
+# combined analyze_batch, at 1, 100 and 10k patients.
+
+BATCH_SIZES = [1, 100, 10000]
+
+def run(data_path=DEFAULT_DATA_PATH, artifact_dir=DEFAULT_ARTIFACT_DIR, iterations=200, flat_forest=False):
+    analyzer = load_analyzer(data_path, artifact_dir)
+    analyzer.flat_forest = flat_forest
+    results = {}
+    for size in BATCH_SIZES:
+        batch = mixed_patients(size, data_path)
+        predictions, probabilities = analyzer.predict_batch(batch)
+        # Fewer iterations for the large batches so every size takes similar time
+        n = max(5, iterations // max(1, size // 100))
+        timings = {
+            "predict_disease": time_calls(lambda: analyzer.predict_batch(batch), n, warmup=3),
+            "calculate_health_score": time_calls(
+                lambda: analyzer.health_scores_batch(batch, predictions, probabilities), n, warmup=3
+            ),
+            "analyze_batch": time_calls(lambda: analyzer.analyze_batch(batch), n, warmup=3),
+        }
+        for timing in timings.values():
+            timing["throughput_rows_per_s"] = round(timing["throughput_rows_per_s"] * size, 2)
+        results[f"rows_{size}"] = timings
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HealthAnalyzer at batch sizes 1/100/10k")
+    parser.add_argument("--data", default=DEFAULT_DATA_PATH)
+    parser.add_argument("--artifact-dir", default=DEFAULT_ARTIFACT_DIR)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--flat-forest", action="store_true", help="Serve predictions from FlatForest")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+    emit(run(args.data, args.artifact_dir, args.iterations, args.flat_forest), args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+import httpx
+from api.cluster import HashRing
+from models.train import DEFAULT_DATA_PATH
+from .common import mixed_patients, as_payloads, emit
+from .bench_load import wait_ready
+
+# Multi-node serving. Every node trains its own artifact (quick config) in a
+# fresh interpreter with a different PYTHONHASHSEED and its own artifact dir,
+# then serves it. Checks that the nodes end up with the same artifact key and
+# model fingerprint and return byte-identical reports. Then replays patients
+# who resubmit the same panel, routed either by HashRing on userId or at
+# random, over 1..N nodes, and reads the result-cache hit rates. Exits 1 when
+# the nodes disagree.
+
+TRAIN_SCRIPT = """
+import json, sys
+from benchmarks.bench_train import quick_config
+from models.train import train_artifact, training_config
+analyzer, _, _ = train_artifact(sys.argv[1], sys.argv[2], config=quick_config(training_config()), n_jobs=1)
+print(json.dumps({"key": analyzer.model_version, "fingerprint": analyzer.model_fingerprint}))
+"""
+
+def train_node(data_path, artifact_dir, hash_seed):
+    env = dict(os.environ, PYTHONHASHSEED=str(hash_seed))
+    output = subprocess.run([sys.executable, "-c", TRAIN_SCRIPT, data_path, artifact_dir],
+                            env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def start_node(node_id, nodes, port, artifact_dir, model_key, work_dir):
+    env = dict(os.environ, HEALTH_ARTIFACT_DIR=artifact_dir, HEALTH_MODEL_KEY=model_key,
+               HEALTH_NODE_ID=node_id, HEALTH_NODES=",".join(nodes), HEALTH_EXECUTOR="inline",
+               HEALTH_JOBS_DIR=os.path.join(work_dir, f"jobs-{node_id}"))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env
+    )
+
+def moved_share(nodes, keys=10000):
+    # Share of users owned by a different node after adding the last node
+    before, after = HashRing(nodes[:-1]), HashRing(nodes)
+    return round(sum(before.node_for(i) != after.node_for(i) for i in range(keys)) / keys, 4)
+
+def cache_counts(urls):
+    stats = [httpx.get(f"{url}/cache/stats").json() for url in urls]
+    return sum(s["hits"] + s["shared_hits"] for s in stats), sum(s["hits"] + s["shared_hits"] + s["misses"] for s in stats)
+
+def replay(client, urls, node_ids, routing, users, resubmits, seed):
+    # users x resubmits requests in random order; each user always sends the same panel
+    panels = as_payloads(mixed_patients(users, seed=seed))
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(np.repeat(np.arange(users), resubmits))
+    ring = HashRing(node_ids)
+    by_id = dict(zip(node_ids, urls))
+    served = {}
+    hits_before, lookups_before = cache_counts(urls)
+    for user in order.tolist():
+        user_id = f"{seed}-{user}"
+        node = ring.node_for(user_id) if routing == "hash" else node_ids[rng.integers(len(node_ids))]
+        response = client.post(f"{by_id[node]}/analyze", params={"userId": user_id}, json=panels[user])
+        response.raise_for_status()
+        served.setdefault(user_id, set()).add(response.headers["x-node-id"])
+    hits, lookups = cache_counts(urls)
+    return {
+        "cache_hit_rate": round((hits - hits_before) / (lookups - lookups_before), 4),
+        # Users whose cache entries and history ended up on more than one node
+        "split_users": sum(len(nodes) > 1 for nodes in served.values()) / users,
+    }
+
+def run(nodes=3, users=200, resubmits=5, consistency_requests=200, port=8770, data_path=DEFAULT_DATA_PATH):
+    node_ids = [f"node{i}" for i in range(nodes)]
+    urls = [f"http://127.0.0.1:{port + i}" for i in range(nodes)]
+    results = {"nodes": nodes, "users": users, "resubmits": resubmits}
+    with tempfile.TemporaryDirectory() as work_dir:
+        trained = [train_node(data_path, os.path.join(work_dir, node_id), i + 1) for i, node_id in enumerate(node_ids)]
+        results["training"] = {
+            "artifact_keys": sorted({t["key"] for t in trained}),
+            "fingerprints": sorted({t["fingerprint"] for t in trained}),
+        }
+        servers = [start_node(node_id, node_ids, port + i, os.path.join(work_dir, node_id), trained[i]["key"], work_dir)
+                   for i, node_id in enumerate(node_ids)]
+        try:
+            for url in urls:
+                wait_ready(url)
+            with httpx.Client(timeout=60) as client:
+                # Same panel to every node: reports and fingerprint headers must match
+                mismatched, fingerprints = 0, set()
+                for payload in as_payloads(mixed_patients(consistency_requests, seed=1000)):
+                    responses = [client.post(f"{url}/analyze", json=payload) for url in urls]
+                    mismatched += len({r.content for r in responses}) > 1
+                    fingerprints.update(r.headers.get("x-model-fingerprint") for r in responses)
+                results["consistency"] = {"requests": consistency_requests, "mismatched": mismatched,
+                                          "fingerprint_headers": sorted(str(f) for f in fingerprints)}
+
+                results["routing"] = {}
+                for n in range(1, nodes + 1):
+                    for routing in ("hash", "random"):
+                        seed = n * 10 + (routing == "random")
+                        results["routing"][f"{n}_nodes_{routing}"] = replay(
+                            client, urls[:n], node_ids[:n], routing, users, resubmits, seed)
+        finally:
+            for server in servers:
+                server.terminate()
+                server.wait()
+    results["moved_on_add"] = {f"{n - 1}_to_{n}": moved_share(node_ids[:n]) for n in range(2, nodes + 1)}
+    results["consistent"] = (len(results["training"]["fingerprints"]) == 1
+                             and len(results["training"]["artifact_keys"]) == 1
+                             and results["consistency"]["mismatched"] == 0
+                             and results["consistency"]["fingerprint_headers"] == results["training"]["fingerprints"])
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Model consistency and patient routing across serving nodes")
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--resubmits", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=200, help="Panels sent to every node for the consistency check")
+    parser.add_argument("--port", type=int, default=8770, help="First node's port; node i listens on port + i")
+    parser.add_argument("--data", default=DEFAULT_DATA_PATH)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+    results = run(args.nodes, args.users, args.resubmits, args.requests, args.port, args.data)
+    emit(results, args.output)
+    if not results["consistent"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
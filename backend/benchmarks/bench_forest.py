@@ -0,0 +1,62 @@
+import argparse
+import sys
+import numpy as np
+import pandas as pd
+from models.artifact import DEFAULT_ARTIFACT_DIR
+from models.forest import FlatForest
+from models.layout import FEATURE_COLUMNS
+from models.normalization import to_raw
+from models.train import DEFAULT_DATA_PATH
+from .common import load_analyzer, time_calls, emit
+
+# Compares FlatForest against RandomForestClassifier.predict_proba: parity on
+# every row of the training CSV first, then latency at 1, 100 and 10k rows.
+
+BATCH_SIZES = [1, 100, 10000]
+
+def check_parity(model, forest, scaled):
+    expected = model.predict_proba(scaled)
+    actual = forest.predict_proba(scaled)
+    return {
+        "rows": len(scaled),
+        "max_abs_diff": float(np.abs(expected - actual).max()),
+        "predictions_match": bool((model.predict(scaled) == forest.predict(scaled)).all()),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity check and microbenchmark for FlatForest")
+    parser.add_argument("--data", default=DEFAULT_DATA_PATH)
+    parser.add_argument("--artifact-dir", default=DEFAULT_ARTIFACT_DIR)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    analyzer = load_analyzer(args.data, args.artifact_dir)
+    model = analyzer.model
+    forest = FlatForest.from_model(model)
+
+    # The CSV is in the 0-1 training space; the model sees it through the fitted transform
+    csv_values = pd.read_csv(args.data)[FEATURE_COLUMNS].to_numpy(dtype=float)
+    scaled = analyzer.transform.transform(to_raw(csv_values, FEATURE_COLUMNS))
+
+    parity = check_parity(model, forest, scaled)
+    results = {"parity": parity, "n_trees": forest.n_trees, "n_nodes": len(forest.feature)}
+    if parity["max_abs_diff"] > 1e-12 or not parity["predictions_match"]:
+        emit(results, args.output)
+        sys.exit("FlatForest does not match RandomForestClassifier.predict_proba")
+
+    rng = np.random.default_rng(0)
+    for size in BATCH_SIZES:
+        batch = scaled[rng.integers(0, len(scaled), size=size)]
+        iterations = max(5, args.iterations // max(1, size // 100))
+        results[f"rows_{size}"] = {
+            "sklearn": time_calls(lambda: model.predict_proba(batch), iterations, warmup=3),
+            "flat_forest": time_calls(lambda: forest.predict_proba(batch), iterations, warmup=3),
+        }
+        for engine in results[f"rows_{size}"].values():
+            engine["throughput_rows_per_s"] = round(engine["throughput_rows_per_s"] * size, 2)
+
+    emit(results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import httpx
+from models.artifact import DEFAULT_ARTIFACT_DIR
+from .common import mixed_patients, as_payloads, summarize, peak_rss_mb, emit
+
+# Concurrent HTTP load against a real uvicorn server, once per executor
+# worker count, so throughput scaling with cores is visible. The result
+# cache is disabled so every request does a full analysis.
+
+def start_server(port, mode, workers, artifact_dir, extra_env=None):
+    env = dict(os.environ, HEALTH_EXECUTOR=mode, HEALTH_EXECUTOR_WORKERS=str(workers),
+               HEALTH_ARTIFACT_DIR=artifact_dir, HEALTH_CACHE_SIZE="0", **(extra_env or {}))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env
+    )
+
+def wait_ready(url, timeout=600):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/ready").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} not ready after {timeout}s")
+
+async def drive(url, payloads, concurrency):
+    # `concurrency` clients each send their share of requests back to back
+    samples, statuses = [], {}
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async def client_loop(client, share):
+        for payload in share:
+            start = time.perf_counter()
+            response = await client.post(f"{url}/analyze", json=payload)
+            samples.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[client_loop(client, payloads[i::concurrency]) for i in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    result = summarize(samples)
+    result["throughput_rows_per_s"] = round(len(samples) / elapsed, 2)
+    result["status_codes"] = {str(code): count for code, count in sorted(statuses.items())}
+    return result
+
+def run(requests=2000, concurrency=32, mode="process", worker_counts=None, batch_max_wait_ms=0,
+        batch_max_size=64, port=8765, artifact_dir=DEFAULT_ARTIFACT_DIR):
+    cores = os.cpu_count() or 1
+    if not worker_counts:
+        worker_counts = sorted({1, *[2 ** i for i in range(1, cores.bit_length()) if 2 ** i <= cores], cores})
+
+    payloads = as_payloads(mixed_patients(requests))
+    url = f"http://127.0.0.1:{port}"
+    batching = {"HEALTH_BATCH_MAX_WAIT_MS": str(batch_max_wait_ms),
+                "HEALTH_BATCH_MAX_SIZE": str(batch_max_size)}
+    results = {"cores": cores, "mode": mode, "concurrency": concurrency,
+               "batch_max_wait_ms": batch_max_wait_ms, "runs": {}}
+    for workers in worker_counts:
+        server = start_server(port, mode, workers, artifact_dir, batching)
+        try:
+            wait_ready(url)
+            asyncio.run(drive(url, payloads[:concurrency], concurrency))  # warm up
+            result = asyncio.run(drive(url, payloads, concurrency))
+            if batch_max_wait_ms > 0:
+                result["batcher"] = httpx.get(f"{url}/batcher/stats").json()
+            results["runs"][str(workers)] = result
+        finally:
+            server.terminate()
+            server.wait()
+    # Servers are children of this process
+    results["server_peak_rss_mb"] = peak_rss_mb(children=True)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load test of /analyze across executor worker counts")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--mode", choices=["inline", "thread", "process"], default="process")
+    parser.add_argument("--workers", default=None,
+                        help="Comma-separated executor worker counts (default: 1 up to the core count)")
+    parser.add_argument("--batch-max-wait-ms", type=float, default=0,
+                        help="Enable the micro-batcher with this window (0 leaves it off)")
+    parser.add_argument("--batch-max-size", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--artifact-dir", default=DEFAULT_ARTIFACT_DIR)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    worker_counts = [int(w) for w in args.workers.split(",")] if args.workers else None
+    results = run(args.requests, args.concurrency, args.mode, worker_counts, args.batch_max_wait_ms,
+                  args.batch_max_size, args.port, args.artifact_dir)
+    emit(results, args.output)
+
+if __name__ == "__main__":
+    main()
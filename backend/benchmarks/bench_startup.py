@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from models.artifact import DEFAULT_ARTIFACT_DIR, add_serving_arrays
+from models.train import DEFAULT_DATA_PATH
+from .common import load_analyzer, emit
+
+# Cold start of an inference-only worker: a fresh interpreter imports the
+# serving modules, loads the persisted model and analyzes one patient.
+# Reported per engine, with the training-only packages that got imported
+# along the way; "flat" loads the serving arrays and should import none.
+
+TRAINING_ONLY_MODULES = ("sklearn", "scipy", "pandas", "joblib", "imblearn")
+
+# Budget for the flat (serving-only) worker; the suite fails when exceeded
+COLD_START_BUDGET = {"cold_start_seconds": 0.5, "peak_rss_mb": 60.0}
+
+WORKER = """
+import json, resource, sys, time
+start = time.perf_counter()
+
+def memory_mb():
+    # ru_maxrss survives exec on Linux (it would report the parent's peak);
+    # VmHWM/VmRSS belong to this process image only
+    try:
+        with open("/proc/self/status") as f:
+            fields = dict(line.split(":", 1) for line in f)
+        return [round(int(fields[name].split()[0]) / 1024, 1) for name in ("VmHWM", "VmRSS")]
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+        return [round(peak, 1), None]
+
+from models.health_analyzer import HealthAnalyzer
+from models.artifact import load_artifact
+from models.layout import RANGE_MIN, RANGE_MAX
+from api.reports import analyze_matrix
+imported = time.perf_counter()
+flat = sys.argv[3] == "flat"
+analyzer = HealthAnalyzer(flat_forest=flat)
+load_artifact(analyzer, sys.argv[1], sys.argv[2], serving_only=flat)
+loaded = time.perf_counter()
+analyze_matrix(((RANGE_MIN + RANGE_MAX) / 2).reshape(1, -1), analyzer)
+done = time.perf_counter()
+peak, current = memory_mb()
+print(json.dumps({
+    "import_seconds": round(imported - start, 4),
+    "load_seconds": round(loaded - imported, 4),
+    "first_analysis_seconds": round(done - loaded, 4),
+    "cold_start_seconds": round(done - start, 4),
+    "peak_rss_mb": peak,
+    "rss_mb": current,
+    "modules": sorted({name.split(".")[0] for name in sys.modules}),
+}))
+"""
+
+def cold_start(key, artifact_dir, engine):
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=cwd)
+    output = subprocess.run([sys.executable, "-c", WORKER, key, artifact_dir, engine], cwd=cwd, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.splitlines()[-1])
+    modules = set(result.pop("modules"))
+    result["training_modules"] = [name for name in TRAINING_ONLY_MODULES if name in modules]
+    return result
+
+def run(data_path=DEFAULT_DATA_PATH, artifact_dir=DEFAULT_ARTIFACT_DIR, repeat=3):
+    analyzer = load_analyzer(data_path, artifact_dir)
+    add_serving_arrays(analyzer, analyzer.model_version, artifact_dir)
+
+    results = {}
+    for engine in ("flat", "sklearn"):
+        # Best of `repeat` runs; the first one also pays for a cold page cache
+        runs = [cold_start(analyzer.model_version, artifact_dir, engine) for _ in range(repeat)]
+        results[engine] = min(runs, key=lambda result: result["cold_start_seconds"])
+    results["budget"] = COLD_START_BUDGET
+    results["over_budget"] = [
+        {"metric": metric, "budget": limit, "current": results["flat"][metric]}
+        for metric, limit in COLD_START_BUDGET.items() if results["flat"][metric] > limit
+    ]
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure inference worker import time, load time and RSS")
+    parser.add_argument("--data", default=DEFAULT_DATA_PATH)
+    parser.add_argument("--artifact-dir", default=DEFAULT_ARTIFACT_DIR)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+    emit(run(args.data, args.artifact_dir, args.repeat), args.output)
+
+if __name__ == "__main__":
+    main()
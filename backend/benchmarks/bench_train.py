@@ -0,0 +1,45 @@
+import argparse
+import time
+from models.health_analyzer import HealthAnalyzer
+from models.data_loader import load_training_data
+from models.train import DEFAULT_DATA_PATH, SEARCH_MODES, training_config
+from .common import peak_rss_mb, emit
+
+# HealthAnalyzer.train stage by stage (prepare_data, scale, search,
+# cross_validation, bootstrap_importance, evaluation). Nothing is written
+# to the artifact directory.
+
+def quick_config(config):
+    # Small enough for a CI smoke run; stage proportions stay comparable
+    return dict(config, grid_cv_folds=3, cv_folds=3, bootstrap_iterations=5,
+                param_grid={"n_estimators": [50], "max_depth": [4, 6], "min_samples_split": [10]})
+
+def run(data_path=DEFAULT_DATA_PATH, search="grid", n_jobs=-1, quick=False):
+    config = training_config(search)
+    if quick:
+        config = quick_config(config)
+    start = time.perf_counter()
+    data = load_training_data(data_path, seed=config["random_state"])
+    load_seconds = time.perf_counter() - start
+    evaluation = HealthAnalyzer().train(data, config, n_jobs)
+    return {
+        "search": search,
+        "quick": quick,
+        "stage_seconds": {"load_data": round(load_seconds, 3), **evaluation["stage_seconds"]},
+        "total_seconds": round(time.perf_counter() - start, 3),
+        "accuracy": evaluation["accuracy"],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Time HealthAnalyzer.train stage by stage")
+    parser.add_argument("--data", default=DEFAULT_DATA_PATH)
+    parser.add_argument("--search", choices=SEARCH_MODES, default="grid")
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--quick", action="store_true", help="Reduced grid, folds and bootstrap fits")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+    emit(run(args.data, args.search, args.n_jobs, args.quick), args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+from models.artifact import DEFAULT_ARTIFACT_DIR
+from .common import mixed_patients, as_payloads, emit
+from .bench_load import drive, wait_ready
+
+# Memory of a multi-worker server: per-worker RSS, PSS and unique set size
+# (USS, the pages no other process shares) after serving some traffic.
+# "before" is `uvicorn --workers` with the sklearn engine, where every
+# spawned worker imports sklearn and unpickles its own forest. "after" is
+# the pre-fork server with the flat engine, where the workers fork from a
+# master that already mapped the serving arrays. Linux only (reads /proc).
+
+SERVERS = {
+    "uvicorn_sklearn": ("uvicorn", "sklearn"),
+    "uvicorn_flat": ("uvicorn", "flat"),
+    "prefork_flat": ("prefork", "flat"),
+}
+
+def start_server(kind, engine, workers, port, artifact_dir):
+    env = dict(os.environ, HEALTH_INFERENCE_ENGINE=engine, HEALTH_ARTIFACT_DIR=artifact_dir,
+               HEALTH_CACHE_SIZE="0", HEALTH_EXECUTOR="inline")  # the workers are the parallelism
+    if kind == "prefork":
+        command = [sys.executable, "-m", "api.prefork", "--workers", str(workers), "--port", str(port)]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "api.main:app", "--workers", str(workers), "--port", str(port)]
+    return subprocess.Popen(command + ["--log-level", "warning"], env=env)
+
+def child_pids(pid):
+    children = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            children += [int(child) for child in f.read().split()]
+    workers = []
+    for child in children:
+        with open(f"/proc/{child}/cmdline", "rb") as f:
+            if b"resource_tracker" not in f.read():
+                workers.append(child)
+    return workers
+
+def memory(pid):
+    # Whole-process totals plus the share of the mapped serving file
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        rollup = {line.split(":")[0]: int(line.split()[1]) for line in f if line.split()[-1] == "kB"}
+    model_rss = model_private = 0
+    with open(f"/proc/{pid}/smaps") as f:
+        in_model = False
+        for line in f:
+            fields = line.split()
+            if "-" in fields[0] and ":" not in fields[0]:
+                in_model = fields[-1].endswith("serving.bin")
+            elif in_model and fields[0] == "Rss:":
+                model_rss += int(fields[1])
+            elif in_model and fields[0] in ("Private_Clean:", "Private_Dirty:"):
+                model_private += int(fields[1])
+    return {
+        "rss_mb": round(rollup["Rss"] / 1024, 1),
+        "pss_mb": round(rollup["Pss"] / 1024, 1),
+        "uss_mb": round((rollup["Private_Clean"] + rollup["Private_Dirty"]) / 1024, 1),
+        "model_map_rss_kb": model_rss,
+        "model_map_private_kb": model_private,
+    }
+
+def run(workers=4, requests=400, concurrency=16, port=8766, artifact_dir=DEFAULT_ARTIFACT_DIR, servers=None):
+    payloads = as_payloads(mixed_patients(requests))
+    url = f"http://127.0.0.1:{port}"
+    results = {"workers": workers, "requests": requests}
+    for name in servers or SERVERS:
+        kind, engine = SERVERS[name]
+        server = start_server(kind, engine, workers, port, artifact_dir)
+        try:
+            wait_ready(url)
+            traffic = asyncio.run(drive(url, payloads, concurrency))
+            per_worker = [memory(pid) for pid in child_pids(server.pid)]
+            results[name] = {
+                "master": memory(server.pid),
+                "workers": per_worker,
+                "worker_uss_mb": round(sum(m["uss_mb"] for m in per_worker) / max(len(per_worker), 1), 1),
+                "total_uss_mb": round(sum(m["uss_mb"] for m in per_worker), 1),
+                "total_pss_mb": round(sum(m["pss_mb"] for m in per_worker), 1),
+                "throughput_rows_per_s": traffic["throughput_rows_per_s"],
+                "status_codes": traffic["status_codes"],
+            }
+        finally:
+            server.terminate()
+            server.wait()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker memory of multi-worker servers")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--artifact-dir", default=DEFAULT_ARTIFACT_DIR)
+    parser.add_argument("--servers", default=None, help=f"Comma-separated subset of {', '.join(SERVERS)}")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+    servers = args.servers.split(",") if args.servers else None
+    emit(run(args.workers, args.requests, args.concurrency, args.port, args.artifact_dir, servers), args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import json
+import resource
+import sys
+import time
+import numpy as np
+import pandas as pd
+from models.layout import FEATURE_COLUMNS, RANGE_MIN, RANGE_MAX
+from models.health_analyzer import HealthAnalyzer
+from models.train import DEFAULT_DATA_PATH, load_or_train
+from models.artifact import DEFAULT_ARTIFACT_DIR
+
+def synthetic_patients(n, seed=0, spread=0.5):
+    # Raw lab values around the normal ranges, with some out-of-range values
+    rng = np.random.default_rng(seed)
+    width = RANGE_MAX - RANGE_MIN
+    return rng.uniform(RANGE_MIN - spread * width, RANGE_MAX + spread * width, size=(n, len(FEATURE_COLUMNS)))
+
+def csv_patients(n, data_path=DEFAULT_DATA_PATH, seed=0, jitter=0.05):
+    # Raw lab values following the training CSV: resampled rows with a little
+    # per-column noise, mapped from the CSV's 0-1 space back onto normal_ranges
+    rng = np.random.default_rng(seed)
+    normalized = pd.read_csv(data_path)[FEATURE_COLUMNS].to_numpy(dtype=float)
+    rows = normalized[rng.integers(0, len(normalized), size=n)]
+    rows += rng.normal(0, jitter, size=rows.shape) * normalized.std(axis=0)
+    return RANGE_MIN + rows * (RANGE_MAX - RANGE_MIN)
+
+def mixed_patients(n, data_path=DEFAULT_DATA_PATH, seed=0):
+    # Half drawn around normal_ranges, half from the CSV distribution
+    half = n // 2
+    values = np.concatenate([synthetic_patients(half, seed), csv_patients(n - half, data_path, seed)])
+    return values[np.random.default_rng(seed).permutation(n)]
+
+def as_payloads(values):
+    return [dict(zip(FEATURE_COLUMNS, row)) for row in values.tolist()]
+
+def load_analyzer(data_path=DEFAULT_DATA_PATH, artifact_dir=DEFAULT_ARTIFACT_DIR):
+    analyzer = HealthAnalyzer()
+    load_or_train(analyzer, data_path, artifact_dir)
+    return analyzer
+
+def time_calls(fn, iterations, warmup=10):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def summarize(samples, rows_per_call=1):
+    samples_ms = np.array(samples) * 1000
+    total = float(np.sum(samples))
+    return {
+        "calls": len(samples),
+        "p50_ms": round(float(np.percentile(samples_ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(samples_ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(samples_ms, 99)), 4),
+        "mean_ms": round(float(samples_ms.mean()), 4),
+        "throughput_rows_per_s": round(len(samples) * rows_per_call / total, 2) if total else None,
+    }
+
+def peak_rss_mb(children=False):
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    scale = 1 / (1024 * 1024) if sys.platform == "darwin" else 1 / 1024
+    return round(usage.ru_maxrss * scale, 1)
+
+def emit(results, output=None):
+    text = json.dumps(results, indent=2)
+    print(text)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from models.artifact import DEFAULT_ARTIFACT_DIR
+from models.train import DEFAULT_DATA_PATH
+from .common import peak_rss_mb, emit
+
+# Runs the benchmarks as one suite and optionally compares against a stored
+# baseline. Any latency, stage time or RSS that grew, or throughput that
+# dropped, by more than --tolerance is reported as a regression and the
+# suite exits non-zero.
+
+HIGHER_IS_WORSE = {"p50_ms", "p95_ms", "p99_ms", "mean_ms", "peak_rss_mb", "server_peak_rss_mb", "total_seconds",
+                   "import_seconds", "load_seconds", "cold_start_seconds"}
+LOWER_IS_WORSE = {"throughput_rows_per_s"}
+# Differences below these are noise whatever the ratio
+ABSOLUTE_FLOOR = {"ms": 0.05, "seconds": 0.05, "mb": 5.0, "throughput": 0.0}
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _floor(key):
+    if key.endswith("_ms"):
+        return ABSOLUTE_FLOOR["ms"]
+    if key.endswith("_mb"):
+        return ABSOLUTE_FLOOR["mb"]
+    if key in LOWER_IS_WORSE:
+        return ABSOLUTE_FLOOR["throughput"]
+    return ABSOLUTE_FLOOR["seconds"]
+
+def compare(results, baseline, tolerance=0.2, path=""):
+    # Walks both result trees and returns one entry per regressed metric
+    regressions = []
+    for key, value in results.items():
+        if key not in baseline or key == "meta":
+            continue
+        base = baseline[key]
+        where = f"{path}.{key}" if path else key
+        if isinstance(value, dict) and isinstance(base, dict):
+            regressions += compare(value, base, tolerance, where)
+            continue
+        if not isinstance(value, (int, float)) or not isinstance(base, (int, float)) or isinstance(value, bool):
+            continue
+        stage_time = path.endswith("stage_seconds")
+        if key in HIGHER_IS_WORSE or stage_time:
+            worse = value > base * (1 + tolerance) and value - base > _floor(key)
+        elif key in LOWER_IS_WORSE:
+            worse = value < base * (1 - tolerance) and base - value > _floor(key)
+        else:
+            continue
+        if worse:
+            regressions.append({"metric": where, "baseline": base, "current": value,
+                                "change": round((value - base) / base, 4) if base else None})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and compare against a baseline")
+    parser.add_argument("--data", default=DEFAULT_DATA_PATH)
+    parser.add_argument("--artifact-dir", default=DEFAULT_ARTIFACT_DIR)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--train", action="store_true", help="Include HealthAnalyzer.train stage timings")
+    parser.add_argument("--quick-train", action="store_true", help="Use the reduced training config")
+    parser.add_argument("--skip-load", action="store_true", help="Skip the HTTP load test")
+    parser.add_argument("--load-requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--baseline", help="Earlier suite output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown, e.g. 0.2 = 20%%")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    # Every request should do a full analysis
+    os.environ["HEALTH_CACHE_SIZE"] = "0"
+    from . import bench_analyze, bench_batch, bench_load, bench_startup, bench_train
+
+    results = {"meta": {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cores": os.cpu_count(),
+        "created_at": int(time.time()),
+    }}
+    if args.train:
+        results["train"] = bench_train.run(args.data, quick=args.quick_train)
+    results["cold_start"] = bench_startup.run(args.data, args.artifact_dir)
+    results["batch"] = bench_batch.run(args.data, args.artifact_dir, args.iterations)
+    results["batch_flat_forest"] = bench_batch.run(args.data, args.artifact_dir, args.iterations, flat_forest=True)
+    results["endpoint"] = bench_analyze.run(args.iterations, args.artifact_dir)
+    if not args.skip_load:
+        results["load"] = bench_load.run(args.load_requests, args.concurrency, "thread", [os.cpu_count() or 1],
+                                        artifact_dir=args.artifact_dir)
+    results["peak_rss_mb"] = peak_rss_mb()
+
+    # The cold-start budget is absolute, baseline or not
+    exit_code = 1 if results["cold_start"]["over_budget"] else 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        results["comparison"] = {"baseline": args.baseline, "baseline_commit": baseline.get("meta", {}).get("commit"),
+                                 "tolerance": args.tolerance, "regressions": regressions}
+        exit_code = 1 if regressions else exit_code
+
+    emit(results, args.output)
+    if results["cold_start"]["over_budget"]:
+        print(f"Cold start over budget: {results['cold_start']['over_budget']}", file=sys.stderr)
+    if args.baseline and results["comparison"]["regressions"]:
+        print(f"{len(results['comparison']['regressions'])} regression(s) against {args.baseline}", file=sys.stderr)
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Makes `python -m pytest` from backend/ import api and models as top-level packages
@@ -0,0 +1,321 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+from .forest import FlatForest
+from .normalization import FeatureTransform
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves of one key are then not serialized across processes
+    fcntl = None
+
+# Bump when the on-disk layout or what training produces for the same CSV and
+# config changes, so stale artifacts are never loaded. 2: seeded training
+# (noise, SMOTE, bootstrap), so the same key means the same fingerprint.
+ARTIFACT_FORMAT_VERSION = 2
+
+DEFAULT_ARTIFACT_DIR = "artifacts"
+
+# Everything a flat-forest worker needs, as arrays packed into one binary
+# file described by a JSON index. Loading it needs only NumPy, not joblib or
+# the sklearn classes pickled in model.joblib. The file is memory-mapped
+# read-only, so every worker process on the node shares the same pages.
+SERVING_FILE = "serving.bin"
+SERVING_INDEX = "serving.json"
+SERVING_ALIGNMENT = 64
+
+# The test split the model was evaluated on and never trained on; a
+# reloaded model is validated against it
+HOLDOUT_FILE = "holdout.npz"
+
+# The mapped serving file of the current model, by (path, inode, mtime). A
+# process forked after the map inherits it (see api.prefork).
+_serving_maps = {}
+
+def dataset_hash(data_path, limit=None, chunk_size=1 << 20):
+    # limit hashes only the first `limit` bytes (used to detect appended data)
+    digest = hashlib.sha256()
+    remaining = limit
+    with open(data_path, "rb") as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest.hexdigest()
+
+def artifact_key(data_path, training_config):
+    # Same CSV + same hyperparameters => same artifact
+    digest = hashlib.sha256()
+    digest.update(str(ARTIFACT_FORMAT_VERSION).encode())
+    digest.update(dataset_hash(data_path).encode())
+    digest.update(json.dumps(training_config, sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+def startup_key(data_path, training_config, model_key=None):
+    # The artifact a server loads at startup: the pinned key (HEALTH_MODEL_KEY)
+    # or the one matching the CSV and training config
+    return model_key or artifact_key(data_path, training_config)
+
+def artifact_path(key, artifact_dir=DEFAULT_ARTIFACT_DIR):
+    return os.path.join(artifact_dir, key)
+
+def to_builtin(value):
+    # Evaluation reports mix NumPy scalars/arrays with plain Python values
+    if isinstance(value, dict):
+        return {str(k): to_builtin(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_builtin(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+@contextmanager
+def artifact_lock(key, artifact_dir=DEFAULT_ARTIFACT_DIR):
+    # Exclusive per-key file lock across processes, released on exit
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(artifact_dir, exist_ok=True)
+    with open(os.path.join(artifact_dir, f"{key}.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+def save_artifact(analyzer, evaluation, key, artifact_dir=DEFAULT_ARTIFACT_DIR, metadata=None):
+    path = artifact_path(key, artifact_dir)
+    os.makedirs(artifact_dir, exist_ok=True)
+    tmp_path = _new_version(key, artifact_dir)
+
+    state = {
+        "transform_scale": analyzer.transform.scale,
+        "transform_offset": analyzer.transform.offset,
+        "model": analyzer.model,
+        "feature_columns": analyzer.feature_columns,
+        "feature_importances": analyzer.feature_importances,
+    }
+    import joblib
+    joblib.dump(state, os.path.join(tmp_path, "model.joblib"))
+    fingerprint = save_serving_arrays(analyzer, tmp_path)
+    if analyzer.holdout is not None:
+        X, y = analyzer.holdout
+        np.savez(os.path.join(tmp_path, HOLDOUT_FILE), X=np.asarray(X, dtype=np.float64),
+                 y=np.asarray(y).astype(str))
+
+    meta = {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "key": key,
+        "fingerprint": fingerprint,
+        **(metadata or {}),
+        "evaluation": to_builtin(evaluation),
+    }
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    with artifact_lock(key, artifact_dir):
+        _publish(tmp_path, path)
+    return path
+
+def _new_version(key, artifact_dir):
+    # A private directory per save, so concurrent saves of one key never touch each other's files
+    tmp_path = tempfile.mkdtemp(prefix=f"{key}.", suffix=".tmp", dir=artifact_dir)
+    # mkdtemp creates it private; artifacts are read by other serving users too
+    os.chmod(tmp_path, 0o755)
+    return tmp_path
+
+def add_serving_arrays(analyzer, key, artifact_dir=DEFAULT_ARTIFACT_DIR):
+    # For an artifact saved before serving arrays existed: a copy with them
+    # added is published like save_artifact does, never the files in place,
+    # which running workers may have loaded or mapped
+    path = artifact_path(key, artifact_dir)
+    with artifact_lock(key, artifact_dir):
+        if os.path.exists(os.path.join(path, SERVING_INDEX)):
+            return path
+        tmp_path = _new_version(key, artifact_dir)
+        shutil.copytree(path, tmp_path, dirs_exist_ok=True)
+        fingerprint = save_serving_arrays(analyzer, tmp_path)
+        meta_file = os.path.join(tmp_path, "meta.json")
+        with open(meta_file) as f:
+            meta = json.load(f)
+        with open(meta_file, "w") as f:
+            json.dump(dict(meta, fingerprint=fingerprint), f, indent=2)
+        _publish(tmp_path, path)
+    return path
+
+def _publish(tmp_path, path):
+    # The artifact path is a symlink to a versioned directory (<key>.<suffix>).
+    # os.replace swaps the symlink atomically, so readers always find a
+    # complete artifact at path, never a missing or half-written one.
+    version_path = tmp_path[:-len(".tmp")]
+    os.rename(tmp_path, version_path)
+    link_path = version_path + ".link"
+    os.symlink(os.path.basename(version_path), link_path)
+    previous = os.path.realpath(path) if os.path.islink(path) else None
+    if os.path.isdir(path) and not os.path.islink(path):
+        # A plain directory from before versioned artifacts: swapped in two steps once
+        backup_path = version_path + ".old"
+        os.replace(path, backup_path)
+        os.replace(link_path, path)
+        shutil.rmtree(backup_path)
+    else:
+        os.replace(link_path, path)
+    if previous is not None and os.path.isdir(previous):
+        shutil.rmtree(previous, ignore_errors=True)
+
+def serving_arrays(analyzer):
+    # (index, arrays) describing the fitted model, as stored in the serving file
+    forest = analyzer.compiled_forest()
+    columns = list(analyzer.feature_columns)
+    arrays = {
+        "importances": np.array([analyzer.feature_importances[col] for col in columns], dtype=np.float64),
+        "transform_scale": np.asarray(analyzer.transform.scale, dtype=np.float64),
+        "transform_offset": np.asarray(analyzer.transform.offset, dtype=np.float64),
+        "feature": forest.feature,
+        "threshold": forest.threshold,
+        "left": forest.left,
+        "right": forest.right,
+        "leaf_proba": forest.leaf_proba,
+        "roots": forest.roots,
+    }
+    index = {"columns": columns, "classes": [str(label) for label in forest.classes_],
+             "max_depth": int(forest.max_depth)}
+    return index, {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+def fingerprint(index, arrays):
+    # Hash of the fitted model's content, not of its inputs like the artifact
+    # key: nodes serving the same fingerprint give the same answers
+    digest = hashlib.sha256()
+    digest.update(json.dumps({name: index[name] for name in ("columns", "classes", "max_depth")}).encode())
+    for name, array in arrays.items():
+        digest.update(f"{name}:{array.dtype.str}:{array.shape}".encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()[:16]
+
+def model_fingerprint(analyzer):
+    return fingerprint(*serving_arrays(analyzer))
+
+def save_serving_arrays(analyzer, path):
+    # Returns the model fingerprint, which is also stored in the index
+    index, arrays = serving_arrays(analyzer)
+    index["fingerprint"] = fingerprint(index, arrays)
+    index["arrays"] = {}
+    offset = 0
+    with open(os.path.join(path, SERVING_FILE), "wb") as f:
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            padding = -offset % SERVING_ALIGNMENT
+            f.write(b"\0" * padding)
+            offset += padding
+            index["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            f.write(array.tobytes())
+            offset += array.nbytes
+    with open(os.path.join(path, SERVING_INDEX), "w") as f:
+        json.dump(index, f)
+    return index["fingerprint"]
+
+def map_serving_arrays(path):
+    # (index, {name: read-only array}) for the artifact directory at path
+    serving_file = os.path.join(path, SERVING_FILE)
+    stat = os.stat(serving_file)
+    map_key = (os.path.abspath(serving_file), stat.st_ino, stat.st_mtime_ns)
+    cached = _serving_maps.get(map_key)
+    if cached is None:
+        with open(os.path.join(path, SERVING_INDEX)) as f:
+            index = json.load(f)
+        buffer = np.memmap(serving_file, dtype=np.uint8, mode="r")
+        arrays = {name: np.ndarray(tuple(spec["shape"]), np.dtype(spec["dtype"]), buffer, spec["offset"])
+                  for name, spec in index["arrays"].items()}
+        # Analyzers still holding an older model keep their own map alive
+        _serving_maps.clear()
+        cached = _serving_maps[map_key] = (index, arrays)
+    return cached
+
+def _load_serving_arrays(analyzer, path, mmap=True):
+    index, arrays = map_serving_arrays(path)
+    if not mmap:
+        arrays = {name: np.array(array) for name, array in arrays.items()}
+    forest = FlatForest(
+        feature=arrays["feature"], threshold=arrays["threshold"], left=arrays["left"],
+        right=arrays["right"], leaf_proba=arrays["leaf_proba"], roots=arrays["roots"],
+        max_depth=index["max_depth"], classes=np.array(index["classes"], dtype=object),
+    )
+    analyzer.model = None
+    analyzer.feature_columns = list(index["columns"])
+    analyzer.transform = FeatureTransform(arrays["transform_scale"], arrays["transform_offset"])
+    analyzer.feature_importances = dict(zip(analyzer.feature_columns, arrays["importances"]))
+    # compiled_forest() keys its cache on the model object, here None
+    analyzer._cached_forest = (None, forest)
+    analyzer.model_fingerprint = index.get("fingerprint") or model_fingerprint(analyzer)
+
+def load_artifact(analyzer, key, artifact_dir=DEFAULT_ARTIFACT_DIR, mmap=True, serving_only=False):
+    # serving_only loads just the flat-forest arrays when the artifact has
+    # them; the analyzer then has no sklearn model (model is None)
+    path = artifact_path(key, artifact_dir)
+    model_file = os.path.join(path, "model.joblib")
+    meta_file = os.path.join(path, "meta.json")
+    if not (os.path.exists(model_file) and os.path.exists(meta_file)):
+        return None
+
+    with open(meta_file) as f:
+        meta = json.load(f)
+    if meta.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        return None
+
+    if serving_only and os.path.exists(os.path.join(path, SERVING_INDEX)):
+        _load_serving_arrays(analyzer, path, mmap)
+        analyzer.model_version = key
+        return meta
+
+    # Large arrays are memory-mapped read-only instead of copied into each worker
+    import joblib
+    state = joblib.load(model_file, mmap_mode="r" if mmap else None)
+    analyzer.model = state["model"]
+    analyzer.feature_columns = state["feature_columns"]
+    analyzer.transform = FeatureTransform(state["transform_scale"], state["transform_offset"])
+    analyzer.feature_importances = state["feature_importances"]
+    analyzer.model_version = key
+    analyzer.model_fingerprint = meta.get("fingerprint") or model_fingerprint(analyzer)
+    return meta
+
+def load_holdout(key, artifact_dir=DEFAULT_ARTIFACT_DIR):
+    # (X, y) saved by save_artifact, X in the model's column order; None if absent
+    holdout_file = os.path.join(artifact_path(key, artifact_dir), HOLDOUT_FILE)
+    if not os.path.exists(holdout_file):
+        return None
+    with np.load(holdout_file) as holdout:
+        return holdout["X"], holdout["y"]
+
+def list_artifacts(artifact_dir=DEFAULT_ARTIFACT_DIR):
+    # Metadata of every complete artifact, newest first
+    if not os.path.isdir(artifact_dir):
+        return []
+    metas = []
+    for name in os.listdir(artifact_dir):
+        meta_file = os.path.join(artifact_dir, name, "meta.json")
+        # Keys are plain hex; dotted names are versions, temporaries and locks
+        if "." in name or not os.path.exists(meta_file):
+            continue
+        with open(meta_file) as f:
+            meta = json.load(f)
+        if meta.get("format_version") == ARTIFACT_FORMAT_VERSION:
+            metas.append(meta)
+    return sorted(metas, key=lambda meta: meta.get("created_at", 0), reverse=True)
+
+def find_grown_from(data_path, artifact_dir=DEFAULT_ARTIFACT_DIR):
+    # Newest artifact whose training CSV is a byte prefix of data_path,
+    # i.e. the dataset has only had rows appended since it was trained
+    size = os.path.getsize(data_path)
+    for meta in list_artifacts(artifact_dir):
+        data_size = meta.get("data_size")
+        if data_size is None or data_size > size:
+            continue
+        if dataset_hash(data_path, limit=data_size) == meta.get("data_hash"):
+            return meta
+    return None
@@ -32,3 +32,94 @@ critical_thresholds = {
     "diastolic_blood_pressure": {"very_low": 40, "very_high": 120},
     "hba1c": {"very_low": 3.0, "very_high": 9.0},
 }
+
+# Decimal places of submitted values that go into result-cache keys (lab reporting precision)
+lab_precision = {
+    "glucose": 1,
+    "cholesterol": 1,
+    "hemoglobin": 2,
+    "platelets": 0,
+    "white_blood_cells": 0,
+    "red_blood_cells": 2,
+    "hematocrit": 1,
+    "mean_corpuscular_volume": 1,
+    "mean_corpuscular_hemoglobin": 1,
+    "mean_corpuscular_hemoglobin_concentration": 1,
+    "insulin": 2,
+    "bmi": 1,
+    "systolic_blood_pressure": 0,
+    "diastolic_blood_pressure": 0,
+    "triglycerides": 1,
+    "hba1c": 2,
+    "ldl_cholesterol": 1,
+    "hdl_cholesterol": 1,
+    "alt": 1,
+    "ast": 1,
+    "heart_rate": 0,
+    "creatinine": 3,
+    "troponin": 4,
+    "c_reactive_protein": 2
+}
+
+# Disease-specific rules. "labels" are the Disease values the model can
+# predict for the condition (the training CSV truncates some names).
+# Each recommendation fires when `field op threshold` holds for a patient
+# predicted with that disease, and lands in `category` of the action plan.
+disease_rules = {
+    "Diabetes": {
+        "labels": ["Diabetes"],
+        "primary_factors": ["glucose", "hba1c", "insulin"],
+        "secondary_factors": ["bmi", "triglycerides", "hdl_cholesterol"],
+        "recommendations": [
+            {"field": "glucose", "op": ">", "threshold": 95, "category": "monitoring_needed",
+             "parameter": "Blood Glucose", "action": "Regular glucose monitoring",
+             "target": "Maintain below 95 mg/dL"},
+            {"field": "hba1c", "op": ">", "threshold": 5.5, "category": "urgent_actions",
+             "parameter": "HbA1c", "action": "Consult endocrinologist",
+             "target": "Maintain below 5.5%"},
+        ]
+    },
+    "Anemia": {
+        "labels": ["Anemia"],
+        "primary_factors": ["hemoglobin", "red_blood_cells", "hematocrit"],
+        "secondary_factors": ["mean_corpuscular_volume", "mean_corpuscular_hemoglobin",
+                              "mean_corpuscular_hemoglobin_concentration"],
+        "recommendations": [
+            {"field": "hemoglobin", "op": "<", "threshold": 12.0, "category": "monitoring_needed",
+             "parameter": "Hemoglobin", "action": "Repeat complete blood count and check iron studies",
+             "target": "Maintain above 12 g/dL"},
+            {"field": "hemoglobin", "op": "<", "threshold": 8.0, "category": "urgent_actions",
+             "parameter": "Hemoglobin", "action": "Consult hematologist",
+             "target": "Maintain above 12 g/dL"},
+            {"field": "hematocrit", "op": "<", "threshold": 37, "category": "monitoring_needed",
+             "parameter": "Hematocrit", "action": "Track hematocrit with follow-up blood counts",
+             "target": "Maintain 37-47%"},
+        ]
+    },
+    "Thalassemia": {
+        "labels": ["Thalassemia", "Thalasse"],
+        "primary_factors": ["mean_corpuscular_volume", "mean_corpuscular_hemoglobin", "red_blood_cells"],
+        "secondary_factors": ["hemoglobin", "hematocrit", "mean_corpuscular_hemoglobin_concentration"],
+        "recommendations": [
+            {"field": "mean_corpuscular_volume", "op": "<", "threshold": 80, "category": "monitoring_needed",
+             "parameter": "Mean Corpuscular Volume", "action": "Hemoglobin electrophoresis to confirm trait",
+             "target": "Maintain 80-100 fL"},
+            {"field": "hemoglobin", "op": "<", "threshold": 9.0, "category": "urgent_actions",
+             "parameter": "Hemoglobin", "action": "Consult hematologist about transfusion needs",
+             "target": "Maintain above 12 g/dL"},
+        ]
+    },
+    "Thrombocytopenia": {
+        "labels": ["Thrombocytopenia", "Thromboc"],
+        "primary_factors": ["platelets"],
+        "secondary_factors": ["white_blood_cells", "hemoglobin"],
+        "recommendations": [
+            {"field": "platelets", "op": "<", "threshold": 150000, "category": "monitoring_needed",
+             "parameter": "Platelets", "action": "Repeat platelet count and avoid NSAIDs",
+             "target": "Maintain above 150,000 per microliter"},
+            {"field": "platelets", "op": "<", "threshold": 50000, "category": "urgent_actions",
+             "parameter": "Platelets", "action": "Consult hematologist; watch for bleeding",
+             "target": "Maintain above 150,000 per microliter"},
+        ]
+    }
+}
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+from .layout import FEATURE_COLUMNS
+from .artifact import dataset_hash
+
+TARGET_COLUMN = "Disease"
+DEFAULT_CHUNKSIZE = 100_000
+
+# Explicit dtypes so pandas never infers float64/object for the lab columns
+CSV_DTYPES = {**{col: np.float32 for col in FEATURE_COLUMNS}, TARGET_COLUMN: "category"}
+
+def iter_chunks(data_path, chunksize=DEFAULT_CHUNKSIZE):
+    # Yields (X float32 [rows x features], y labels) per chunk. pandas is
+    # imported here so serving processes that never read the CSV skip it.
+    import pandas as pd
+    for chunk in pd.read_csv(data_path, dtype=CSV_DTYPES, usecols=FEATURE_COLUMNS + [TARGET_COLUMN],
+                             chunksize=chunksize):
+        X = chunk[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+        y = chunk[TARGET_COLUMN].astype(str).to_numpy()
+        yield X, y
+
+class StratifiedReservoir:
+    # Uniform sample of at most `capacity` rows per Disease class over a
+    # stream of chunks (Algorithm R per class), so memory stays bounded
+    # however large the export is.
+
+    def __init__(self, capacity, n_features=len(FEATURE_COLUMNS), seed=42):
+        self.capacity = capacity
+        self.n_features = n_features
+        self.rng = np.random.default_rng(seed)
+        self.samples = {}
+        self.seen = {}
+
+    def add(self, X, y):
+        for label in np.unique(y):
+            rows = X[y == label]
+            if label not in self.samples:
+                self.samples[label] = np.empty((0, self.n_features), dtype=np.float32)
+                self.seen[label] = 0
+            self._add_class(label, rows)
+
+    def _add_class(self, label, rows):
+        reservoir = self.samples[label]
+        seen = self.seen[label]
+
+        # Fill the reservoir first
+        free = self.capacity - len(reservoir)
+        if free > 0:
+            fill = rows[:free]
+            reservoir = np.concatenate([reservoir, fill])
+            seen += len(fill)
+            rows = rows[free:]
+
+        if len(rows):
+            # Row i of the stream replaces a random slot with probability capacity / (i + 1)
+            positions = seen + np.arange(len(rows))
+            slots = (self.rng.random(len(rows)) * (positions + 1)).astype(np.int64)
+            keep = slots < self.capacity
+            reservoir[slots[keep]] = rows[keep]
+            seen += len(rows)
+
+        self.samples[label] = reservoir
+        self.seen[label] = seen
+
+    def result(self):
+        labels = sorted(self.samples)
+        X = np.concatenate([self.samples[label] for label in labels]) if labels else \
+            np.empty((0, self.n_features), dtype=np.float32)
+        y = np.concatenate([np.full(len(self.samples[label]), label) for label in labels]) if labels else \
+            np.empty(0, dtype=str)
+        return X, y
+
+def read_training_data(data_path, max_rows_per_class=None, chunksize=DEFAULT_CHUNKSIZE, seed=42):
+    if max_rows_per_class:
+        reservoir = StratifiedReservoir(max_rows_per_class, seed=seed)
+        for X, y in iter_chunks(data_path, chunksize):
+            reservoir.add(X, y)
+        return reservoir.result()
+
+    X_parts, y_parts = [], []
+    for X, y in iter_chunks(data_path, chunksize):
+        X_parts.append(X)
+        y_parts.append(y)
+    return np.concatenate(X_parts), np.concatenate(y_parts)
+
+def cache_key(data_path, max_rows_per_class=None, seed=42):
+    digest = hashlib.sha256()
+    digest.update(dataset_hash(data_path).encode())
+    digest.update(json.dumps({"max_rows_per_class": max_rows_per_class, "seed": seed,
+                              "columns": FEATURE_COLUMNS}).encode())
+    return digest.hexdigest()[:16]
+
+def load_training_data(data_path, max_rows_per_class=None, chunksize=DEFAULT_CHUNKSIZE, seed=42, cache_dir=None):
+    # Returns (X float32, y labels). With cache_dir the parsed/sampled matrix
+    # is stored column-major as .npy and memory-mapped copy-on-write on later
+    # runs, so the CSV is parsed once and callers may modify X in place.
+    if cache_dir is None:
+        return read_training_data(data_path, max_rows_per_class, chunksize, seed)
+
+    path = os.path.join(cache_dir, cache_key(data_path, max_rows_per_class, seed))
+    X_file = os.path.join(path, "X.npy")
+    codes_file = os.path.join(path, "y_codes.npy")
+    classes_file = os.path.join(path, "classes.json")
+    if not os.path.exists(classes_file):
+        X, y = read_training_data(data_path, max_rows_per_class, chunksize, seed)
+        classes, codes = np.unique(y, return_inverse=True)
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, "X.npy"), np.asfortranarray(X))
+        np.save(os.path.join(tmp_path, "y_codes.npy"), codes.astype(np.int32))
+        with open(os.path.join(tmp_path, "classes.json"), "w") as f:
+            json.dump(classes.tolist(), f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    with open(classes_file) as f:
+        classes = np.array(json.load(f))
+    X = np.load(X_file, mmap_mode="c")
+    y = classes.take(np.load(codes_file, mmap_mode="r"))
+    return X, y
+
+def add_noise_(X, noise_factor, rng, block_size=8):
+    # Gaussian noise scaled by each column's std, added in place a few
+    # columns at a time. Draws follow the same column-by-column order as a
+    # per-column rng.normal loop.
+    stds = X.std(axis=0, ddof=1, dtype=np.float64)
+    n_rows, n_cols = X.shape
+    for start in range(0, n_cols, block_size):
+        stop = min(start + block_size, n_cols)
+        scale = (noise_factor * stds[start:stop])[:, None]
+        noise = rng.normal(0, scale, size=(stop - start, n_rows))
+        X[:, start:stop] += noise.T.astype(X.dtype, copy=False)
+    return X
@@ -0,0 +1,130 @@
+import numpy as np
+
+# Rows traversed together; keeps the (rows x trees) working set in cache
+CHUNK_SIZE = 256
+
+class FlatForest:
+    # A fitted RandomForestClassifier packed into contiguous node arrays.
+    # All trees share one node table; children hold global node indices and
+    # leaves point at themselves, so traversal is a fixed number of gathers.
+
+    def __init__(self, feature, threshold, left, right, leaf_proba, roots, max_depth, classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_proba = leaf_proba
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes_ = classes
+
+    @classmethod
+    def from_model(cls, model):
+        features, thresholds, lefts, rights, probas, roots = [], [], [], [], [], []
+        max_depth = 0
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes)
+            is_leaf = tree.children_left == -1
+
+            # Leaves send every row back to themselves
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+
+            # Same normalization as DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :]
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            probas.append(value / normalizer)
+
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n_nodes
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.intp),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            left=np.ascontiguousarray(np.concatenate(lefts), dtype=np.intp),
+            right=np.ascontiguousarray(np.concatenate(rights), dtype=np.intp),
+            leaf_proba=np.ascontiguousarray(np.concatenate(probas), dtype=np.float64),
+            roots=np.array(roots, dtype=np.intp),
+            max_depth=max_depth,
+            classes=model.classes_,
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def apply(self, X):
+        # Leaf index reached in every tree, shape (n_rows, n_trees)
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_proba(self, X, chunk_size=CHUNK_SIZE):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if len(X) <= chunk_size:
+            return self.leaf_proba[self.apply(X)].sum(axis=1) / self.n_trees
+        # Large batches go through in cache-sized chunks
+        out = np.empty((len(X), self.leaf_proba.shape[1]))
+        for start in range(0, len(X), chunk_size):
+            stop = start + chunk_size
+            out[start:stop] = self.leaf_proba[self.apply(X[start:stop])].sum(axis=1) / self.n_trees
+        return out
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+    def contribution_table(self, n_features):
+        # Saabas attribution: walking a tree from the root to a leaf, every
+        # split hands the change in class probabilities to the feature it
+        # split on. The per-feature sums are fixed per leaf, so they are
+        # added up once here, shape (n_leaves, n_classes, n_features).
+        # Returns (bias, leaf_row, table); leaf_row maps node ids to rows.
+        n_nodes = len(self.feature)
+        node_ids = np.arange(n_nodes)
+        is_leaf = self.left == node_ids
+        path = np.zeros((n_nodes, self.leaf_proba.shape[1], n_features))
+        frontier = self.roots[~is_leaf[self.roots]]
+        while len(frontier):
+            split_feature = self.feature[frontier]
+            for children in (self.left[frontier], self.right[frontier]):
+                path[children] = path[frontier]
+                path[children, :, split_feature] += self.leaf_proba[children] - self.leaf_proba[frontier]
+            children = np.concatenate([self.left[frontier], self.right[frontier]])
+            frontier = children[~is_leaf[children]]
+
+        leaves = np.flatnonzero(is_leaf)
+        leaf_row = np.zeros(n_nodes, dtype=np.intp)
+        leaf_row[leaves] = np.arange(len(leaves))
+        bias = self.leaf_proba[self.roots].mean(axis=0)
+        return bias, leaf_row, np.ascontiguousarray(path[leaves])
+
+    def contributions(self, X, class_index, tables, chunk_size=CHUNK_SIZE):
+        # Per-feature contributions of row i to the probability of class
+        # class_index[i]; they sum to that probability minus bias[class].
+        # One traversal plus one gather over the precomputed table.
+        _, leaf_row, table = tables
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        out = np.empty((len(X), table.shape[2]))
+        for start in range(0, len(X), chunk_size):
+            stop = start + chunk_size
+            rows = leaf_row[self.apply(X[start:stop])]
+            out[start:stop] = table[rows, class_index[start:stop, None]].sum(axis=1) / self.n_trees
+        return out
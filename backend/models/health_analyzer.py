@@ -1,240 +1,312 @@
-import pandas as pd
+import time
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score, StratifiedKFold, GridSearchCV
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
-from sklearn.utils import class_weight
-from imblearn.over_sampling import SMOTE
-from .constants import normal_ranges
+from .layout import FEATURE_COLUMNS, NUM_FEATURES
+from .normalization import feature_ranges, to_raw
+from .forest import FlatForest
+
+# Everything that influences the fitted model; part of the artifact key
+TRAINING_CONFIG = {
+    'noise_factor': 0.02,
+    'test_size': 0.2,
+    'param_grid': {
+        'n_estimators': [50, 100],
+        'max_depth': [4, 6, 8],
+        'min_samples_split': [8, 10, 12],
+        'min_samples_leaf': [4, 5, 6]
+    },
+    'grid_cv_folds': 5,
+    'cv_folds': 10,
+    'bootstrap_iterations': 50,
+    'random_state': 42
+}
+
+# Past this many rows sklearn's compiled traversal beats the NumPy FlatForest
+FLAT_FOREST_MAX_ROWS = 512
+# Rows per health-score pass; a chunk's temporaries stay in L2
+SCORE_CHUNK_ROWS = 2048
+
+def _round_scores(scores):
+    # [round(min(100, max(0, s)), 2) for s in scores], vectorized. s * 100
+    # is off by at most half an ulp, so only scores within a hair of a
+    # .xx5 tie can round differently from round(); those use round().
+    # Clamped scores stay the ints 0 and 100, as min/max return them.
+    if len(scores) <= 16:
+        # Fewer NumPy calls than the vectorized path
+        return [round(min(100, max(0, score)), 2) for score in scores.tolist()]
+    scaled = scores * 100
+    rounded = (np.rint(scaled) / 100).astype(object)
+    for i in np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6):
+        rounded[i] = round(float(scores[i]), 2)
+    rounded[scores >= 100] = 100
+    rounded[~(scores > 0)] = 0
+    return rounded.tolist()
 
 class HealthAnalyzer:
-    def __init__(self):
-        self.scaler = StandardScaler()
-        # More conservative model parameters to prevent overfitting
-        self.model = RandomForestClassifier(
-            n_estimators=100,      # Reduced from 200
-            max_depth=6,           # Reduced from 8
-            min_samples_split=10,  # Increased from 8
-            min_samples_leaf=5,    # Increased from 3
-            max_features='sqrt',
-            bootstrap=True,
-            class_weight='balanced',
-            random_state=42
-        )
+    def __init__(self, flat_forest=False):
+        # Fitted FeatureTransform and RandomForestClassifier, set by train/load
+        self.transform = None
+        self.model = None
         self.feature_columns = None
         self.feature_importances = None
-        self.smote = SMOTE(random_state=42)  # Add SMOTE for minority class
-
-    def prepare_data(self, data):
-        data = data.copy()
-        
-        # Increase noise factor for better generalization
-        noise_factor = 0.02
-        numeric_columns = data.select_dtypes(include=['float64', 'int64']).columns
-        for col in numeric_columns:
-            if col != 'Disease':
-                noise = np.random.normal(0, noise_factor * data[col].std(), size=len(data))
-                data[col] = data[col] + noise
-        
-        self.feature_columns = [col for col in data.columns if col != 'Disease']
-        X = data[self.feature_columns]
-        y = data['Disease']
-        
-        # Split before SMOTE to prevent data leakage
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, stratify=y, random_state=42
-        )
-        
-        # Apply SMOTE only to training data
-        X_train_resampled, y_train_resampled = self.smote.fit_resample(X_train, y_train)
-        
-        return X_train_resampled, X_test, y_train_resampled, y_test
-
-    def train(self, data):
-        X_train, X_test, y_train, y_test = self.prepare_data(data)
-        
-        # Scale features
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        X_test_scaled = self.scaler.transform(X_test)
-        
-        # Grid search for best parameters
-        param_grid = {
-            'n_estimators': [50, 100],
-            'max_depth': [4, 6, 8],
-            'min_samples_split': [8, 10, 12],
-            'min_samples_leaf': [4, 5, 6]
+        # Artifact key of the fitted model; changes on every train/load
+        self.model_version = None
+        # Content hash of the fitted model (models.artifact.model_fingerprint)
+        self.model_fingerprint = None
+        # (X, y) test split left out of training, in the CSV's space; saved with the artifact
+        self.holdout = None
+        # Serve predictions from the compiled FlatForest instead of sklearn
+        self.flat_forest = flat_forest
+
+    # Training lives in models.training so serving never imports it
+
+    def prepare_data(self, data, config=None):
+        from .training import prepare_data
+        return prepare_data(self, data, config)
+
+    def train(self, data, config=None, n_jobs=-1, progress=None):
+        from .training import train
+        return train(self, data, config, n_jobs, progress)
+
+    def _layout(self):
+        # Serving-time arrays in feature_columns order, rebuilt only when a
+        # train/load replaces the columns or importances. Columns without a
+        # normal range get an identity normalization and are not scored.
+        columns = tuple(self.feature_columns)
+        cached = getattr(self, '_cached_layout', None)
+        if (cached is not None and cached['columns'] == columns
+                and cached['importances'] is self.feature_importances):
+            return cached
+
+        min_vals, range_width, has_range = feature_ranges(columns)
+        max_vals = min_vals + range_width
+        # Incoming matrices follow FEATURE_COLUMNS; map them onto the model's columns
+        order = [FEATURE_COLUMNS.index(col) for col in columns]
+
+        # Piecewise score curve of every scored (ranged) column, in scoring order
+        scored = np.flatnonzero(has_range)
+        optimal_min = (min_vals + (range_width * 0.1))[scored]
+        optimal_max = (max_vals - (range_width * 0.1))[scored]
+        weights = [self.feature_importances.get(columns[i], 0.01) for i in scored]
+        total_importance = 0
+        for importance in weights:
+            total_importance += importance
+
+        layout = {
+            'columns': columns,
+            'importances': self.feature_importances,
+            'order': None if order == list(range(NUM_FEATURES)) else np.array(order),
+            'has_range': has_range,
+            'min_vals': min_vals,
+            'max_vals': max_vals,
+            'range_width': range_width,
+            'curve': {
+                'index': scored,
+                'min': min_vals[scored],
+                'max': max_vals[scored],
+                'optimal_min': optimal_min,
+                'optimal_max': optimal_max,
+                'low_span': optimal_min - min_vals[scored],
+                'high_span': max_vals[scored] - optimal_max,
+                'weights': np.array(weights, dtype=float),
+                'total_importance': total_importance,
+            },
         }
-        
-        grid_search = GridSearchCV(
-            estimator=RandomForestClassifier(
-                random_state=42,
-                class_weight='balanced',
-                bootstrap=True
-            ),
-            param_grid=param_grid,
-            cv=5,
-            scoring='balanced_accuracy',
-            n_jobs=-1
-        )
-        
-        # Fit grid search
-        grid_search.fit(X_train_scaled, y_train)
-        
-        # Use best model
-        self.model = grid_search.best_estimator_
-        
-        # Enhanced cross-validation
-        skf = StratifiedKFold(n_splits=10, shuffle=True, random_state=42)
-        cv_scores = cross_val_score(self.model, X_train_scaled, y_train, cv=skf, scoring='balanced_accuracy')
-        
-        # Bootstrap feature importance
-        importances = []
-        for i in range(50):  # Increased iterations
-            # Sample with replacement
-            indices = np.random.choice(len(X_train_scaled), size=int(len(X_train_scaled) * 0.8), replace=True)
-            X_bootstrap = X_train_scaled[indices]
-            y_bootstrap = y_train.iloc[indices]
-            
-            model_bootstrap = RandomForestClassifier(
-                **grid_search.best_params_,
-                random_state=i
-            )
-            model_bootstrap.fit(X_bootstrap, y_bootstrap)
-            importances.append(model_bootstrap.feature_importances_)
-        
-        # Calculate mean and confidence intervals
-        self.feature_importances = dict(zip(
-            self.feature_columns,
-            np.mean(importances, axis=0)
-        ))
-        
-        feature_importance_ci = dict(zip(
-            self.feature_columns,
-            np.percentile(importances, [2.5, 97.5], axis=0).T
-        ))
-        
-        # Model evaluation
-        y_pred = self.model.predict(X_test_scaled)
-        probas = self.model.predict_proba(X_test_scaled)
-        
-        evaluation = {
-            'accuracy': accuracy_score(y_test, y_pred),
-            'cv_scores_mean': cv_scores.mean(),
-            'cv_scores_std': cv_scores.std(),
-            'classification_report': classification_report(y_test, y_pred),
-            'confusion_matrix': confusion_matrix(y_test, y_pred).tolist(),
-            'top_features': sorted(
-                [(k, v, feature_importance_ci[k]) 
-                 for k, v in self.feature_importances.items()],
-                key=lambda x: x[1],
-                reverse=True
-            )[:5],
-            'best_params': grid_search.best_params_
+        self._cached_layout = layout
+        return layout
+
+    def compiled_forest(self):
+        # Compiled once per fitted model (train/load replaces self.model)
+        cached = getattr(self, '_cached_forest', None)
+        if cached is None or cached[0] is not self.model:
+            cached = (self.model, FlatForest.from_model(self.model))
+            self._cached_forest = cached
+        return cached[1]
+
+    def contribution_tables(self):
+        # Per-leaf attribution tables of the compiled forest (see
+        # FlatForest.contribution_table), rebuilt when the forest changes.
+        # Built on the first contributions=True call, not in prepare(): the
+        # API reports never ask for them, so serving and pool workers skip them.
+        forest = self.compiled_forest()
+        cached = getattr(self, '_cached_contributions', None)
+        if cached is None or cached[0] is not forest:
+            cached = (forest, forest.contribution_table(len(self.feature_columns)))
+            self._cached_contributions = cached
+        return cached[1]
+
+    def prepare(self):
+        # Build the serving caches at load time instead of on the first request
+        self._layout()
+
+    def _model_matrix(self, X):
+        # X holds raw values, one row per patient, in FEATURE_COLUMNS order
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        order = self._layout()['order']
+        return X if order is None else X[:, order]
+
+    def _frame_to_matrix(self, patient_data):
+        return patient_data[FEATURE_COLUMNS].to_numpy(dtype=float)
+
+    def _normalize(self, X_model):
+        layout = self._layout()
+        return (X_model - layout['min_vals']) / layout['range_width']
+
+    def _predict_scaled(self, scaled):
+        # scaled is model input: raw values through self.transform
+        if self.model is None:
+            # Serving-only load: there is no sklearn model to fall back to
+            forest = self.compiled_forest()
+            probabilities = forest.predict_proba(scaled)
+            return forest.classes_.take(np.argmax(probabilities, axis=1), axis=0), probabilities
+        if self.flat_forest and len(scaled) <= FLAT_FOREST_MAX_ROWS:
+            probabilities = self.compiled_forest().predict_proba(scaled)
+        else:
+            probabilities = self.model.predict_proba(scaled)
+        predictions = self.model.classes_.take(np.argmax(probabilities, axis=1), axis=0)
+        return predictions, probabilities
+
+    def _metrics_at_risk(self, X_model):
+        layout = self._layout()
+        out_of_range = (X_model < layout['min_vals']) | (X_model > layout['max_vals'])
+        return (out_of_range & layout['has_range']).sum(axis=1)
+
+    def _weighted_feature_scores(self, X_model):
+        curve = self._layout()['curve']
+        X = X_model[:, curve['index']]
+
+        # Each branch overwrites the ones before it, so the optimal band wins,
+        # then below-range, above-range, below-optimal, and above-optimal last
+        with np.errstate(divide='ignore', invalid='ignore'):
+            feature_scores = 80 + (curve['max'] - X) * 20 / curve['high_span']
+            np.copyto(feature_scores, 80 + (X - curve['min']) * 20 / curve['low_span'],
+                      where=X < curve['optimal_min'])
+            np.copyto(feature_scores, np.maximum(0, (2 - X / curve['max']) * 80), where=X > curve['max'])
+            np.copyto(feature_scores, np.maximum(0, (X / curve['min']) * 80), where=X < curve['min'])
+            np.copyto(feature_scores, 100.0, where=(X >= curve['optimal_min']) & (X <= curve['optimal_max']))
+
+        # Accumulate left to right (not a pairwise sum) so a patient's score
+        # does not depend on the batch it was scored in
+        if not X.shape[1]:
+            return np.zeros(len(X))
+        weighted_score = np.add.accumulate(feature_scores * curve['weights'], axis=1)[:, -1]
+        if curve['total_importance'] > 0:
+            weighted_score = weighted_score / curve['total_importance']
+        return weighted_score
+
+    def _health_scores(self, X_model, predictions, probabilities, metrics_at_risk):
+        if len(X_model) <= SCORE_CHUNK_ROWS:
+            weighted_score = self._weighted_feature_scores(X_model)
+        else:
+            # Rows are independent; cache-sized chunks keep the temporaries out of main memory
+            weighted_score = np.concatenate([self._weighted_feature_scores(X_model[start:start + SCORE_CHUNK_ROWS])
+                                             for start in range(0, len(X_model), SCORE_CHUNK_ROWS)])
+
+        healthy = predictions == 'Healthy'
+        confidence_weight = np.where(healthy, 0.2, 0.3)
+        prediction_confidence = probabilities.max(axis=1)
+        health_scores = (weighted_score * (1 - confidence_weight)) + (prediction_confidence * 100 * confidence_weight)
+
+        # Boost score for healthy prediction with normal values
+        boost = healthy & (metrics_at_risk == 0)
+        health_scores = np.where(boost, np.minimum(100, health_scores * 1.2), health_scores)
+
+        return _round_scores(health_scores)
+
+    def _contributions(self, X_model, scaled, probabilities):
+        # The five features that moved each patient's predicted-class
+        # probability the most, by tree-path attribution
+        layout = self._layout()
+        normalized = self._normalize(X_model)
+        contributions = self.compiled_forest().contributions(scaled, probabilities.argmax(axis=1),
+                                                             self.contribution_tables())
+        top = np.argsort(-np.abs(contributions), axis=1, kind='stable')[:, :5]
+        return [
+            [
+                {
+                    'feature': layout['columns'][i],
+                    'contribution': contributions[row, i],
+                    'importance': self.feature_importances[layout['columns'][i]],
+                    'value': X_model[row, i],
+                    'normalized_value': normalized[row, i]
+                }
+                for i in top[row].tolist()
+            ]
+            for row in range(len(X_model))
+        ]
+
+    def analyze_batch(self, X, contributions=False, timings=None):
+        # One normalization, one model call and one range scan feed every
+        # per-patient output. A `timings` dict receives seconds per stage.
+        start = time.perf_counter()
+        X_model = self._model_matrix(X)
+        # One fused multiply-add from raw values to model input
+        scaled = self.transform.transform(X_model)
+        normalized_at = time.perf_counter()
+        predictions, probabilities = self._predict_scaled(scaled)
+        predicted_at = time.perf_counter()
+        metrics_at_risk = self._metrics_at_risk(X_model)
+        result = {
+            'predictions': predictions,
+            'probabilities': probabilities,
+            'health_scores': self._health_scores(X_model, predictions, probabilities, metrics_at_risk),
+            'metrics_at_risk': metrics_at_risk,
+        }
+        if contributions:
+            result['top_contributing_features'] = self._contributions(X_model, scaled, probabilities)
+        if timings is not None:
+            timings['normalize'] = normalized_at - start
+            timings['predict'] = predicted_at - normalized_at
+            timings['health_score'] = time.perf_counter() - predicted_at
+        return result
+
+    def analyze(self, patient_data):
+        # Single patient: a DataFrame row or a raw vector in FEATURE_COLUMNS order
+        if hasattr(patient_data, 'columns'):  # a pandas DataFrame
+            patient_data = self._frame_to_matrix(patient_data)
+        result = self.analyze_batch(patient_data, contributions=True)
+        return {
+            'prediction': result['predictions'][0],
+            'probabilities': result['probabilities'][0].tolist(),
+            'top_contributing_features': result['top_contributing_features'][0],
+            'health_score': result['health_scores'][0],
+            'metrics_at_risk': int(result['metrics_at_risk'][0]),
         }
-        
-        return evaluation
-    
+
+    def holdout_accuracy(self, X, y):
+        # X is in the training CSV's (already normalized) space
+        predictions, probabilities = self._predict_scaled(self.transform.transform(to_raw(X, self.feature_columns)))
+        if not np.isfinite(probabilities).all():
+            return 0.0
+        return float(np.mean(predictions == np.asarray(y)))
+
+    # Thin wrappers over analyze_batch/analyze
+
+    def normalize_batch(self, X):
+        return self._normalize(self._model_matrix(X))
+
+    def predict_batch(self, X):
+        return self._predict_scaled(self.transform.transform(self._model_matrix(X)))
+
+    def metrics_at_risk_batch(self, X):
+        return self._metrics_at_risk(self._model_matrix(X))
+
+    def health_scores_batch(self, X, predictions, probabilities):
+        X_model = self._model_matrix(X)
+        return self._health_scores(X_model, predictions, probabilities, self._metrics_at_risk(X_model))
+
     def predict_disease(self, patient_data):
-        # Convert actual values to normalized range
-        normalized_data = patient_data.copy()
-        for col in patient_data.columns:
-            col_lower = col.lower().replace(' ', '_')
-            if col_lower in normal_ranges:
-                min_val, max_val = normal_ranges[col_lower]
-                normalized_data[col] = (patient_data[col] - min_val) / (max_val - min_val)
-        
-        # Scale the normalized data
-        scaled_data = self.scaler.transform(normalized_data)
-        
-        # Get predictions and probabilities
-        prediction = self.model.predict(scaled_data)
-        probabilities = self.model.predict_proba(scaled_data)
-        
-        # Get top contributing features
-        feature_contributions = []
-        for i, col in enumerate(self.feature_columns):
-            contribution = {
-                'feature': col,
-                'importance': self.feature_importances[col],
-                'value': patient_data[col].iloc[0],
-                'normalized_value': normalized_data[col].iloc[0]
-            }
-            feature_contributions.append(contribution)
-        
-        feature_contributions.sort(key=lambda x: x['importance'], reverse=True)
-        
+        result = self.analyze(patient_data)
         return {
-            'prediction': prediction[0],
-            'probabilities': probabilities[0].tolist(),
-            'top_contributing_features': feature_contributions[:5]
+            'prediction': result['prediction'],
+            'probabilities': result['probabilities'],
+            'top_contributing_features': result['top_contributing_features']
         }
-    
+
     def calculate_health_score(self, patient_data):
-        prediction_result = self.predict_disease(patient_data)
-        
-        # Use model's confidence and feature importances for score
-        prediction_confidence = max(prediction_result['probabilities'])
-        weighted_score = 0
-        total_importance = 0
-        
-        # Calculate score using feature importances and normalized values
-        for col in patient_data.columns:
-            col_lower = col.lower().replace(' ', '_')
-            if col_lower in normal_ranges:
-                min_val, max_val = normal_ranges[col_lower]
-                value = patient_data[col].iloc[0]
-                importance = self.feature_importances.get(col, 0.01)  # Default importance if not found
-                total_importance += importance
-                
-                # Calculate optimal range
-                range_width = max_val - min_val
-                optimal_min = min_val + (range_width * 0.1)  # 10% from min
-                optimal_max = max_val - (range_width * 0.1)  # 10% from max
-                
-                # Calculate feature score
-                if optimal_min <= value <= optimal_max:
-                    feature_score = 100  # Optimal value
-                else:
-                    if value < min_val:
-                        feature_score = max(0, (value / min_val) * 80)
-                    elif value > max_val:
-                        feature_score = max(0, (2 - value / max_val) * 80)
-                    else:
-                        # Within normal range but not optimal
-                        if value < optimal_min:
-                            feature_score = 80 + (value - min_val) * 20 / (optimal_min - min_val)
-                        else:
-                            feature_score = 80 + (max_val - value) * 20 / (max_val - optimal_max)
-                
-                weighted_score += feature_score * importance
-        
-        # Normalize weighted score
-        if total_importance > 0:
-            weighted_score = weighted_score / total_importance
-        
-        # Adjust confidence impact based on prediction
-        if prediction_result['prediction'] == 'Healthy':
-            confidence_weight = 0.2  # Less weight for healthy predictions
-        else:
-            confidence_weight = 0.3  # More weight for disease predictions
-        
-        # Calculate final score
-        health_score = (weighted_score * (1 - confidence_weight)) + (prediction_confidence * 100 * confidence_weight)
-        
-        # Boost score for healthy prediction with normal values
-        if prediction_result['prediction'] == 'Healthy' and self.metrics_at_risk(patient_data) == 0:
-            health_score = min(100, health_score * 1.2)  # 20% boost
-        
-        return round(min(100, max(0, health_score)), 2)
+        return self.analyze(patient_data)['health_score']
 
     def metrics_at_risk(self, patient_data):
-        count = 0
-        for col in patient_data.columns:
-            col_lower = col.lower().replace(' ', '_')
-            if col_lower in normal_ranges:
-                min_val, max_val = normal_ranges[col_lower]
-                value = patient_data[col].iloc[0]
-                if value < min_val or value > max_val:
-                    count += 1
-        return count
+        # Range scan only, no inference needed
+        return int(self.metrics_at_risk_batch(self._frame_to_matrix(patient_data))[0])
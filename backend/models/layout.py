@@ -0,0 +1,51 @@
+import numpy as np
+from .constants import normal_ranges, lab_precision
+
+# Fixed feature layout shared by the API and the analyzer, built once at import.
+# Order matches the columns of data/blood_test_data.csv.
+FEATURES = [
+    ("Glucose", "glucose"),
+    ("Cholesterol", "cholesterol"),
+    ("Hemoglobin", "hemoglobin"),
+    ("Platelets", "platelets"),
+    ("White Blood Cells", "white_blood_cells"),
+    ("Red Blood Cells", "red_blood_cells"),
+    ("Hematocrit", "hematocrit"),
+    ("Mean Corpuscular Volume", "mean_corpuscular_volume"),
+    ("Mean Corpuscular Hemoglobin", "mean_corpuscular_hemoglobin"),
+    ("Mean Corpuscular Hemoglobin Concentration", "mean_corpuscular_hemoglobin_concentration"),
+    ("Insulin", "insulin"),
+    ("BMI", "bmi"),
+    ("Systolic Blood Pressure", "systolic_blood_pressure"),
+    ("Diastolic Blood Pressure", "diastolic_blood_pressure"),
+    ("Triglycerides", "triglycerides"),
+    ("HbA1c", "hba1c"),
+    ("LDL Cholesterol", "ldl_cholesterol"),
+    ("HDL Cholesterol", "hdl_cholesterol"),
+    ("ALT", "alt"),
+    ("AST", "ast"),
+    ("Heart Rate", "heart_rate"),
+    ("Creatinine", "creatinine"),
+    ("Troponin", "troponin"),
+    ("C-reactive Protein", "c_reactive_protein"),
+]
+
+FEATURE_COLUMNS = [alias for alias, _ in FEATURES]
+FIELD_NAMES = [field for _, field in FEATURES]
+ALIAS_TO_FIELD = dict(FEATURES)
+FIELD_INDEX = {field: i for i, field in enumerate(FIELD_NAMES)}
+NUM_FEATURES = len(FEATURES)
+
+RANGE_MIN = np.array([normal_ranges[field][0] for field in FIELD_NAMES], dtype=float)
+RANGE_MAX = np.array([normal_ranges[field][1] for field in FIELD_NAMES], dtype=float)
+
+# Interpretation bucket edges (bottom and top quarter of the normal range)
+LOW_END = RANGE_MIN + (RANGE_MAX - RANGE_MIN) * 0.25
+HIGH_END = RANGE_MAX - (RANGE_MAX - RANGE_MIN) * 0.25
+
+# Severity edges used by the abnormal-value warnings
+SEVERE_LOW = RANGE_MIN * 0.8
+SEVERE_HIGH = RANGE_MAX * 1.2
+
+# Decimal places per feature used to round submitted values into cache keys
+PRECISION = np.array([lab_precision[field] for field in FIELD_NAMES])
@@ -0,0 +1,47 @@
+import numpy as np
+from .constants import normal_ranges
+from .layout import ALIAS_TO_FIELD
+
+# The training CSV stores every lab value min-max scaled to 0-1 over its
+# normal range, and the model is fitted on standardized features. Both steps
+# are affine per feature, so they fold into one scale and offset vector:
+#
+#   model input = raw value * scale + offset
+#
+# Training converts the CSV back to raw units and fits the transform there,
+# serving applies the same vectors to raw request values. Both sides run the
+# identical multiply-add, and the vectors are saved with the model.
+
+def feature_ranges(columns):
+    # (range_min, range_width, has_range) per column. Columns without a
+    # normal range keep their values (min 0, width 1) and are not scored.
+    fields = [ALIAS_TO_FIELD.get(col) for col in columns]
+    has_range = np.array([field in normal_ranges for field in fields])
+    range_min = np.array([normal_ranges[field][0] if field in normal_ranges else 0.0 for field in fields], dtype=float)
+    range_max = np.array([normal_ranges[field][1] if field in normal_ranges else 1.0 for field in fields], dtype=float)
+    return range_min, range_max - range_min, has_range
+
+def to_raw(X, columns):
+    # Training CSV (0-1 over the normal range) to raw lab values
+    range_min, range_width, _ = feature_ranges(columns)
+    return range_min + np.asarray(X, dtype=float) * range_width
+
+class FeatureTransform:
+    def __init__(self, scale, offset):
+        self.scale = scale
+        self.offset = offset
+
+    @classmethod
+    def fit(cls, X_raw):
+        # Standardization as StandardScaler fits it (population std, a
+        # constant column keeps scale 1), expressed as a multiply-add
+        mean = X_raw.mean(axis=0)
+        std = X_raw.std(axis=0)
+        std[std < 10 * np.finfo(float).eps] = 1.0
+        scale = 1.0 / std
+        return cls(scale, -mean * scale)
+
+    def transform(self, X_raw):
+        model_input = np.multiply(X_raw, self.scale)
+        model_input += self.offset
+        return model_input
@@ -0,0 +1,104 @@
+import numpy as np
+from .constants import disease_rules, critical_thresholds
+from .layout import FEATURES, FIELD_INDEX, RANGE_MIN, RANGE_MAX
+
+OPERATORS = {">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal}
+
+RECOMMENDATION_CATEGORIES = ["urgent_actions", "monitoring_needed", "lifestyle_changes", "preventive_measures"]
+
+FIELD_ALIAS = {field: alias for alias, field in FEATURES}
+
+# Disease id of rules that apply whatever the prediction
+ANY_DISEASE = -1
+
+def critical_rules(thresholds=critical_thresholds):
+    # A value past a critical threshold is urgent for every patient
+    rules = []
+    for field, limits in thresholds.items():
+        target = f"Keep between {limits['very_low']} and {limits['very_high']}"
+        for op, threshold in (("<", limits["very_low"]), (">", limits["very_high"])):
+            rules.append({"field": field, "op": op, "threshold": threshold, "category": "urgent_actions",
+                          "parameter": FIELD_ALIAS[field], "action": "Seek immediate medical attention",
+                          "target": target})
+    return rules
+
+class RuleSet:
+    # disease_rules and critical_thresholds compiled into flat threshold
+    # arrays. evaluate() checks every rule against every patient with one
+    # comparison per operator, so Python only touches the rules that fire
+    # and adding a disease adds table rows, not per-request loops.
+
+    def __init__(self, rules=disease_rules, thresholds=critical_thresholds):
+        self.diseases = list(rules)
+        self.label_ids = {label: d for d, name in enumerate(self.diseases) for label in rules[name]["labels"]}
+        self.unknown_id = len(self.diseases)
+
+        compiled = [(ANY_DISEASE, rule) for rule in critical_rules(thresholds)]
+        compiled += [(d, rule) for d, name in enumerate(self.diseases) for rule in rules[name]["recommendations"]]
+
+        self.rule_disease = np.array([d for d, _ in compiled], dtype=np.intp)
+        self.rule_field = np.array([FIELD_INDEX[rule["field"]] for _, rule in compiled], dtype=np.intp)
+        self.rule_threshold = np.array([rule["threshold"] for _, rule in compiled], dtype=float)
+        self.rule_category = [rule["category"] for _, rule in compiled]
+        self.rule_text = [(rule["parameter"], rule["action"], rule["target"]) for _, rule in compiled]
+        ops = [rule["op"] for _, rule in compiled]
+        self.op_groups = [(OPERATORS[op], np.array([r for r, o in enumerate(ops) if o == op], dtype=np.intp))
+                          for op in OPERATORS if op in ops]
+
+        # Risk factor field indices per disease
+        self.primary = [[FIELD_INDEX[f] for f in rules[name]["primary_factors"]] for name in self.diseases]
+        self.secondary = [[FIELD_INDEX[f] for f in rules[name]["secondary_factors"]] for name in self.diseases]
+        self.field_names = {FIELD_INDEX[f]: f for f in FIELD_INDEX}
+
+    def disease_ids(self, predictions):
+        labels, inverse = np.unique(np.asarray(predictions).astype(str), return_inverse=True)
+        ids = np.array([self.label_ids.get(label, self.unknown_id) for label in labels], dtype=np.intp)
+        return ids[inverse]
+
+    def fired(self, values, disease_ids):
+        # (patients x rules) mask of rules that hold and apply to the prediction
+        values = np.asarray(values, dtype=float)
+        fired = np.zeros((len(values), len(self.rule_field)), dtype=bool)
+        for compare, columns in self.op_groups:
+            fired[:, columns] = compare(values[:, self.rule_field[columns]], self.rule_threshold[columns])
+        applies = (self.rule_disease == ANY_DISEASE) | (self.rule_disease == disease_ids[:, None])
+        return fired & applies
+
+    def evaluate(self, values, predictions, out_of_range=None):
+        # Returns (recommendations, risk_factors) per patient
+        values = np.asarray(values, dtype=float)
+        if out_of_range is None:
+            out_of_range = (values < RANGE_MIN) | (values > RANGE_MAX)
+        disease_ids = self.disease_ids(predictions)
+        fired = self.fired(values, disease_ids)
+
+        results = []
+        for i, disease in enumerate(disease_ids.tolist()):
+            row = values[i]
+            recommendations = {category: [] for category in RECOMMENDATION_CATEGORIES}
+            for r in np.flatnonzero(fired[i]).tolist():
+                parameter, action, target = self.rule_text[r]
+                recommendations[self.rule_category[r]].append({
+                    "parameter": parameter,
+                    "current": float(row[self.rule_field[r]]),
+                    "action": action,
+                    "target": target
+                })
+
+            if disease == self.unknown_id:
+                risk_factors = {}
+            else:
+                abnormal = out_of_range[i]
+                risk_factors = {
+                    "primary_factors": [self._factor(j, row, abnormal) for j in self.primary[disease]],
+                    "secondary_factors": [self._factor(j, row, abnormal) for j in self.secondary[disease]]
+                }
+            results.append((recommendations, risk_factors))
+        return results
+
+    def _factor(self, j, row, abnormal):
+        return {
+            "metric": self.field_names[j],
+            "value": float(row[j]),
+            "status": "Abnormal" if abnormal[j] else "Normal"
+        }
@@ -0,0 +1,114 @@
+import argparse
+import os
+import time
+from .health_analyzer import HealthAnalyzer, TRAINING_CONFIG
+from .artifact import (DEFAULT_ARTIFACT_DIR, SERVING_INDEX, add_serving_arrays, artifact_key, artifact_path,
+                       dataset_hash, find_grown_from, load_artifact, model_fingerprint, save_artifact)
+from .data_loader import DEFAULT_CHUNKSIZE, load_training_data
+
+DEFAULT_DATA_PATH = "data/blood_test_data.csv"
+
+SEARCH_MODES = ["grid", "halving"]
+
+# Stages reported to train_artifact's progress callback, in order
+TRAINING_STAGES = ["load_data", "prepare_data", "scale", "search", "cross_validation",
+                   "bootstrap_importance", "evaluation", "save"]
+
+def training_config(search="grid", warm_start_params=None, max_rows_per_class=None):
+    # The returned config is hashed into the artifact key, so each mode gets its own artifact
+    config = dict(TRAINING_CONFIG)
+    if warm_start_params:
+        config.update(search="fixed", params=warm_start_params)
+    elif search == "halving":
+        config.update(search="halving", halving_factor=3)
+    if max_rows_per_class:
+        config["max_rows_per_class"] = max_rows_per_class
+    return config
+
+def warm_start_params(data_path=DEFAULT_DATA_PATH, artifact_dir=DEFAULT_ARTIFACT_DIR):
+    # Best params of the newest artifact trained on a prefix of this CSV
+    previous = find_grown_from(data_path, artifact_dir)
+    if previous is None:
+        return None
+    return previous["evaluation"]["best_params"]
+
+def train_artifact(data_path=DEFAULT_DATA_PATH, artifact_dir=DEFAULT_ARTIFACT_DIR, analyzer=None,
+                   config=TRAINING_CONFIG, n_jobs=-1, chunksize=DEFAULT_CHUNKSIZE, cache_dir=None, progress=None):
+    # progress(stage, seconds) is called after each of TRAINING_STAGES
+    analyzer = analyzer or HealthAnalyzer()
+    key = artifact_key(data_path, config)
+
+    start = time.time()
+    data = load_training_data(data_path, config.get("max_rows_per_class"), chunksize,
+                              config["random_state"], cache_dir)
+    if progress is not None:
+        progress("load_data", round(time.time() - start, 3))
+    evaluation = analyzer.train(data, config, n_jobs, progress)
+    metadata = {
+        "data_path": data_path,
+        "data_hash": dataset_hash(data_path),
+        "data_size": os.path.getsize(data_path),
+        "training_config": config,
+        "training_seconds": round(time.time() - start, 3),
+        "created_at": int(time.time()),
+    }
+    save_start = time.time()
+    path = save_artifact(analyzer, evaluation, key, artifact_dir, metadata)
+    analyzer.model_version = key
+    analyzer.model_fingerprint = model_fingerprint(analyzer)
+    if progress is not None:
+        progress("save", round(time.time() - save_start, 3))
+    return analyzer, evaluation, path
+
+def load_or_train(analyzer, data_path=DEFAULT_DATA_PATH, artifact_dir=DEFAULT_ARTIFACT_DIR):
+    # Only train when no artifact matches the current CSV and hyperparameters
+    key = artifact_key(data_path, TRAINING_CONFIG)
+    meta = load_artifact(analyzer, key, artifact_dir)
+    if meta is not None:
+        return meta["evaluation"], key, False
+    _, evaluation, _ = train_artifact(data_path, artifact_dir, analyzer)
+    return evaluation, key, True
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the HealthAnalyzer and write a model artifact")
+    parser.add_argument("--data", default=DEFAULT_DATA_PATH, help="Training CSV")
+    parser.add_argument("--artifact-dir", default=DEFAULT_ARTIFACT_DIR, help="Where artifacts are stored")
+    parser.add_argument("--force", action="store_true", help="Retrain even if a matching artifact exists")
+    parser.add_argument("--search", choices=SEARCH_MODES, default="grid",
+                        help="Exhaustive grid search or successive halving")
+    parser.add_argument("--warm-start", action="store_true",
+                        help="Reuse the previous artifact's best params if the CSV has only grown")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Parallel workers for search, CV and bootstrap fits")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="CSV rows parsed per chunk")
+    parser.add_argument("--max-rows-per-class", type=int,
+                        help="Train on a stratified reservoir sample of at most this many rows per Disease")
+    parser.add_argument("--cache-dir", help="Cache the parsed matrix here as memory-mapped .npy files")
+    args = parser.parse_args()
+
+    params = warm_start_params(args.data, args.artifact_dir) if args.warm_start else None
+    if args.warm_start:
+        print(f"Warm start from params: {params}" if params else "No earlier artifact to warm start from")
+    config = training_config(args.search, params, args.max_rows_per_class)
+
+    key = artifact_key(args.data, config)
+    analyzer = HealthAnalyzer()
+    if not args.force and load_artifact(analyzer, key, args.artifact_dir) is not None:
+        path = artifact_path(key, args.artifact_dir)
+        if not os.path.exists(os.path.join(path, SERVING_INDEX)):
+            # Artifacts written before serving arrays existed
+            add_serving_arrays(analyzer, key, args.artifact_dir)
+            print(f"Added serving arrays to {path}")
+        print(f"Artifact {key} is up to date in {args.artifact_dir}")
+        return
+
+    _, evaluation, path = train_artifact(args.data, args.artifact_dir, config=config, n_jobs=args.n_jobs,
+                                         chunksize=args.chunksize, cache_dir=args.cache_dir)
+    print(f"Model trained with accuracy: {evaluation['accuracy']}")
+    print(f"Cross-validation: {evaluation['cv_scores_mean']:.4f} (+/- {evaluation['cv_scores_std']:.4f})")
+    print(f"Best params: {evaluation['best_params']}")
+    for stage, seconds in evaluation['stage_seconds'].items():
+        print(f"  {stage}: {seconds:.3f}s")
+    print(f"Artifact written to {path}")
+
+if __name__ == "__main__":
+    main()
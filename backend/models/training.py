@@ -0,0 +1,174 @@
+import time
+import pandas as pd
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import train_test_split, cross_val_score, StratifiedKFold, GridSearchCV, HalvingGridSearchCV
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+from imblearn.over_sampling import SMOTE
+from .layout import FEATURE_COLUMNS
+from .data_loader import add_noise_
+from .normalization import FeatureTransform, to_raw
+from .health_analyzer import TRAINING_CONFIG
+
+# Training half of HealthAnalyzer. Kept out of models.health_analyzer so a
+# serving process never imports model selection, SMOTE or pandas; it is
+# imported on the first HealthAnalyzer.train call.
+#
+# Every random draw (noise, split, SMOTE, search, bootstrap samples) is
+# seeded from config['random_state'], so the same CSV and config train the
+# same model on every node; see models.artifact.model_fingerprint.
+
+def _bootstrap_importance(X, y, params, seed):
+    model = RandomForestClassifier(**params, random_state=seed)
+    model.fit(X, y)
+    return model.feature_importances_
+
+def prepare_data(analyzer, data, config=None):
+    # data is a DataFrame with a Disease column, or an (X, y) pair from
+    # models.data_loader. Noise is added in place on the feature matrix.
+    config = config or TRAINING_CONFIG
+    if isinstance(data, pd.DataFrame):
+        analyzer.feature_columns = [col for col in data.columns if col != 'Disease']
+        X = data[analyzer.feature_columns].to_numpy(dtype=float)
+        y = data['Disease'].to_numpy()
+    else:
+        X, y = data
+        analyzer.feature_columns = list(FEATURE_COLUMNS)
+
+    # Increase noise factor for better generalization
+    add_noise_(X, config['noise_factor'], np.random.default_rng(config['random_state']))
+
+    # Split before SMOTE to prevent data leakage
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=config['test_size'], stratify=y,
+        random_state=config['random_state']
+    )
+
+    # Apply SMOTE only to training data (oversamples the minority classes)
+    smote = SMOTE(random_state=config['random_state'])
+    X_train_resampled, y_train_resampled = smote.fit_resample(X_train, y_train)
+
+    return X_train_resampled, X_test, y_train_resampled, y_test
+
+def search(X_train_scaled, y_train, config, n_jobs):
+    # Returns (best_estimator, best_params) for the configured search mode
+    estimator = RandomForestClassifier(
+        random_state=config['random_state'],
+        class_weight='balanced',
+        bootstrap=True
+    )
+    mode = config.get('search', 'grid')
+
+    if mode == 'fixed':
+        # Warm start: reuse known-good parameters, no search
+        params = dict(config['params'])
+        return estimator.set_params(**params).fit(X_train_scaled, y_train), params
+
+    if mode == 'halving':
+        # Successive halving: every candidate starts on a small sample and
+        # only the best third survives to the next, larger round
+        grid_search = HalvingGridSearchCV(
+            estimator=estimator,
+            param_grid=config['param_grid'],
+            factor=config.get('halving_factor', 3),
+            cv=config['grid_cv_folds'],
+            scoring='balanced_accuracy',
+            random_state=config['random_state'],
+            n_jobs=n_jobs
+        )
+    else:
+        grid_search = GridSearchCV(
+            estimator=estimator,
+            param_grid=config['param_grid'],
+            cv=config['grid_cv_folds'],
+            scoring='balanced_accuracy',
+            n_jobs=n_jobs
+        )
+
+    grid_search.fit(X_train_scaled, y_train)
+    return grid_search.best_estimator_, grid_search.best_params_
+
+def train(analyzer, data, config=None, n_jobs=-1, progress=None):
+    # progress(stage, seconds) is called as each stage finishes
+    config = config or TRAINING_CONFIG
+    stage_seconds = {}
+    stage_start = time.perf_counter()
+
+    def end_stage(name):
+        nonlocal stage_start
+        now = time.perf_counter()
+        stage_seconds[name] = round(now - stage_start, 3)
+        stage_start = now
+        if progress is not None:
+            progress(name, stage_seconds[name])
+
+    X_train, X_test, y_train, y_test = prepare_data(analyzer, data, config)
+    analyzer.holdout = (X_test, y_test)
+    end_stage('prepare_data')
+
+    # Back to raw lab values, then the same fused transform serving applies
+    X_train = to_raw(X_train, analyzer.feature_columns)
+    analyzer.transform = FeatureTransform.fit(X_train)
+    X_train_scaled = analyzer.transform.transform(X_train)
+    X_test_scaled = analyzer.transform.transform(to_raw(X_test, analyzer.feature_columns))
+    end_stage('scale')
+
+    # Search for best parameters and use the best model
+    analyzer.model, best_params = search(X_train_scaled, y_train, config, n_jobs)
+    end_stage('search')
+
+    # Enhanced cross-validation
+    skf = StratifiedKFold(
+        n_splits=config['cv_folds'], shuffle=True,
+        random_state=config['random_state']
+    )
+    cv_scores = cross_val_score(analyzer.model, X_train_scaled, y_train, cv=skf,
+                                scoring='balanced_accuracy', n_jobs=n_jobs)
+    end_stage('cross_validation')
+
+    # Bootstrap feature importance. Samples are drawn up front so the
+    # fits can run in a process pool.
+    rng = np.random.default_rng(config['random_state'])
+    bootstrap_samples = [
+        rng.choice(len(X_train_scaled), size=int(len(X_train_scaled) * 0.8), replace=True)
+        for _ in range(config['bootstrap_iterations'])
+    ]
+    importances = Parallel(n_jobs=n_jobs)(
+        delayed(_bootstrap_importance)(X_train_scaled[indices], y_train[indices], best_params, i)
+        for i, indices in enumerate(bootstrap_samples)
+    )
+    end_stage('bootstrap_importance')
+
+    # Calculate mean and confidence intervals
+    analyzer.feature_importances = dict(zip(
+        analyzer.feature_columns,
+        np.mean(importances, axis=0)
+    ))
+
+    feature_importance_ci = dict(zip(
+        analyzer.feature_columns,
+        np.percentile(importances, [2.5, 97.5], axis=0).T
+    ))
+
+    # Model evaluation
+    y_pred = analyzer.model.predict(X_test_scaled)
+    end_stage('evaluation')
+
+    return {
+        'accuracy': accuracy_score(y_test, y_pred),
+        'cv_scores_mean': cv_scores.mean(),
+        'cv_scores_std': cv_scores.std(),
+        'classification_report': classification_report(y_test, y_pred),
+        'confusion_matrix': confusion_matrix(y_test, y_pred).tolist(),
+        'top_features': sorted(
+            [(k, v, feature_importance_ci[k])
+             for k, v in analyzer.feature_importances.items()],
+            key=lambda x: x[1],
+            reverse=True
+        )[:5],
+        'best_params': best_params,
+        'search': config.get('search', 'grid'),
+        'stage_seconds': stage_seconds
+    }
@@ -0,0 +1,43 @@
+import importlib
+import numpy as np
+import pytest
+from models.layout import FEATURE_COLUMNS, RANGE_MIN, RANGE_MAX
+from models.train import DEFAULT_DATA_PATH, train_artifact, training_config
+
+# Small grid and few folds: a model in seconds, with the same code path as a full training
+QUICK_CONFIG = dict(training_config(), grid_cv_folds=3, cv_folds=3, bootstrap_iterations=5,
+                    param_grid={"n_estimators": [30], "max_depth": [6], "min_samples_split": [10]})
+
+@pytest.fixture(scope="session")
+def artifact(tmp_path_factory):
+    # (artifact_dir, key) of one quick model shared by the whole session
+    artifact_dir = str(tmp_path_factory.mktemp("artifacts"))
+    analyzer, _, _ = train_artifact(DEFAULT_DATA_PATH, artifact_dir, config=QUICK_CONFIG, n_jobs=1)
+    return artifact_dir, analyzer.model_version
+
+@pytest.fixture(scope="session")
+def main(artifact, tmp_path_factory):
+    # api.main reads its configuration at import; import it once, pinned to the quick model
+    work_dir = tmp_path_factory.mktemp("server")
+    patch = pytest.MonkeyPatch()
+    patch.setenv("HEALTH_ARTIFACT_DIR", artifact[0])
+    patch.setenv("HEALTH_MODEL_KEY", artifact[1])
+    patch.setenv("HEALTH_EXECUTOR", "inline")
+    patch.setenv("HEALTH_JOBS_DIR", str(work_dir / "jobs"))
+    patch.setenv("HEALTH_PROFILE_DIR", str(work_dir / "profiles"))
+    module = importlib.import_module("api.main")
+    yield module
+    patch.undo()
+
+@pytest.fixture
+def client(main):
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as client:
+        yield client
+
+def patient_panels(n, seed=0):
+    # Raw values around and beyond the normal ranges, at full float precision
+    rng = np.random.default_rng(seed)
+    width = RANGE_MAX - RANGE_MIN
+    values = rng.uniform(RANGE_MIN - 0.5 * width, RANGE_MAX + 0.5 * width, size=(n, len(FEATURE_COLUMNS)))
+    return [dict(zip(FEATURE_COLUMNS, row)) for row in values.tolist()]
@@ -0,0 +1,120 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import pytest
+from api.jobs import MAX_PARAM_GRID_CANDIDATES, TrainingClaim, TrainingJobs
+from models.artifact import SERVING_FILE, SERVING_INDEX, add_serving_arrays, list_artifacts, load_artifact, save_artifact
+from models.health_analyzer import HealthAnalyzer
+
+TOKEN = "test-token"
+
+@pytest.fixture
+def admin(main, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", TOKEN)
+    return {"X-Admin-Token": TOKEN}
+
+def test_admin_disabled_without_token(client, main, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", None)
+    for method, path in [("post", "/admin/train"), ("get", "/admin/train/jobs"), ("post", "/admin/reload")]:
+        response = getattr(client, method)(path, headers={"X-Admin-Token": "anything"},
+                                           **({"json": {}} if method == "post" else {}))
+        assert response.status_code == 403 and "disabled" in response.json()["detail"]
+
+def test_wrong_token(client, admin):
+    assert client.get("/admin/train/jobs", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/admin/train/jobs").status_code == 403
+    assert client.get("/admin/train/jobs", headers=admin).status_code == 200
+
+@pytest.mark.parametrize("data_path", ["/etc/passwd", "../../etc/passwd", "../api/main.py", "missing.csv"])
+def test_training_data_outside_data_dir(client, admin, data_path):
+    assert client.post("/admin/train", json={"data_path": data_path}, headers=admin).status_code == 400
+
+@pytest.mark.parametrize("param_grid", [
+    {"n_jobs": [64]},
+    {"n_estimators": [100000]},
+    {"n_estimators": "100"},
+    {"max_depth": [4.5]},
+    {"max_features": [0.0]},
+    {"n_estimators": list(range(1, MAX_PARAM_GRID_CANDIDATES + 2))},
+])
+def test_param_grid_is_checked(client, admin, param_grid):
+    assert client.post("/admin/train", json={"param_grid": param_grid}, headers=admin).status_code == 422
+
+def test_training_claim_is_exclusive(tmp_path):
+    first, second = TrainingClaim(str(tmp_path), "abc"), TrainingClaim(str(tmp_path), "abc")
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
+
+def test_job_records_are_shared_between_workers(tmp_path):
+    # Records written by other worker processes: one still alive, one gone
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    jobs_dir = tmp_path / "jobs"
+    jobs_dir.mkdir()
+    for job_id, pid in [("alive", os.getppid()), ("gone", exited.pid)]:
+        (jobs_dir / f"{job_id}.json").write_text(json.dumps({
+            "id": job_id, "status": "running", "submitted_at": 0, "error": None, "owner_pid": pid}))
+
+    jobs = TrainingJobs(str(jobs_dir), str(tmp_path / "artifacts"))
+    assert jobs.get("alive")["status"] == "running"
+    assert jobs.get("gone")["status"] == "failed" and "restart" in jobs.get("gone")["error"]
+    assert {job["id"] for job in jobs.list()} == {"alive", "gone"}
+    assert jobs.stats()["counts"] == {"queued": 0, "running": 1, "succeeded": 0, "failed": 1}
+    assert jobs.get("missing") is None and jobs.get("../alive") is None
+
+def test_concurrent_saves_of_one_key(artifact, tmp_path):
+    # Every save writes its own directory; the published path is always complete
+    analyzer = HealthAnalyzer()
+    meta = load_artifact(analyzer, artifact[1], artifact[0])
+    artifact_dir = str(tmp_path)
+    save_artifact(analyzer, meta["evaluation"], "k", artifact_dir)
+    done = threading.Event()
+    missing = []
+
+    def read():
+        while not done.is_set():
+            if load_artifact(HealthAnalyzer(), "k", artifact_dir) is None:
+                missing.append(1)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    writers = [threading.Thread(target=save_artifact, args=(analyzer, meta["evaluation"], "k", artifact_dir))
+               for _ in range(4)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    done.set()
+    reader.join()
+    assert not missing
+    assert [meta["key"] for meta in list_artifacts(artifact_dir)] == ["k"]
+    # The symlink, the published version and the lock file are all that is left
+    names = set(os.listdir(artifact_dir)) - {"k", "k.lock"}
+    assert names == {os.path.basename(os.path.realpath(os.path.join(artifact_dir, "k")))}
+
+def test_serving_arrays_are_added_to_a_new_version(artifact, tmp_path):
+    # An artifact from before serving arrays: a plain directory without them
+    artifact_dir, key = artifact
+    path = tmp_path / key
+    shutil.copytree(os.path.join(artifact_dir, key), path)
+    for name in (SERVING_FILE, SERVING_INDEX):
+        os.remove(path / name)
+    analyzer = HealthAnalyzer()
+    load_artifact(analyzer, key, str(tmp_path))
+    old_model = os.open(path / "model.joblib", os.O_RDONLY)
+    try:
+        add_serving_arrays(analyzer, key, str(tmp_path))
+        # The files a running worker opened are left as they were
+        assert os.fstat(old_model).st_nlink == 0
+    finally:
+        os.close(old_model)
+    assert os.path.islink(path) and os.path.exists(path / SERVING_INDEX)
+    served = HealthAnalyzer()
+    meta = load_artifact(served, key, str(tmp_path), serving_only=True)
+    assert meta["fingerprint"] == served.model_fingerprint == analyzer.model_fingerprint
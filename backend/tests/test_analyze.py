@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from api.cache import AnalysisCache
+from models.layout import FEATURE_COLUMNS, PRECISION
+from tests.conftest import patient_panels
+
+@pytest.fixture(params=["cache_on", "cache_off"])
+def cache(request, main, monkeypatch):
+    cache = AnalysisCache(4096, 600) if request.param == "cache_on" else None
+    if cache is not None:
+        cache.set_model_version(main.health_analyzer.model_version if main.health_analyzer else None)
+    monkeypatch.setattr(main, "analysis_cache", cache)
+    return cache
+
+def test_single_matches_batch(client, cache):
+    panels = patient_panels(100)
+    batch = client.post("/analyze/batch", json=panels).json()
+    # Twice, so the second pass is served from the cache when it is on
+    for _ in range(2):
+        single = [client.post("/analyze", json=panel).json() for panel in panels]
+        assert single == batch
+    if cache is not None:
+        assert cache.hits == len(panels)
+
+def test_near_duplicate_is_analyzed_afresh(client, cache):
+    # Differs from the first panel below lab precision: same cache key, own report
+    scale = 10.0 ** PRECISION
+    values = np.rint(np.array(list(patient_panels(1, seed=1)[0].values())) * scale) / scale
+    panel = dict(zip(FEATURE_COLUMNS, values.tolist()))
+    nudged = dict(zip(FEATURE_COLUMNS, (values + 0.1 / scale).tolist()))
+    for submitted in (panel, nudged):
+        expected = client.post("/analyze/batch", json=[submitted]).json()[0]
+        assert client.post("/analyze", json=submitted).json() == expected
+    if cache is not None:
+        assert cache.hits == 0 and cache.near_duplicates == 1
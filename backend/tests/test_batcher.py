@@ -0,0 +1,22 @@
+import asyncio
+import gc
+import numpy as np
+from api.batcher import MicroBatcher
+
+def test_flushes_are_kept_until_done():
+    async def run(values, analyzer):
+        # Collect while the flush is pending: only the batcher references its task
+        await asyncio.sleep(0.01)
+        gc.collect()
+        await asyncio.sleep(0.01)
+        return [float(row.sum()) for row in values]
+
+    async def main():
+        batcher = MicroBatcher(run, max_wait_ms=1, max_batch=4)
+        rows = [np.full(3, i, dtype=float) for i in range(10)]
+        reports = await asyncio.gather(*(batcher.submit(row, "model") for row in rows))
+        return batcher, reports
+
+    batcher, reports = asyncio.run(main())
+    assert reports == [3.0 * i for i in range(10)]
+    assert batcher.batches == 3 and not batcher.tasks
@@ -0,0 +1,22 @@
+import numpy as np
+from api.bulk_score import score
+from api.reports import analyze_matrix
+from models.layout import FEATURE_COLUMNS
+from tests.conftest import patient_panels
+
+def test_matches_analyze(main, client):
+    panels = patient_panels(50, seed=3)
+    values = np.array([[panel[column] for column in FEATURE_COLUMNS] for panel in panels])
+    values[7, 3] = np.nan
+    result, classes = score(values, main.health_analyzer)
+    # Rows with missing values get an error; every other row what /analyze reports
+    assert result["error"][7] is not None and result["prediction"][7] is None
+    valid = [i for i in range(len(values)) if i != 7]
+    for i, report in zip(valid, analyze_matrix(values[valid], main.health_analyzer)):
+        summary = report["summary"]
+        assert result["prediction"][i] == summary["predicted_condition"]
+        assert result["health_score"][i] == summary["health_score"]
+        assert result["risk_level"][i] == summary["risk_level"]
+        assert result["metrics_at_risk"][i] == report["analysis"]["metrics_overview"]["metrics_at_risk"]
+        assert result["abnormal_metrics"][i] == list(report["warnings"]["abnormal_metrics"])
+    assert len(classes) == len(result["probabilities"][0])
@@ -0,0 +1,138 @@
+import copy
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import httpx
+import pytest
+from api.cluster import HashRing
+from api.prefork import preload
+from models.artifact import artifact_path
+from models.train import DEFAULT_DATA_PATH
+from .conftest import patient_panels
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TRAIN_SCRIPT = """
+import json, sys
+from models.train import train_artifact
+from tests.conftest import QUICK_CONFIG
+analyzer, _, _ = train_artifact(sys.argv[1], sys.argv[2], config=QUICK_CONFIG, n_jobs=1)
+print(json.dumps({"key": analyzer.model_version, "fingerprint": analyzer.model_fingerprint}))
+"""
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def node_env(work_dir, node_id, nodes, **extra):
+    return dict(os.environ, HEALTH_NODE_ID=node_id, HEALTH_NODES=",".join(nodes), HEALTH_EXECUTOR="inline",
+                HEALTH_JOBS_DIR=str(work_dir / f"jobs-{node_id}"),
+                HEALTH_PROFILE_DIR=str(work_dir / f"profiles-{node_id}"), **extra)
+
+def train_node(artifact_dir, hash_seed):
+    env = dict(os.environ, PYTHONHASHSEED=str(hash_seed))
+    output = subprocess.run([sys.executable, "-c", TRAIN_SCRIPT, DEFAULT_DATA_PATH, str(artifact_dir)],
+                            cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def wait_ready(url, server, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        assert server.poll() is None, f"Server at {url} exited with {server.returncode}"
+        try:
+            if httpx.get(f"{url}/ready").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} not ready after {timeout}s")
+
+def test_hash_ring_moves_one_share_on_add():
+    nodes = ["node0", "node1", "node2"]
+    ring = HashRing(nodes)
+    # Same owner whatever the order the nodes are listed in
+    assert all(ring.node_for(f"user-{i}") == HashRing(nodes[::-1]).node_for(f"user-{i}") for i in range(1000))
+
+    users = [f"user-{i}" for i in range(10000)]
+    before = {user: ring.node_for(user) for user in users}
+    ring.add("node3")
+    moved = [user for user in users if ring.node_for(user) != before[user]]
+    # Only users taken over by the new node move, about 1/4 of them
+    assert all(ring.node_for(user) == "node3" for user in moved)
+    assert 0.15 < len(moved) / len(users) < 0.35
+
+    ring.remove("node3")
+    assert all(ring.node_for(user) == before[user] for user in users)
+
+def test_prefork_preloads_pinned_key(artifact):
+    artifact_dir, key = artifact
+    # QUICK_CONFIG is not the default config: only the pinned key finds the artifact
+    assert preload(DEFAULT_DATA_PATH, artifact_dir, "flat") is None
+    assert preload(DEFAULT_DATA_PATH, artifact_dir, "flat", key) == artifact_path(key, artifact_dir)
+
+def test_fingerprint_header_names_the_scoring_model(client, main, monkeypatch):
+    # A reload that lands while the request is being scored does not relabel its response
+    scoring = main.health_analyzer
+    reloaded = copy.copy(scoring)
+    reloaded.model_fingerprint = "reloaded"
+    run_analysis = main.run_analysis
+
+    async def reload_during_analysis(values, analyzer):
+        monkeypatch.setattr(main, "health_analyzer", reloaded)
+        return await run_analysis(values, analyzer)
+
+    monkeypatch.setattr(main, "run_analysis", reload_during_analysis)
+    response = client.post("/analyze", json=patient_panels(1, seed=11)[0])
+    assert response.status_code == 200
+    assert response.headers["x-model-fingerprint"] == scoring.model_fingerprint
+    assert client.get("/ready").headers["x-model-fingerprint"] == "reloaded"
+
+def test_node_id_must_be_in_nodes(tmp_path):
+    env = node_env(tmp_path, "node9", ["node0", "node1"])
+    result = subprocess.run([sys.executable, "-c", "import api.main"], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True)
+    assert result.returncode != 0
+    assert "HEALTH_NODE_ID='node9' is not one of HEALTH_NODES" in result.stderr
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="Starts server processes")
+def test_nodes_train_and_serve_the_same_model(tmp_path):
+    node_ids = ["node0", "node1"]
+    # Each node trains in a fresh interpreter with its own hash seed
+    trained = [train_node(tmp_path / node_id, seed) for seed, node_id in enumerate(node_ids, 1)]
+    assert trained[0] == trained[1]
+
+    ports = [free_port() for _ in node_ids]
+    urls = [f"http://127.0.0.1:{port}" for port in ports]
+    servers = [
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+            env=node_env(tmp_path, node_id, node_ids, HEALTH_ARTIFACT_DIR=str(tmp_path / node_id),
+                         HEALTH_MODEL_KEY=trained[0]["key"])
+        )
+        for node_id, port in zip(node_ids, ports)
+    ]
+    try:
+        for url, server in zip(urls, servers):
+            wait_ready(url, server)
+        with httpx.Client(timeout=60) as client:
+            for payload in patient_panels(20, seed=5):
+                responses = [client.post(f"{url}/analyze", json=payload) for url in urls]
+                assert all(r.status_code == 200 for r in responses)
+                assert responses[0].content == responses[1].content
+                assert {r.headers["x-model-fingerprint"] for r in responses} == {trained[0]["fingerprint"]}
+                assert [r.headers["x-node-id"] for r in responses] == node_ids
+
+            for user_id in ("patient-1", "patient-2", "patient-3"):
+                routes = [client.get(f"{url}/route/{user_id}").json() for url in urls]
+                owner = HashRing(node_ids).node_for(user_id)
+                assert [r["node"] for r in routes] == [owner, owner]
+                assert [r["local"] for r in routes] == [node_id == owner for node_id in node_ids]
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
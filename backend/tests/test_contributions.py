@@ -0,0 +1,21 @@
+import numpy as np
+from numpy.testing import assert_allclose
+from models.layout import FEATURE_COLUMNS
+from tests.conftest import patient_panels
+
+def test_tables_are_built_on_first_use(main, client):
+    analyzer = main.health_analyzer
+    client.post("/analyze", json=patient_panels(1)[0])
+    assert getattr(analyzer, "_cached_contributions", None) is None
+
+    X = np.array([[panel[column] for column in FEATURE_COLUMNS] for panel in patient_panels(20, seed=4)])
+    result = analyzer.analyze_batch(X, contributions=True)
+    assert analyzer._cached_contributions is not None
+    # Top contributions are the largest of a set that sums to probability - bias
+    assert all(len(features) == 5 for features in result["top_contributing_features"])
+    bias, _, _ = analyzer.contribution_tables()
+    forest = analyzer.compiled_forest()
+    class_index = np.argmax(result["probabilities"], axis=1)
+    scaled = analyzer.transform.transform(analyzer._model_matrix(X))
+    totals = forest.contributions(scaled, class_index, analyzer.contribution_tables()).sum(axis=1)
+    assert_allclose(totals + bias[class_index], result["probabilities"].max(axis=1), atol=1e-9)
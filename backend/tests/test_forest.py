@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+from numpy.testing import assert_allclose
+from sklearn.ensemble import RandomForestClassifier
+from models.artifact import load_artifact
+from models.forest import CHUNK_SIZE, FlatForest
+from models.health_analyzer import HealthAnalyzer
+from models.layout import FEATURE_COLUMNS
+from models.normalization import to_raw
+from models.train import DEFAULT_DATA_PATH
+
+def fitted_forest(n_classes=4, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(600, 24))
+    y = (X[:, 0] > 0).astype(int) + 2 * (X[:, 1] + X[:, 2] > 0.5)
+    model = RandomForestClassifier(n_estimators=30, max_depth=6, random_state=seed).fit(X, y % n_classes)
+    return model, FlatForest.from_model(model)
+
+def test_predict_proba_matches_sklearn():
+    model, forest = fitted_forest()
+    X = np.random.default_rng(1).normal(scale=2, size=(CHUNK_SIZE * 3 + 7, 24))
+    assert_allclose(forest.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(forest.predict(X), model.predict(X))
+
+def test_single_row():
+    model, forest = fitted_forest()
+    row = np.random.default_rng(2).normal(size=24)
+    assert_allclose(forest.predict_proba(row), model.predict_proba(row.reshape(1, -1)), rtol=0, atol=1e-12)
+
+def test_thresholds_compare_as_float32():
+    # Values on a split threshold must take the same branch as sklearn
+    model, forest = fitted_forest()
+    X = np.random.default_rng(3).normal(size=(50, 24))
+    internal = forest.left != np.arange(len(forest.feature))
+    X[:, forest.feature[internal][:50]] = forest.threshold[internal][:50]
+    assert_allclose(forest.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
+
+def test_trained_model_on_every_csv_row(artifact):
+    # The trained sklearn model, its compiled forest and the serving arrays
+    # saved in the artifact agree on every row of blood_test_data.csv
+    analyzer, serving = HealthAnalyzer(), HealthAnalyzer()
+    load_artifact(analyzer, artifact[1], artifact[0])
+    load_artifact(serving, artifact[1], artifact[0], serving_only=True)
+    # The CSV is in the 0-1 training space; the model sees it through the fitted transform
+    csv_values = pd.read_csv(DEFAULT_DATA_PATH)[FEATURE_COLUMNS].to_numpy(dtype=float)
+    scaled = analyzer.transform.transform(to_raw(csv_values, FEATURE_COLUMNS))
+
+    expected = analyzer.model.predict_proba(scaled)
+    for forest in (FlatForest.from_model(analyzer.model), serving.compiled_forest()):
+        probabilities = forest.predict_proba(scaled)
+        assert_allclose(probabilities, expected, rtol=0, atol=1e-12)
+        np.testing.assert_array_equal(probabilities.argmax(axis=1), expected.argmax(axis=1))
+        np.testing.assert_array_equal(forest.predict(scaled), analyzer.model.predict(scaled))
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+from numpy.testing import assert_allclose
+from sklearn.preprocessing import StandardScaler
+from models.artifact import load_artifact
+from models.constants import normal_ranges
+from models.data_loader import load_training_data
+from models.health_analyzer import HealthAnalyzer
+from models.layout import FEATURE_COLUMNS, FIELD_NAMES
+from models.normalization import FeatureTransform, feature_ranges, to_raw
+from models.train import DEFAULT_DATA_PATH
+from tests.conftest import QUICK_CONFIG
+
+# The two-step path the fused transform replaced, written out on its own:
+# min-max over each metric's normal range, then a separately fitted StandardScaler
+RANGES = np.array([normal_ranges[field] for field in FIELD_NAMES], dtype=float)
+
+def min_max(raw):
+    return (raw - RANGES[:, 0]) / (RANGES[:, 1] - RANGES[:, 0])
+
+def csv_rows():
+    return pd.read_csv(DEFAULT_DATA_PATH)[FEATURE_COLUMNS].to_numpy(dtype=float)
+
+def raw_patients(n=500, seed=0):
+    # In and well beyond the normal ranges
+    width = RANGES[:, 1] - RANGES[:, 0]
+    return np.random.default_rng(seed).uniform(RANGES[:, 0] - width, RANGES[:, 1] + width, size=(n, len(FIELD_NAMES)))
+
+def test_every_feature_has_a_normal_range():
+    assert all(field in normal_ranges for field in FIELD_NAMES)
+    assert feature_ranges(FEATURE_COLUMNS)[2].all()
+
+def test_to_raw_inverts_min_max():
+    csv = csv_rows()
+    assert_allclose(min_max(to_raw(csv, FEATURE_COLUMNS)), csv, atol=1e-12)
+
+def test_fit_matches_min_max_then_standard_scaler():
+    csv = csv_rows()
+    scaler = StandardScaler().fit(csv)
+    transform = FeatureTransform.fit(to_raw(csv, FEATURE_COLUMNS))
+    raw = raw_patients()
+    assert_allclose(transform.transform(raw), scaler.transform(min_max(raw)), rtol=1e-9, atol=1e-9)
+
+def test_trained_model_serves_like_the_two_step_path(artifact):
+    # Rebuild the training split, fit the two-step path on it and feed the
+    # fitted forest through both paths
+    X_train = HealthAnalyzer().prepare_data(load_training_data(DEFAULT_DATA_PATH), QUICK_CONFIG)[0]
+    scaler = StandardScaler().fit(X_train)
+    analyzer = HealthAnalyzer()
+    load_artifact(analyzer, artifact[1], artifact[0])
+    raw = raw_patients(seed=2)
+    expected = scaler.transform(min_max(raw))
+    assert_allclose(analyzer.transform.transform(raw), expected, rtol=1e-9, atol=1e-9)
+    _, probabilities = analyzer.predict_batch(raw)
+    assert_allclose(probabilities, analyzer.model.predict_proba(expected), atol=1e-12)
@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+import time
+import pytest
+from .test_cluster import BACKEND_DIR, free_port, node_env
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="Pre-forks workers")
+def test_master_gives_up_on_workers_that_cannot_start(tmp_path):
+    # Every worker fails at import (node id not in HEALTH_NODES): restarts back
+    # off, then the master exits instead of forking forever
+    env = node_env(tmp_path, "node9", ["node0"], HEALTH_ARTIFACT_DIR=str(tmp_path / "artifacts"))
+    start = time.monotonic()
+    result = subprocess.run([sys.executable, "-m", "api.prefork", "--workers", "2", "--port", str(free_port())],
+                            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 1
+    assert "workers in a row failed to start" in result.stdout
+    assert result.stdout.count("starting a new one") == 4
+    assert "starting a new one in 4s" in result.stdout
+    # 0.5 + 1 + 2 + 4 seconds of backoff between the five failed starts
+    assert time.monotonic() - start >= 7.5
@@ -0,0 +1,28 @@
+import os
+import shutil
+import pytest
+from api.reload import ModelReloader, ReloadError
+from models.artifact import HOLDOUT_FILE, load_holdout
+from models.data_loader import load_training_data
+from models.train import DEFAULT_DATA_PATH
+
+def test_validates_on_saved_test_split(artifact):
+    artifact_dir, key = artifact
+    X, y = load_holdout(key, artifact_dir)
+    rows = len(load_training_data(DEFAULT_DATA_PATH)[1])
+    # The 20% test split, not a sample of the rows the model was fitted on
+    assert len(X) == len(y) and abs(len(y) - rows * 0.2) <= 1
+
+    swapped = []
+    result = ModelReloader(artifact_dir, swapped.append).load(key)
+    assert result["status"] == "loaded" and result["holdout_accuracy"] >= 0.9
+    assert swapped[0].model_version == key
+
+def test_artifact_without_test_split(artifact, tmp_path):
+    artifact_dir, key = artifact
+    shutil.copytree(os.path.join(artifact_dir, key), tmp_path / key)
+    os.remove(tmp_path / key / HOLDOUT_FILE)
+    with pytest.raises(ReloadError, match="no held-out test split"):
+        ModelReloader(str(tmp_path), lambda analyzer: None).load(key)
+    result = ModelReloader(str(tmp_path), lambda analyzer: None, holdout_path=DEFAULT_DATA_PATH).load(key)
+    assert result["status"] == "loaded"
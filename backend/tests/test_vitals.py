@@ -0,0 +1,49 @@
+import time
+import numpy as np
+from api.vitals import INITIAL_SAMPLES, RingBuffer, VitalsStore
+from tests.conftest import patient_panels
+
+def test_ring_buffer_grows_then_wraps():
+    ring = RingBuffer(capacity=300)
+    assert len(ring.timestamps) == INITIAL_SAMPLES
+    appended = np.arange(1000)
+    for start in range(0, 1000, 7):
+        batch = appended[start:start + 7]
+        ring.append(batch, batch.astype(np.float32), batch.astype(np.float32))
+        kept = appended[max(0, start + len(batch) - 300):start + len(batch)]
+        timestamps, heart_rates, _ = ring.ordered()
+        np.testing.assert_array_equal(timestamps, kept)
+        np.testing.assert_array_equal(heart_rates, kept)
+    assert len(ring.timestamps) == 300
+
+def test_stale_window_is_ignored():
+    store = VitalsStore(window_seconds=300, max_age_seconds=900)
+    now_ms = int(time.time() * 1000)
+    store.ingest(["fresh"] * 3 + ["stale"] * 3, [now_ms - 2000, now_ms - 1000, now_ms] * 2, [60, 62, 64] * 2, [0, 5, 9] * 2)
+    assert store.current_window("fresh")["resting_heart_rate"] is not None
+    assert store.current_window("stale", now_ms=now_ms + 901 * 1000) is None
+    assert store.current_window("unknown") is None
+
+def test_late_batch_keeps_timestamp_order():
+    # A batch from an hour ago arrives after the current one
+    store = VitalsStore(window_seconds=300, max_age_seconds=900)
+    # Mid-minute, so each batch falls in one 60 s bucket
+    now_ms = int(time.time() // 60) * 60000 + 30000
+    store.ingest(["u"] * 3, [now_ms - 2000, now_ms - 1000, now_ms], [70, 72, 74], [100, 105, 110])
+    hour_ago_ms = now_ms - 3600 * 1000
+    store.ingest(["u"] * 2, [hour_ago_ms, hour_ago_ms + 1000], [50, 52], [0, 3])
+
+    window = store.current_window("u", now_ms=now_ms)
+    assert window is not None and window["end"] == now_ms
+    assert window["samples"] == 3 and window["heart_rate_min"] == 70 and window["steps"] == 10
+    buckets = store.tumbling("u", bucket_seconds=60)
+    assert [bucket["samples"] for bucket in buckets] == [2, 3]
+    assert [bucket["bucket_start"] for bucket in buckets] == sorted(bucket["bucket_start"] for bucket in buckets)
+
+def test_analyze_keeps_heart_rate_without_recent_vitals(client, main):
+    panel = patient_panels(1, seed=2)[0]
+    hours_ago_ms = int((time.time() - 3 * 3600) * 1000)
+    main.vitals_store.ingest(["old-watch"] * 2, [hours_ago_ms, hours_ago_ms + 1000], [40, 41], [0, 0])
+    response = client.post("/analyze", params={"userId": "old-watch", "vitals": "true"}, json=panel).json()
+    assert "vitals" not in response["analysis"]
+    assert response == client.post("/analyze/batch", json=[panel]).json()[0]